@@ -1,100 +1,451 @@
-import re
+import os
 import sys
-import math
+import tempfile
+import time
 import toml
-from typing import List, Dict
+from bisect import bisect_right
+from contextlib import contextmanager
+from itertools import accumulate, chain
+from typing import Any, List, Dict, Iterable, Iterator, Optional, TextIO
 
+from config_eval import OPERATIONS, evaluate, evaluate_with, literal
+from config_parser import (Array, ConfigSyntaxError, Expression, Node, Parser, Program, Set, StreamParser,
+                           gc_paused, parse)
+from config_vector import plain, quiet
 
-def parse_constants(lines: List[str]) -> Dict[str, float]:
+
+def parse_constants(lines: List[str]) -> Dict[str, Any]:
     """Разбираем все константы и вычисляем их значения."""
+    return evaluate_program(parse("\n".join(lines)))
+
+
+def evaluate_program(program: Program) -> Dict[str, Any]:
+    """Вычисляем константы и ключи выходного файла (порядок объявлений не важен)."""
+    return evaluate(program.statements)
+
+
+def convert_stream(lines: Iterable[str], output: TextIO) -> Dict[str, Any]:
+    """
+    Потоковое преобразование: каждый ключ пишется в output, как только его объявление разобрано
+    и вычислено. В памяти остаются только константы set (на них ссылаются выражения) и имена
+    записанных ключей, поэтому ключ нельзя объявить дважды — его значение уже в файле, а выражение
+    может ссылаться только на константы, объявленные выше.
+
+    :param lines: Строки входного текста с переводами строк
+    :param output: Файл для TOML
+    :return: Таблица констант
+    """
     constants = {}
+    written = set()
+    stream = StreamParser(lines)
+    with quiet():
+        for statement in stream:
+            if stream.errors:
+                # После синтаксической ошибки файл уже не нужен: разбор идёт дальше только ради остальных ошибок
+                continue
+            value = statement.value
+            name = statement.name if type(statement) is Set else statement.key
+            if type(value) is Expression:
+                value = evaluate_with(value, name, constants)
+            elif type(value) is Array:
+                value = literal(value)
+            if type(statement) is Set:
+                constants[name] = value
+            if name in written:
+                raise ValueError(f"Строка {statement.line}, столбец {statement.column}: повторное объявление ключа {name}")
+            written.add(name)
+            output.write(dump_key(name, value))
+    if "graph" not in written:
+        output.write(toml.dumps({"graph": []}))
+    return {name: plain(value) for name, value in constants.items()}
+
+
+def clean_graph(graph: Any) -> List[Any]:
+    """Массив graph для TOML: без нулевых элементов."""
+    return [x for x in graph if x != 0.0]
+
+
+def dump_key(name: str, value: Any) -> str:
+    """Строка TOML одного ключа; значения в таблице — скалярные и массивы, так что файл — конкатенация таких строк."""
+    if type(value) is not float and type(value) is not str:
+        value = plain(value)
+    if name == "graph":
+        value = clean_graph(value)
+    return toml.dumps({name: value})
+
+
+@contextmanager
+def atomic_output(output_file: str) -> Iterator[TextIO]:
+    """Файл для записи рядом с output_file; при успешном выходе из блока он заменяет output_file."""
+    directory = os.path.dirname(os.path.abspath(output_file))
+    fd, path = tempfile.mkstemp(dir=directory, prefix=".config-", suffix=".toml")
+    try:
+        with os.fdopen(fd, "w") as f:
+            yield f
+        os.replace(path, output_file)
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+def write_stream(lines: Iterable[str], output_file: str):
+    """Пишет результат convert_stream во временный файл рядом с output_file и при успехе заменяет им output_file."""
+    with atomic_output(output_file) as f:
+        convert_stream(lines, f)
+
+
+def common_prefix(a: List[int], b: List[int], block: int = 1024) -> int:
+    """Длина общего начала списков: блоки сравниваются срезами, посимвольно — только блок с различием."""
+    n = min(len(a), len(b))
+    i = 0
+    while i < n:
+        j = min(i + block, n)
+        if a[i:j] != b[i:j]:
+            break
+        i = j
+    else:
+        return n
+    while a[i] == b[i]:
+        i += 1
+    return i
+
+
+def common_suffix(a: List[int], b: List[int], limit: int, block: int = 1024) -> int:
+    """Длина общего конца списков, не больше limit (чтобы не пересечься с общим началом)."""
+    i = 0
+    while i < limit:
+        j = min(i + block, limit)
+        if a[len(a) - j:len(a) - i] != b[len(b) - j:len(b) - i]:
+            break
+        i = j
+    else:
+        return limit
+    while a[-1 - i] == b[-1 - i]:
+        i += 1
+    return i
+
+
+def statement_name(statement: Node) -> str:
+    return statement.name if type(statement) is Set else statement.key
+
+
+def references(statement: Node) -> List[str]:
+    """Имена, на которые ссылается выражение объявления, без повторов."""
+    value = statement.value
+    if type(value) is not Expression:
+        return []
+    return list(dict.fromkeys(token for token in value.tokens if type(token) is str and token not in OPERATIONS))
 
-    for line in lines:
-        # Пропускаем пустые строки и комментарии
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
-
-        if line.startswith("set"):  # Set оператор
-            match = re.match(r"set\s+([_a-zA-Z]+)\s*=\s*(.+)", line)
-            if not match:
-                raise SyntaxError(f"Некорректное объявление константы: {line}")
-            name, value = match.groups()
-
-            if value.startswith("![") and value.endswith("]"):  # Выражение для вычисления
-                expression = value[2:-1].split()
-                result = evaluate_expression(expression, constants)
-                constants[name] = result
-            else:  # Простое значение
-                if is_float(value):
-                    constants[name] = float(value)
-                elif value.isdigit():
-                    constants[name] = int(value)
-                else:
-                    raise ValueError(f"Некорректное значение константы: {value}")
-
-        elif "=" in line:  # Вложенные массивы или другие слова
-            key, value = map(str.strip, line.split("=", 1))
-            if value.startswith("{") and value.endswith("}"):
-                constants[key] = parse_array(value)
+
+def conflicts_of(name: str, count: int) -> int:
+    # Повторное объявление и константа с именем операции: такие программы вычисляет evaluate целиком
+    return (count > 1) + (count > 0 and name in OPERATIONS)
+
+
+class IncrementalConfig:
+    """
+    Состояние режима --watch: объявления входного текста, значения констант и готовая строка TOML
+    каждого ключа.
+
+    Изменённый участок текста находится по хешам строк (сам прежний текст не хранится). Заново
+    разбираются только задетые им объявления, вычисляются только они и зависящие от них константы,
+    перестраиваются только их строки TOML. Программы с повторными объявлениями имён и любые ошибки
+    обрабатываются полной пересборкой: так сообщения об ошибках совпадают с обычным режимом.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.text: Optional[str] = None  # Выходной TOML; None — состояние ещё не построено
+        self.hashes: List[int] = []
+        self.preamble = 0  # Строки до первого объявления
+        # Объявления по порядку и число строк каждого — до следующего объявления или конца текста
+        self.statements: List[Node] = []
+        self.lengths: List[int] = []
+        self.names: List[str] = []
+        self.counts: Dict[str, int] = {}
+        self.conflicts = 0
+        self.declarations: Dict[str, Node] = {}
+        self.dependents: Dict[str, set] = {}  # Имя -> имена, выражения которых на него ссылаются
+        self.values: Dict[str, Any] = {}
+        self.dumped: Dict[str, str] = {}
+
+    def load(self, lines: List[str]) -> Dict[str, Any]:
+        """
+        Полная сборка состояния по тексту.
+
+        :return: Статистика, как у update
+        :raises ConfigSyntaxError, ValueError: При ошибке в тексте; состояние тогда пустое
+        """
+        self.clear()
+        start = time.perf_counter()
+        try:
+            statements = parse("\n".join(lines)).statements
+            self.hashes = list(map(hash, lines))
+            starts = [statement.line - 1 for statement in statements]
+            self.preamble = starts[0] if starts else len(lines)
+            self.lengths = [end - begin for begin, end in zip(starts, starts[1:] + [len(lines)])]
+            self.statements = statements
+            self.names = list(map(statement_name, statements))
+            self.add(statements)
+            parsed = time.perf_counter()
+            if self.conflicts:
+                self.dumped = {name: dump_key(name, value) for name, value in evaluate(statements).items()}
             else:
-                constants[key] = value
-
-    return constants
-
-
-def parse_array(array_text: str) -> List[float]:
-    """Парсинг массивов: { val. val. ... }"""
-    array_text = array_text.strip("{}")
-    values = [float(x) for x in array_text.split(".") if x.strip()]
-    return values
-
-
-def evaluate_expression(expression: List[str], constants: Dict[str, float]) -> float:
-    """Вычисление постфиксной формы с поддержкой операций +, -, *, sqrt."""
-    stack = []
-    for token in expression:
-        if token in constants:
-            stack.append(constants[token])
-        elif is_float(token):
-            stack.append(float(token))
-        elif token == "+":
-            b, a = stack.pop(), stack.pop()
-            stack.append(a + b)
-        elif token == "-":
-            b, a = stack.pop(), stack.pop()
-            stack.append(a - b)
-        elif token == "*":
-            b, a = stack.pop(), stack.pop()
-            stack.append(a * b)
-        elif token == "sqrt":
-            a = stack.pop()
-            stack.append(math.sqrt(a))
+                try:
+                    self.compute(self.names)
+                except ValueError:
+                    # Сообщение об ошибке — как в обычном режиме
+                    evaluate(statements)
+                    raise
+            self.text = self.output()
+        except BaseException:
+            self.clear()
+            raise
+        return {"full": True, "lines": len(lines), "statements": len(statements), "computed": len(self.dumped),
+                "total": len(self.dumped), "parse": parsed - start, "evaluate": time.perf_counter() - parsed}
+
+    def update(self, lines: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Приводит состояние к новому тексту входного файла; результат — в self.text.
+
+        :return: Статистика пересборки: full — собрано заново, lines — изменённые строки, statements —
+            разобранные объявления, computed — вычисленные ключи из total, parse и evaluate — время в секундах.
+            None, если текст не изменился
+        :raises ConfigSyntaxError, ValueError: При ошибке в тексте
+        """
+        if self.text is None or self.conflicts:
+            return self.load(lines)
+        start = time.perf_counter()
+        old = self.hashes
+        hashes = list(map(hash, lines))
+        prefix = common_prefix(old, hashes)
+        if prefix == len(old) == len(hashes):
+            return None
+        suffix = common_suffix(old, hashes, min(len(old), len(hashes)) - prefix)
+        try:
+            changed, statements = self.reparse(lines, hashes, prefix, suffix)
+            if self.conflicts:
+                return self.load(lines)
+            parsed = time.perf_counter()
+            # Новые и удалённые объявления и всё, что от них зависит
+            affected = set(changed)
+            stack = list(affected)
+            while stack:
+                for dependent in self.dependents.get(stack.pop(), ()):
+                    if dependent not in affected:
+                        affected.add(dependent)
+                        stack.append(dependent)
+            declarations = self.declarations
+            for name in affected:
+                if name not in declarations:
+                    self.values.pop(name, None)
+                    self.dumped.pop(name, None)
+            computed = [name for name in affected if name in declarations]
+            self.compute(computed)
+            self.text = self.output()
+        except Exception:
+            # Сообщение об ошибке с верными номерами строк (после сдвига строк они у старых объявлений
+            # прежние) и заведомо согласованное состояние дают только полная сборка
+            return self.load(lines)
+        return {"full": False, "lines": max(len(old), len(hashes)) - prefix - suffix, "statements": statements,
+                "computed": len(computed), "total": len(declarations), "parse": parsed - start,
+                "evaluate": time.perf_counter() - parsed}
+
+    def reparse(self, lines: List[str], hashes: List[int], prefix: int, suffix: int):
+        """
+        Разбирает заново объявления, задетые строками между общими началом и концом текстов.
+
+        :return: Имена удалённых и новых объявлений и число разобранных
+        """
+        # Участки: 0 — строки до первого объявления, k — объявление k - 1 с комментариями за ним
+        bounds = list(accumulate(chain((0, self.preamble), self.lengths)))
+        count = len(bounds) - 1
+        delta = len(hashes) - len(self.hashes)
+        changed_end = len(self.hashes) - suffix
+        first = min(bisect_right(bounds, prefix) - 1, count - 1)
+        last = max(first, min(bisect_right(bounds, max(prefix, changed_end - 1)) - 1, count - 1))
+        while True:
+            begin = bounds[first]
+            finish = bounds[last + 1] + delta
+            parser = Parser("\n".join(lines[begin:finish]), begin + 1, partial=last + 1 < count)
+            with gc_paused():
+                statements = parser.statements()
+            if parser.errors:
+                raise ConfigSyntaxError(parser.errors)
+            if parser.rest is None:
+                break
+            # Объявление не закончилось к концу участка: он растёт вдвое
+            last = min(count - 1, last + (last - first + 1))
+
+        starts = [statement.line - 1 for statement in statements]
+        lengths = [end - start for start, end in zip(starts, starts[1:] + [finish])]
+        lead = (starts[0] if starts else finish) - begin  # Строки до первого объявления участка
+        if first == 0:
+            self.preamble = lead
+        elif first == 1:
+            self.preamble += lead
         else:
-            raise ValueError(f"Неизвестный токен в выражении: {token}")
+            self.lengths[first - 2] += lead
+        index = max(first - 1, 0)
+        removed = self.statements[index:last]
+        self.remove(removed)
+        self.statements[index:last] = statements
+        self.lengths[index:last] = lengths
+        self.names[index:last] = list(map(statement_name, statements))
+        self.add(statements)
+        self.hashes = hashes
+        return set(map(statement_name, removed)) | set(map(statement_name, statements)), len(statements)
+
+    def add(self, statements: List[Node]):
+        counts = self.counts
+        for statement in statements:
+            name = statement_name(statement)
+            count = counts.get(name, 0)
+            counts[name] = count + 1
+            self.conflicts += conflicts_of(name, count + 1) - conflicts_of(name, count)
+            self.declarations[name] = statement
+            for reference in references(statement):
+                self.dependents.setdefault(reference, set()).add(name)
 
-    if len(stack) != 1:
-        raise ValueError("Некорректное выражение")
-    return stack.pop()
+    def remove(self, statements: List[Node]):
+        counts = self.counts
+        for statement in statements:
+            name = statement_name(statement)
+            count = counts[name]
+            self.conflicts += conflicts_of(name, count - 1) - conflicts_of(name, count)
+            if count > 1:
+                counts[name] = count - 1
+            else:
+                del counts[name]
+            if self.declarations.get(name) is statement:
+                del self.declarations[name]
+            for reference in references(statement):
+                dependents = self.dependents[reference]
+                dependents.discard(name)
+                if not dependents:
+                    del self.dependents[reference]
 
+    def compute(self, names: List[str]):
+        """
+        Вычисляет значения и строки TOML имён names; сначала — их ещё не вычисленные зависимости.
+        Остальные значения уже в self.values. Имена объявлены по одному разу.
+        """
+        values = self.values
+        declarations = self.declarations
+        for name in names:
+            values.pop(name, None)
+        with quiet():
+            for root in names:
+                active = set()  # Объявления на пути от root, ждущие своих зависимостей
+                stack = [root]
+                while stack:
+                    name = stack[-1]
+                    if name in values:
+                        stack.pop()
+                        continue
+                    value = declarations[name].value
+                    if type(value) is Expression:
+                        pending = [reference for reference in references(declarations[name])
+                                   if reference not in values and reference in declarations]
+                        if pending and name not in active:
+                            if name in pending or not active.isdisjoint(pending):
+                                raise ValueError(f"Циклическая зависимость констант: {name}")
+                            active.add(name)
+                            stack.extend(pending)
+                            continue
+                        value = evaluate_with(value, name, values)
+                    elif type(value) is Array:
+                        value = literal(value)
+                    values[name] = value
+                    self.dumped[name] = dump_key(name, value)
+                    active.discard(name)
+                    stack.pop()
+
+    def output(self) -> str:
+        """Выходной TOML: строки ключей в порядке первого объявления и пустой graph, если его нет."""
+        dumped = self.dumped
+        # Без повторных объявлений имена и так уникальны
+        names = dict.fromkeys(self.names) if self.conflicts else self.names
+        text = "".join(map(dumped.__getitem__, names))
+        if "graph" not in dumped:
+            text += toml.dumps({"graph": []})
+        return text
 
-def is_float(value: str) -> bool:
-    """Проверяем, является ли значение числом."""
-    try:
-        float(value)
-        return True
-    except ValueError:
-        return False
+
+def watch(input_file: str, output_file: str, interval: float = 0.2):
+    """
+    Пересобирает output_file при каждом изменении input_file, пока не прервут (Ctrl+C).
+
+    :param interval: Период проверки времени изменения и размера input_file в секундах
+    """
+    config = IncrementalConfig()
+    seen = None
+    while True:
+        try:
+            stat = os.stat(input_file)
+            version = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            version = None
+        if version is not None and version != seen:
+            seen = version
+            start = time.perf_counter()
+            with open(input_file) as f:
+                lines = f.read().splitlines()
+            try:
+                stats = config.update(lines)
+                if stats is not None:
+                    with atomic_output(output_file) as f:
+                        f.write(config.text)
+            except Exception as e:
+                print(f"Ошибка: {e}", flush=True)
+            else:
+                if stats is not None:
+                    kind = "Полная сборка" if stats["full"] else "Пересборка"
+                    print(f"{kind}: строк изменено {stats['lines']}, объявлений разобрано {stats['statements']}, "
+                          f"ключей вычислено {stats['computed']} из {stats['total']}; "
+                          f"разбор {stats['parse'] * 1000:.1f} мс, вычисление {stats['evaluate'] * 1000:.1f} мс, "
+                          f"всего с записью {(time.perf_counter() - start) * 1000:.1f} мс", flush=True)
+        time.sleep(interval)
 
 
 def main():
-    if len(sys.argv) != 2:
-        print("Использование: python tool.py <output_file.toml>")
+    args = sys.argv[1:]
+    # --stream: ввод читается по строкам, ключи пишутся в файл по мере разбора
+    stream = "--stream" in args
+    if stream:
+        args.remove("--stream")
+    # --watch INPUT: выходной файл пересобирается при каждом изменении INPUT
+    watch_input = None
+    if "--watch" in args:
+        position = args.index("--watch")
+        watch_input = args[position + 1] if position + 1 < len(args) else None
+        del args[position:position + 2]
+    if len(args) != 1 or ("--watch" in sys.argv and (watch_input is None or stream)):
+        print("Использование: python tool.py [--stream | --watch <input_file>] <output_file.toml>")
         sys.exit(1)
 
     print("Скрипт начал свою работу")
 
-    output_file = sys.argv[1]
+    output_file = args[0]
+
+    if watch_input is not None:
+        print(f"Отслеживается {watch_input} (Ctrl+C для завершения)")
+        try:
+            watch(watch_input, output_file)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if stream:
+        try:
+            write_stream(sys.stdin, output_file)
+        except Exception as e:
+            print(f"Ошибка: {e}")
+            sys.exit(1)
+        print(f"Файл TOML успешно создан: {output_file}")
+        return
 
     # Считываем входные данные из stdin
     print("Введите входной текст (Ctrl+D для завершения):")
@@ -105,7 +456,7 @@ def main():
         constants = parse_constants(input_lines)
 
         # Исправляем массивы для TOML
-        constants["graph"] = [x for x in constants.get("graph", []) if x != 0.0]
+        constants["graph"] = clean_graph(constants.get("graph", []))
     except Exception as e:
         print(f"Ошибка: {e}")
         sys.exit(1)
@@ -0,0 +1,83 @@
+"""
+Benchmark of whole-repository closure analysis: SCC condensation with bitmask closures
+(dep_closure.DependencyClosure) against a naive DFS per package, on a synthetic index.
+
+Usage:
+    python benchmarks/bench_closure.py --packages 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dep_closure import DependencyClosure  # noqa: E402
+from dep_visualizer import PackageIndex  # noqa: E402
+
+
+def make_index(count, seed=0):
+    # Dependencies lean towards low-numbered "library" packages, as in a real repository;
+    # every package also provides a so: name that some others depend on, and a few
+    # dependencies point upwards to form cycles
+    rng = random.Random(seed)
+    packages = {}
+    provides = {}
+    for number in range(count):
+        deps = []
+        for _ in range(rng.randint(0, 5)):
+            target = int(number * rng.random() ** 3)
+            deps.append(f'so:lib{target}.so' if rng.random() < 0.3 else f'pkg{target}')
+        if number % 100 == 0 and number + 1 < count:
+            deps.append(f'pkg{number + 1}')
+        elif number % 100 == 1:
+            deps.append(f'pkg{number - 1}')
+        packages[f'pkg{number}'] = deps
+        provides[f'so:lib{number}.so'] = f'pkg{number}'
+    return PackageIndex(packages, provides)
+
+
+def naive_sizes(index):
+    sizes = {}
+    for name in index.packages:
+        seen = {name}
+        stack = [name]
+        while stack:
+            for dep in index.dependencies(stack.pop()):
+                if dep not in seen and dep in index.packages:
+                    seen.add(dep)
+                    stack.append(dep)
+        sizes[name] = len(seen)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SCC/bitmask closures against per-package DFS.')
+    parser.add_argument('--packages', type=int, default=50000, help='Packages in the synthetic index')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    index = make_index(args.packages, args.seed)
+
+    start = time.perf_counter()
+    closure = DependencyClosure(index)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    sizes = closure.sizes()
+    sizes_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = naive_sizes(index)
+    naive_time = time.perf_counter() - start
+
+    mask_bytes = sum((mask.bit_length() + 7) // 8 for mask in closure.masks)
+    print(f"{args.packages} packages, {len(closure.components)} components, {len(closure.cycles())} cycles, "
+          f"mean closure {sum(sizes.values()) / len(sizes):.1f}, bitmasks {mask_bytes / 1024 / 1024:.1f} MB")
+    print(f"condensation + closures: {build_time:.3f} s, all sizes: {sizes_time:.3f} s")
+    print(f"naive DFS per package:   {naive_time:.3f} s ({naive_time / (build_time + sizes_time):.1f}x slower)")
+    print("results match" if sizes == expected else "RESULTS DIFFER")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Бенчмарк разбора конфигурационного языка: Config.parse_constants (однопроходный лексер и парсер
+config_parser) против прежней построчной реализации на re.match и float() в try/except.
+
+Вход генерируется: объявления констант числами и выражениями, ключи с массивами в одну строку
+(прежняя реализация других не понимает) и текстовые ключи. Результаты обеих реализаций сравниваются.
+
+Запуск:
+    python benchmarks/bench_config.py --lines 100000 300000
+"""
+import argparse
+import math
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Config import parse_constants  # noqa: E402
+
+
+def legacy_parse_constants(lines):
+    """Прежняя реализация Config.parse_constants (для сравнения)."""
+    constants = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("set"):
+            match = re.match(r"set\s+([_a-zA-Z]+)\s*=\s*(.+)", line)
+            if not match:
+                raise SyntaxError(f"Некорректное объявление константы: {line}")
+            name, value = match.groups()
+            if value.startswith("![") and value.endswith("]"):
+                constants[name] = legacy_evaluate_expression(value[2:-1].split(), constants)
+            elif legacy_is_float(value):
+                constants[name] = float(value)
+            else:
+                raise ValueError(f"Некорректное значение константы: {value}")
+        elif "=" in line:
+            key, value = map(str.strip, line.split("=", 1))
+            if value.startswith("{") and value.endswith("}"):
+                constants[key] = [float(x) for x in value.strip("{}").split(".") if x.strip()]
+            else:
+                constants[key] = value
+    return constants
+
+
+def legacy_evaluate_expression(expression, constants):
+    stack = []
+    for token in expression:
+        if token in constants:
+            stack.append(constants[token])
+        elif legacy_is_float(token):
+            stack.append(float(token))
+        elif token == "+":
+            b, a = stack.pop(), stack.pop()
+            stack.append(a + b)
+        elif token == "-":
+            b, a = stack.pop(), stack.pop()
+            stack.append(a - b)
+        elif token == "*":
+            b, a = stack.pop(), stack.pop()
+            stack.append(a * b)
+        elif token == "sqrt":
+            stack.append(math.sqrt(stack.pop()))
+        else:
+            raise ValueError(f"Неизвестный токен в выражении: {token}")
+    return stack.pop()
+
+
+def legacy_is_float(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def constant_name(number):
+    # Прежняя реализация допускает в именах констант только буквы и '_'
+    letters = ''
+    while True:
+        number, digit = divmod(number, 26)
+        letters += chr(ord('a') + digit)
+        if not number:
+            return 'c_' + letters
+
+
+def make_input(count, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    declared = []
+    for number in range(count):
+        kind = number % 10
+        if kind == 0:
+            lines.append(f'# section {number}')
+        elif kind < 4 or len(declared) < 2:
+            lines.append(f'set {constant_name(number)} = {rng.randint(0, 1000)}.{rng.randint(0, 99)}')
+            declared.append(constant_name(number))
+        elif kind < 7:
+            a, b = rng.choice(declared), rng.choice(declared)
+            lines.append(f'set {constant_name(number)} = ![{a} {b} + {rng.randint(1, 9)} * sqrt]')
+            declared.append(constant_name(number))
+        elif kind < 9:
+            values = '. '.join(str(rng.randint(0, 999)) for _ in range(rng.randint(1, 20)))
+            lines.append(f'key{number} = {{ {values}. }}')
+        else:
+            lines.append(f'title{number} = generated text {number}')
+    return lines
+
+
+def best_time(func, lines, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the config parser against the line-based one.')
+    parser.add_argument('--lines', type=int, nargs='+', default=[100000, 300000], help='Input sizes in lines')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'legacy s':>10} {'parser s':>10} {'speedup':>8}")
+    for count in args.lines:
+        lines = make_input(count)
+        legacy, expected = best_time(legacy_parse_constants, lines, args.repeat)
+        current, result = best_time(parse_constants, lines, args.repeat)
+        mark = '' if result == expected else '  RESULTS DIFFER'
+        print(f"{count:>8} {legacy:>10.3f} {current:>10.3f} {legacy / current:>8.2f}{mark}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Бенчмарк вычисления констант: прежний интерпретатор постфиксной записи (стек по токенам, константы
+строго по порядку) против скомпилированных выражений config_eval — проходом по порядку (evaluate)
+и ленивым вычислением по графу зависимостей (Evaluator).
+
+Константы ссылаются на две случайные предыдущие; формы выражений повторяются, как в
+сгенерированных конфигурациях. Для Evaluator отдельно измеряются построение (компиляция и граф),
+вычисление всех констант уже скомпилированной программы, одна константа по требованию и те же
+объявления в обратном порядке (прежняя реализация их не принимает).
+
+Запуск:
+    python benchmarks/bench_config_eval.py --constants 30000 100000
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_eval import Evaluator, evaluate  # noqa: E402
+from config_parser import Expression, parse  # noqa: E402
+
+# Значения остаются ограниченными на любой глубине ссылок
+SHAPES = [
+    '{a} {b} + {n} * sqrt',
+    '{a} {n} - abs sqrt {b} +',
+    '{a} {b} max {n} /',
+    '{a} {b} - abs sqrt',
+    '{a} {n} * {b} + {n} 1 + /',
+]
+
+OPERATIONS = {"+": lambda a, b: a + b, "-": lambda a, b: a - b, "*": lambda a, b: a * b,
+              "/": lambda a, b: a / b}
+
+
+def interpreted_evaluate(statements):
+    """Вычисление в порядке объявлений, как до компиляции: стек по токенам."""
+    constants = {}
+    for statement in statements:
+        value = statement.value
+        if type(value) is Expression:
+            stack = []
+            for token in value.tokens:
+                if type(token) is float:
+                    stack.append(token)
+                elif token in constants:
+                    stack.append(constants[token])
+                elif token in OPERATIONS:
+                    b = stack.pop()
+                    stack.append(OPERATIONS[token](stack.pop(), b))
+                elif token == "sqrt":
+                    stack.append(math.sqrt(stack.pop()))
+                elif token == "max":
+                    stack.append(max(stack.pop(), stack.pop()))
+                elif token == "abs":
+                    stack.append(abs(stack.pop()))
+                else:
+                    raise ValueError(token)
+            value = stack.pop()
+        constants[statement.name] = value
+    return constants
+
+
+def make_program(count, seed=0):
+    rng = random.Random(seed)
+    lines = [f'set c0 = {rng.randint(1, 100)}', f'set c1 = {rng.randint(1, 100)}']
+    for number in range(2, count):
+        a, b = rng.randrange(number), rng.randrange(number)
+        body = rng.choice(SHAPES).format(a=f'c{a}', b=f'c{b}', n=rng.randint(1, 9))
+        lines.append(f'set c{number} = ![{body}]')
+    return lines
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark compiled evaluation of config constants.')
+    parser.add_argument('--constants', type=int, nargs='+', default=[30000, 100000], help='Number of constants')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    for count in args.constants:
+        lines = make_program(count)
+        statements = parse('\n'.join(lines)).statements
+        last = f'c{count - 1}'
+        print(f'{count} constants')
+
+        interpreted, expected = best_time(lambda: interpreted_evaluate(statements), args.repeat)
+        print(f'  interpreter, in order:       {interpreted:8.3f} s')
+
+        compiled, result = best_time(lambda: evaluate(statements), args.repeat)
+        mark = '' if result == expected else '  RESULTS DIFFER'
+        print(f'  evaluate, in order:          {compiled:8.3f} s{mark}')
+
+        build, evaluator = best_time(lambda: Evaluator(statements), args.repeat)
+        print(f'  Evaluator: compile + graph:  {build:8.3f} s')
+
+        def first():
+            evaluator.reset()
+            return evaluator.result()
+        evaluated, result = best_time(first, args.repeat)
+        mark = '' if result == expected else '  RESULTS DIFFER'
+        print(f'  Evaluator: all constants:    {evaluated:8.3f} s{mark}')
+
+        def one():
+            evaluator.reset()
+            return evaluator[last]
+        single, _ = best_time(one, args.repeat)
+        print(f'  Evaluator: {last} only:{"":{max(0, 10 - len(last))}}{single:8.3f} s')
+
+        statements.reverse()
+        build, evaluator = best_time(lambda: Evaluator(statements), args.repeat)
+        evaluated, result = best_time(first, args.repeat)
+        mark = '' if result == expected else '  RESULTS DIFFER'
+        print(f'  reversed declarations:       {build + evaluated:8.3f} s{mark}')
+
+
+if __name__ == '__main__':
+    main()
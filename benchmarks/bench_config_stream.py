@@ -0,0 +1,72 @@
+"""
+Бенчмарк памяти преобразования в TOML: прежний путь Config.main (весь ввод, словарь констант
+и toml.dumps всего сразу) против потокового write_stream (Config.py --stream).
+Пик выделенной памяти меряется tracemalloc, время — отдельным прогоном без него.
+
+Запуск:
+    python benchmarks/bench_config_stream.py --lines 100000 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import toml  # noqa: E402
+from bench_config import make_input  # noqa: E402
+from Config import clean_graph, parse_constants, write_stream  # noqa: E402
+
+
+def convert_whole(input_path, output_path):
+    with open(input_path) as f:
+        lines = f.read().splitlines()
+    constants = parse_constants(lines)
+    constants["graph"] = clean_graph(constants.get("graph", []))
+    with open(output_path, "w") as f:
+        f.write(toml.dumps(constants))
+
+
+def convert_stream(input_path, output_path):
+    with open(input_path) as f:
+        write_stream(f, output_path)
+
+
+def measure(func, input_path, output_path):
+    start = time.perf_counter()
+    func(input_path, output_path)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(input_path, output_path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark memory of whole-input and streaming conversion.')
+    parser.add_argument('--lines', type=int, nargs='+', default=[100000, 300000], help='Input sizes in lines')
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'input MB':>9} {'whole s':>8} {'whole MB':>9} {'stream s':>9} {'stream MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, 'input.txt')
+        whole_path = os.path.join(tmp, 'whole.toml')
+        stream_path = os.path.join(tmp, 'stream.toml')
+        for count in args.lines:
+            with open(input_path, 'w') as f:
+                f.writelines(line + '\n' for line in make_input(count))
+            whole, whole_peak = measure(convert_whole, input_path, whole_path)
+            stream, stream_peak = measure(convert_stream, input_path, stream_path)
+            size = os.path.getsize(input_path) / 2 ** 20
+            with open(whole_path) as a, open(stream_path) as b:
+                mark = '' if a.read() == b.read() else '  OUTPUT DIFFERS'
+            print(f"{count:>8} {size:>9.1f} {whole:>8.2f} {whole_peak / 2 ** 20:>9.1f} "
+                  f"{stream:>9.2f} {stream_peak / 2 ** 20:>10.1f}{mark}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Бенчмарк выражений над массивами: поэлементные операции и свёртки config_vector на Python
+против тех же выражений через NumPy (если он установлен).
+
+Программа — два массива заданной длины и цепочка выражений над ними: арифметика с broadcasting
+числа, sqrt, max двух массивов и свёртки sum и maxof. Результаты обоих вариантов сравниваются
+с относительной точностью 1e-9 (суммы на Python и в NumPy округляются по-разному).
+
+Запуск:
+    python benchmarks/bench_config_vector.py --length 1000 100000
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_vector  # noqa: E402
+from config_eval import evaluate  # noqa: E402
+from config_parser import parse  # noqa: E402
+
+# Значения остаются положительными и ограниченными на любой длине цепочки
+SHAPES = [
+    'v{p} w + 0.5 * sqrt',
+    'v{p} 2 * w - abs 1 +',
+    'v{p} w max v{p} sum v{p} len / - abs',
+    'v{p} v{p} maxof / w +',
+]
+
+
+def make_program(length, steps, seed=0):
+    rng = random.Random(seed)
+    lines = [
+        'set v0 = { ' + ' '.join(f'{rng.randint(1, 1000)}.' for _ in range(length)) + ' }',
+        'set w = { ' + ' '.join(f'{rng.randint(1, 1000)}.' for _ in range(length)) + ' }',
+    ]
+    for step in range(1, steps + 1):
+        expression = SHAPES[step % len(SHAPES)].format(p=step - 1)
+        lines.append(f'set v{step} = ![{expression}]')
+    lines.append(f'set total = ![v{steps} sum]')
+    return lines
+
+
+def same(a, b):
+    if isinstance(a, list):
+        return len(a) == len(b) and all(math.isclose(x, y, rel_tol=1e-9) for x, y in zip(a, b))
+    return a == b or math.isclose(a, b, rel_tol=1e-9)
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark array expressions in pure Python and NumPy.')
+    parser.add_argument('--length', type=int, nargs='+', default=[1000, 100000], help='Array lengths')
+    parser.add_argument('--steps', type=int, default=20, help='Expressions in the chain')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    numpy = config_vector.numpy
+    if numpy is None:
+        print('NumPy is not installed: only the pure Python variant is measured')
+    print(f"{'length':>8} {'python s':>10} {'numpy s':>10} {'speedup':>8}")
+    for length in args.length:
+        statements = parse('\n'.join(make_program(length, args.steps))).statements
+        config_vector.numpy = None
+        try:
+            python, expected = best_time(lambda: evaluate(statements), args.repeat)
+        finally:
+            config_vector.numpy = numpy
+        if numpy is None:
+            print(f"{length:>8} {python:>10.3f}")
+            continue
+        vectorized, result = best_time(lambda: evaluate(statements), args.repeat)
+        mark = '' if all(same(result[name], expected[name]) for name in expected) else '  RESULTS DIFFER'
+        print(f"{length:>8} {python:>10.3f} {vectorized:>10.3f} {python / vectorized:>8.2f}{mark}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Бенчмарк режима --watch: пересборка IncrementalConfig после правки входного текста против полного
+преобразования (parse_constants и toml.dumps, как без --watch).
+
+Вход — тот же, что в bench_config.py. Правки: заменить число в 1, 10 и 100 объявлениях констант
+в середине текста и вставить строку в начало (сдвигает номера всех строк). Для каждой правки
+выводятся число разобранных объявлений и вычисленных ключей, время разбора, вычисления и сборки
+выходного текста. Результат пересборки сравнивается с полным преобразованием.
+
+Запуск:
+    python benchmarks/bench_config_watch.py --lines 100000 300000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import toml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Config import IncrementalConfig, clean_graph, parse_constants  # noqa: E402
+from bench_config import make_input  # noqa: E402
+
+NUMBER_RE = re.compile(r'^(set \w+ = )(\d+)\.(\d+)$')
+
+
+def convert(lines):
+    constants = parse_constants(lines)
+    constants["graph"] = clean_graph(constants.get("graph", []))
+    return toml.dumps(constants)
+
+
+def edited(lines, count):
+    """Копия lines, в которой число заменено в count объявлениях констант начиная с середины."""
+    lines = lines[:]
+    changed = 0
+    for number in range(len(lines) // 2, len(lines)):
+        match = NUMBER_RE.match(lines[number])
+        if match:
+            lines[number] = f'{match.group(1)}{int(match.group(2)) + 1}.{match.group(3)}'
+            changed += 1
+            if changed == count:
+                break
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark incremental rebuilds of the watch mode.')
+    parser.add_argument('--lines', type=int, nargs='+', default=[100000, 300000], help='Input sizes in lines')
+    args = parser.parse_args()
+
+    for count in args.lines:
+        lines = make_input(count)
+        start = time.perf_counter()
+        convert(lines)
+        full = time.perf_counter() - start
+        config = IncrementalConfig()
+        start = time.perf_counter()
+        config.load(lines)
+        loaded = time.perf_counter() - start
+        print(f'{count} lines: full conversion {full:.3f} s, watch state built in {loaded:.3f} s')
+        print(f"  {'edit':<16} {'parsed':>7} {'computed':>9} {'parse ms':>9} {'eval ms':>8} {'total ms':>9}")
+        edits = [('1 constant', edited(lines, 1)), ('10 constants', edited(lines, 10)),
+                 ('100 constants', edited(lines, 100)), ('line at top', ['# inserted'] + lines)]
+        for name, text in edits:
+            config.load(lines)
+            start = time.perf_counter()
+            stats = config.update(text)
+            elapsed = time.perf_counter() - start
+            mark = '' if config.text == convert(text) else '  RESULTS DIFFER'
+            print(f"  {name:<16} {stats['statements']:>7} {stats['computed']:>9} {stats['parse'] * 1000:>9.1f} "
+                  f"{stats['evaluate'] * 1000:>8.1f} {elapsed * 1000:>9.1f}{mark}")
+
+
+if __name__ == '__main__':
+    main()
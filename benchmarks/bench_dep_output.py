@@ -0,0 +1,69 @@
+"""
+Benchmark of graph output: the old DOT string built with `dot +=` against the streaming writers of
+dep_output, and the edge count left by transitive reduction and fan-out collapse, on the whole
+dependency graph of a synthetic index. Peak memory allocated while writing is traced as well.
+
+Usage:
+    python benchmarks/bench_dep_output.py --packages 50000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_closure import make_index  # noqa: E402
+from dep_closure import transitive_reduction  # noqa: E402
+from dep_output import WRITERS, collapse_fanout  # noqa: E402
+
+
+def concatenated_dot(graph):
+    dot = 'digraph dependencies {\n'
+    for pkg, deps in graph.items():
+        for dep in deps:
+            dot += f'    "{pkg}" -> "{dep}";\n'
+    dot += '}'
+    return dot
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark streaming graph writers and graph reduction.')
+    parser.add_argument('--packages', type=int, default=50000, help='Packages in the synthetic index')
+    parser.add_argument('--max-fanout', type=int, default=3, help='Fan-out limit for collapse_fanout')
+    args = parser.parse_args()
+
+    index = make_index(args.packages)
+    graph = {name: index.dependencies(name) for name in index.packages}
+    edges = sum(map(len, graph.values()))
+    print(f"{len(graph)} packages, {edges} edges")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'graph')
+        def run(label, write):
+            tracemalloc.start()
+            start = time.perf_counter()
+            with open(path, 'w', newline='') as f:
+                write(f)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{label:<16} {elapsed:.3f} s, {os.path.getsize(path) / 1024 / 1024:.1f} MB written, "
+                  f"peak {peak / 1024 / 1024:.2f} MB allocated")
+
+        run('dot +=:', lambda f: f.write(concatenated_dot(graph)))
+        for name, writer in WRITERS.items():
+            run(f'stream {name}:', lambda f: writer(graph, f))
+
+    start = time.perf_counter()
+    reduced = transitive_reduction(graph)
+    reduce_time = time.perf_counter() - start
+    print(f"reduction:       {reduce_time:.3f} s, {sum(map(len, reduced.values()))} edges left")
+    collapsed = collapse_fanout(reduced, args.max_fanout)
+    print(f"fan-out <= {args.max_fanout}:    {sum(map(len, collapsed.values()))} edges left")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark of loading several repositories: one after another versus dep_visualizer.load_repositories,
+which parses them in parallel processes and merges them by priority. Fixture repositories
+(local directories with a signed-looking APKINDEX.tar.gz) are generated in a temporary directory.
+
+Usage:
+    python benchmarks/bench_dep_repositories.py --packages 60000 30000 20000
+"""
+import argparse
+import gzip
+import io
+import os
+import random
+import sys
+import tarfile
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dep_visualizer import load_index, load_repositories  # noqa: E402
+
+
+def _tar(members, end_of_archive=True):
+    buffer = io.BytesIO()
+    tar = tarfile.open(fileobj=buffer, mode='w', format=tarfile.USTAR_FORMAT)
+    for name, data in members:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    if end_of_archive:
+        tar.close()
+    return buffer.getvalue()
+
+
+def make_repository(path, count, prefix='pkg', seed=0):
+    # Like a real APKINDEX.tar.gz: a gzip stream with the signature member (without the tar
+    # end-of-archive blocks) followed by a gzip stream with DESCRIPTION and APKINDEX
+    rng = random.Random(seed)
+    records = []
+    for number in range(count):
+        deps = [f'{prefix}{int(number * rng.random() ** 3)}>=1.0' for _ in range(rng.randint(0, 4))]
+        if number % 3:
+            deps.append('so:libc.musl-x86_64.so.1')
+        record = [f'C:Q1{number:027d}=', f'P:{prefix}{number}', 'V:1.0-r0', 'A:x86_64', 'S:1024', 'I:4096',
+                  f'T:Synthetic package {number}', 'L:MIT', f'D:{" ".join(deps)}']
+        if number % 5 == 0:
+            record.append(f'p:so:lib{prefix}{number}.so.1=1.0 cmd:{prefix}{number}=1.0')
+        records.append('\n'.join(record) + '\n')
+    records.append('P:musl\nV:1.2.5-r0\np:so:libc.musl-x86_64.so.1=1\n')
+    index = '\n'.join(records).encode('utf-8')
+
+    os.makedirs(path, exist_ok=True)
+    signature = _tar([(f'.SIGN.RSA.{prefix}-{seed}.rsa.pub', rng.randbytes(256))], end_of_archive=False)
+    with open(os.path.join(path, 'APKINDEX.tar.gz'), 'wb') as f:
+        f.write(gzip.compress(signature))
+        f.write(gzip.compress(_tar([('DESCRIPTION', b'synthetic'), ('APKINDEX', index)])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sequential vs parallel loading of several repositories.')
+    parser.add_argument('--packages', type=int, nargs='+', default=[60000, 30000, 20000],
+                        help='Package count of each fixture repository')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repos = []
+        for number, count in enumerate(args.packages):
+            repo = os.path.join(tmp, f'repo{number}')
+            make_repository(repo, count, prefix=f'r{number}pkg', seed=number)
+            repos.append(repo)
+
+        times = []
+        for repo in repos:
+            start = time.perf_counter()
+            load_index(repo)
+            times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        index = load_repositories(repos)
+        parallel = time.perf_counter() - start
+
+    print(f"{len(index.packages)} packages from {len(repos)} repositories")
+    print(f"slowest single repository: {max(times):.3f} s, sequential: {sum(times):.3f} s, parallel: {parallel:.3f} s")
+
+
+if __name__ == '__main__':
+    main()
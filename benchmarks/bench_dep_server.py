@@ -0,0 +1,119 @@
+"""
+Throughput benchmark of dep_server in queries/sec: over a Unix socket (one request at a time and
+pipelined), over the NDJSON stdin protocol, and a dep_visualizer process per query for comparison.
+Also checks that replacing the fixture index is picked up by the background reload.
+
+Usage:
+    python benchmarks/bench_dep_server.py --packages 50000 --queries 20000
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_dep_repositories import make_repository  # noqa: E402
+from dep_client import DependencyClient  # noqa: E402
+
+
+def make_requests(count, packages, seed=0):
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(count):
+        op = rng.choice(['deps', 'rdeps', 'closure'])
+        requests.append((op, {'package': f'pkg{rng.randrange(packages)}'}))
+    return requests
+
+
+def wait_for_socket(path, process, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited')
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(path)
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+
+def rate(count, elapsed):
+    return f'{count / elapsed:10.0f} queries/s ({count} in {elapsed:.2f} s)'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dep_server throughput.')
+    parser.add_argument('--packages', type=int, default=50000, help='Packages in the fixture repository')
+    parser.add_argument('--queries', type=int, default=20000, help='Queries per measurement')
+    parser.add_argument('--processes', type=int, default=5, help='dep_visualizer runs for the per-process baseline')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = os.path.join(tmp, 'repo')
+        cache = os.path.join(tmp, 'cache')
+        make_repository(repo, args.packages)
+        requests = make_requests(args.queries, args.packages)
+        command = [sys.executable, os.path.join(ROOT, 'dep_server.py'), '--repository', repo, '--cache-dir', cache]
+
+        path = os.path.join(tmp, 'dep.sock')
+        server = subprocess.Popen(command + ['--socket', path, '--poll', '0.5'], stderr=subprocess.DEVNULL)
+        try:
+            start = time.perf_counter()
+            wait_for_socket(path, server)
+            print(f'server start (parse + cache): {time.perf_counter() - start:.2f} s')
+            with DependencyClient(path) as client:
+                # Closures are built on the first closure query
+                start = time.perf_counter()
+                client.closure_size('pkg0')
+                print(f'first closure query:          {time.perf_counter() - start:.2f} s')
+
+                start = time.perf_counter()
+                for op, params in requests:
+                    client.query(op, **params)
+                print(f'socket, one at a time: {rate(len(requests), time.perf_counter() - start)}')
+
+                start = time.perf_counter()
+                client.query_many(requests)
+                print(f'socket, pipelined:     {rate(len(requests), time.perf_counter() - start)}')
+
+                generation = client.query('stats')['generation']
+                make_repository(repo, args.packages + 1, seed=1)
+                start = time.perf_counter()
+                while client.query('stats')['generation'] == generation:
+                    time.sleep(0.05)
+                print(f'reload after index change: {time.perf_counter() - start:.2f} s, '
+                      f'{client.query("stats")["packages"]} packages')
+        finally:
+            server.terminate()
+            server.wait()
+
+        lines = ''.join(json.dumps({'id': number, 'op': op, **params}) + '\n'
+                        for number, (op, params) in enumerate(requests))
+        start = time.perf_counter()
+        result = subprocess.run(command + ['--stdin', '--poll', '0'], input=lines, capture_output=True,
+                                text=True, check=True)
+        elapsed = time.perf_counter() - start
+        assert len(result.stdout.splitlines()) == len(requests)
+        print(f'stdin, including start: {rate(len(requests), elapsed)}')
+
+        start = time.perf_counter()
+        for op, params in requests[:args.processes]:
+            subprocess.run([sys.executable, os.path.join(ROOT, 'dep_visualizer.py'), '--repository', repo,
+                            '--cache-dir', cache, '--package', params['package'], '--depth', '1',
+                            '--format', 'json', '--output', os.path.join(tmp, 'graph.json')],
+                           stdout=subprocess.DEVNULL, check=True)
+        print(f'process per query:     {rate(args.processes, time.perf_counter() - start)}')
+
+
+if __name__ == '__main__':
+    main()
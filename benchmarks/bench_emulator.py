@@ -0,0 +1,268 @@
+"""
+Набор бенчмарков эмуляторов (emul.py и emul_cmd.py) на синтетических архивах.
+
+Архивы генерируются нескольких форм (широкая директория, глубокое дерево, директории по 100 файлов)
+и размеров, в каждый добавляются большой текстовый и двоичный члены. Для каждого сочетания
+формы, размера и эмулятора в отдельном процессе измеряются Emulator.__init__ (без индекса и с ним),
+ls, cd, cat, rmdir, _remove_from_zip и sync, а также пиковый RSS процесса.
+Команды, которых нет в эмуляторе, пропускаются.
+
+Результаты пишутся в JSON. С --baseline результаты сравниваются с сохранённым прогоном:
+метрики, выросшие больше чем в --threshold раз, печатаются как регрессии, код возврата — 1.
+
+Запуск:
+    python benchmarks/bench_emulator.py --sizes 1000 10000 100000 --output bench.json
+    python benchmarks/bench_emulator.py --sizes 1000000 --shapes balanced --output big.json
+    python benchmarks/bench_emulator.py --output new.json --baseline bench.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+try:
+    import resource
+except ImportError:  # Windows: пиковый RSS не измеряется
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SHAPES = ['wide', 'deep', 'balanced']
+SHELLS = ['emul', 'emul_cmd']
+DEPTH = 100  # Глубина дерева формы deep
+FANOUT = 100  # Число файлов в директории формы balanced
+EMPTY_DIRS = 200  # Пустые директории — цели rmdir
+
+
+def target_directory(shape):
+    """Директория, на которой измеряются ls и cd."""
+    if shape == 'wide':
+        return 'wide'
+    if shape == 'deep':
+        return 'deep/' + '/'.join(f'l{level}' for level in range(DEPTH - 1))
+    return 'root/d0'
+
+
+def member_name(shape, number):
+    if shape == 'wide':
+        return f'wide/f{number}.txt'
+    if shape == 'deep':
+        levels = ''.join(f'l{level}/' for level in range(number % DEPTH))
+        return f'deep/{levels}f{number}.txt'
+    return f'root/d{number // FANOUT}/f{number}.txt'
+
+
+def make_archive(path, shape, entries, large_mb, binary_kb):
+    """
+    Создаёт синтетический архив.
+
+    :param path: Путь к создаваемому архиву
+    :param shape: 'wide' — все файлы в одной директории, 'deep' — файлы на глубине до DEPTH,
+                  'balanced' — директории по FANOUT файлов
+    :param entries: Число небольших файлов
+    :param large_mb: Размер большого текстового члена data/large.txt в мегабайтах
+    :param binary_kb: Размер двоичного члена data/binary.bin в килобайтах
+    """
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for number in range(entries):
+            zf.writestr(member_name(shape, number), f'file {number}\n')
+        for number in range(EMPTY_DIRS):
+            zf.writestr(f'empty/e{number}/', b'')
+        zf.writestr('data/small.txt', ''.join(f'line {number}\n' for number in range(100)))
+        with zf.open('data/large.txt', 'w', force_zip64=True) as member:
+            line = b'The quick brown fox jumps over the lazy dog 0123456789\n'
+            block = line * (1024 * 1024 // len(line))
+            for _ in range(large_mb):
+                member.write(block)
+        zf.writestr('data/binary.bin', os.urandom(binary_kb * 1024), zipfile.ZIP_STORED)
+
+
+def measure(func, repeat, budget=2.0):
+    """
+    Среднее время одного вызова func в секундах.
+    Вызовов не больше repeat и не дольше budget секунд в сумме, но хотя бы один.
+    """
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if calls >= repeat or elapsed >= budget:
+            return elapsed / calls
+
+
+def peak_rss_mb():
+    """Пиковый RSS текущего процесса в мегабайтах (None, если не поддерживается)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS — байты
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_worker(shell, zip_path, shape, repeat):
+    """Измерения для одного эмулятора на одном архиве; выполняется в отдельном процессе."""
+    import importlib
+    from emul_commands import execute_command, stream_output
+    from emul_index import index_path_for
+
+    emulator_class = importlib.import_module(shell).Emulator
+    log_path = zip_path + '.log'
+    metrics = {}
+
+    def run(command):
+        stream_output(execute_command(emulator, command), lambda chunk: None)
+
+    if os.path.exists(index_path_for(zip_path)):
+        os.remove(index_path_for(zip_path))
+    start = time.perf_counter()
+    emulator = emulator_class('bench', 'bench', zip_path, log_path)
+    metrics['init_cold_ms'] = (time.perf_counter() - start) * 1e3
+    if hasattr(emulator, 'close'):
+        emulator.close()
+    start = time.perf_counter()
+    emulator = emulator_class('bench', 'bench', zip_path, log_path)
+    metrics['init_warm_ms'] = (time.perf_counter() - start) * 1e3
+
+    target = target_directory(shape)
+    metrics['cd_us'] = measure(lambda: (run(f'cd /{target}'), run('cd /')), repeat) / 2 * 1e6
+    metrics['ls_us'] = measure(lambda: run(f'ls /{target}'), repeat) * 1e6
+
+    if getattr(emulator, 'cat', None) is not None:
+        metrics['cat_small_us'] = measure(lambda: run('cat /data/small.txt'), repeat) * 1e6
+        metrics['cat_large_ms'] = measure(lambda: run('cat /data/large.txt'), 3) * 1e3
+        metrics['cat_binary_ms'] = measure(lambda: run('cat /data/binary.bin'), 3) * 1e3
+
+    if getattr(emulator, 'rmdir', None) is not None:
+        names = iter(range(EMPTY_DIRS))
+        metrics['rmdir_us'] = measure(lambda: run(f'rmdir /empty/e{next(names)}'), EMPTY_DIRS) * 1e6
+    if getattr(emulator, '_remove_from_zip', None) is not None:
+        names = iter(range(repeat))
+        metrics['remove_from_zip_us'] = measure(lambda: emulator._remove_from_zip(f'missing/m{next(names)}/'),
+                                                repeat) * 1e6
+    if getattr(emulator, 'sync', None) is not None:
+        start = time.perf_counter()
+        emulator.sync()
+        metrics['sync_ms'] = (time.perf_counter() - start) * 1e3
+
+    if hasattr(emulator, 'close'):
+        emulator.close()
+    metrics['peak_rss_mb'] = peak_rss_mb()
+    return metrics
+
+
+def run_case(archive, shell, shape, repeat, workdir):
+    """Запускает измерения в новом процессе на копии архива (rmdir и sync его изменяют)."""
+    zip_path = os.path.join(workdir, f'{shell}.zip')
+    shutil.copyfile(archive, zip_path)
+    try:
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', shell, '--zip', zip_path,
+                                 '--shape', shape, '--repeat', str(repeat)],
+                                stdout=subprocess.PIPE, check=True, text=True)
+    finally:
+        for suffix in ('', '.idx', '.tri', '.journal', '.log'):
+            if os.path.exists(zip_path + suffix):
+                os.remove(zip_path + suffix)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, threshold):
+    """
+    Сравнивает результаты с базовым прогоном по совпадающим (форма, размер, эмулятор) и метрикам.
+
+    :return: Список строк отчёта и число регрессий
+    """
+    def key(case):
+        return case['shape'], case['entries'], case['shell']
+
+    saved = {key(case): case['metrics'] for case in baseline['results']}
+    lines = [f"{'shape':<9} {'entries':>8} {'shell':<9} {'metric':<20} {'baseline':>12} {'current':>12} {'ratio':>7}"]
+    regressions = 0
+    for case in results:
+        old_metrics = saved.get(key(case))
+        if old_metrics is None:
+            continue
+        for metric, value in case['metrics'].items():
+            old = old_metrics.get(metric)
+            if value is None or not old:
+                continue
+            ratio = value / old
+            mark = ''
+            if ratio > threshold:
+                mark = '  REGRESSION'
+                regressions += 1
+            lines.append(f"{case['shape']:<9} {case['entries']:>8} {case['shell']:<9} {metric:<20} "
+                         f"{old:>12.1f} {value:>12.1f} {ratio:>7.2f}{mark}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark both emulators on synthetic archives.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Archive sizes (entries)')
+    parser.add_argument('--shapes', nargs='+', choices=SHAPES, default=SHAPES, help='Archive shapes')
+    parser.add_argument('--shells', nargs='+', choices=SHELLS, default=SHELLS, help='Emulators to measure')
+    parser.add_argument('--repeat', type=int, default=1000, help='Maximum calls per command')
+    parser.add_argument('--large_mb', type=int, default=32, help='Size of the large text member in MB')
+    parser.add_argument('--binary_kb', type=int, default=1024, help='Size of the binary member in KB')
+    parser.add_argument('--output', default='bench_emulator.json', help='JSON file for the results')
+    parser.add_argument('--baseline', help='Saved results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.5, help='Slowdown ratio reported as a regression')
+    parser.add_argument('--worker', choices=SHELLS, help=argparse.SUPPRESS)
+    parser.add_argument('--zip', help=argparse.SUPPRESS)
+    parser.add_argument('--shape', choices=SHAPES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        # Эмуляторы могут печатать сообщения; результат — последняя строка stdout
+        print(json.dumps(run_worker(args.worker, args.zip, args.shape, args.repeat)))
+        return
+
+    results = []
+    print(f"{'shape':<9} {'entries':>8} {'shell':<9} metrics")
+    with tempfile.TemporaryDirectory() as tmp:
+        for shape in args.shapes:
+            for entries in args.sizes:
+                archive = os.path.join(tmp, f'{shape}-{entries}.zip')
+                make_archive(archive, shape, entries, args.large_mb, args.binary_kb)
+                for shell in args.shells:
+                    metrics = run_case(archive, shell, shape, args.repeat, tmp)
+                    results.append({'shape': shape, 'entries': entries, 'shell': shell, 'metrics': metrics})
+                    summary = ' '.join(f"{name}={value:.1f}" for name, value in metrics.items() if value is not None)
+                    print(f"{shape:<9} {entries:>8} {shell:<9} {summary}")
+                os.remove(archive)
+
+    report = {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'large_mb': args.large_mb,
+            'binary_kb': args.binary_kb,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as output:
+        json.dump(report, output, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        lines, regressions = compare(results, baseline, args.threshold)
+        print('\n'.join(lines))
+        print(f"{regressions} regression(s) over {args.threshold}x")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
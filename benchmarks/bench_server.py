@@ -0,0 +1,122 @@
+"""
+Нагрузочный клиент сервера эмулятора (emul_server.py).
+
+Открывает заданное число одновременных сеансов, каждый выполняет одну и ту же смесь команд,
+и печатает p50/p99 задержки по каждой команде и общую пропускную способность.
+Без --socket запускает сервер сам на синтетическом архиве.
+
+Запуск:
+    python benchmarks/bench_server.py --sessions 200 --rounds 20
+    python benchmarks/bench_server.py --socket /tmp/emul.sock --sessions 100
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from emul_batch import percentile  # noqa: E402
+from emul_server import request  # noqa: E402
+
+# Смесь команд одного раунда сеанса
+COMMANDS = ['ls', 'cd root/d1', 'ls', 'cat f100.txt', 'head -n 3 f101.txt', 'du', 'cd ..', 'cd ..',
+            'find root/d2 -name *.txt', 'rmdir root/empty']
+
+
+def make_archive(path, entries, fanout=100):
+    """
+    Создаёт архив с entries небольшими текстовыми файлами, разложенными по директориям по fanout штук,
+    и пустой директорией root/empty.
+    """
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('root/', b'')
+        zf.writestr('root/empty/', b'')
+        for i in range(entries):
+            zf.writestr(f'root/d{i // fanout}/f{i}.txt', ''.join(f'line {n} of file {i}\n' for n in range(20)))
+
+
+async def run_session(socket_path, rounds, latencies):
+    """Один сеанс: rounds раз выполняет COMMANDS, записывая задержку каждой команды."""
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    try:
+        for _ in range(rounds):
+            for command in COMMANDS:
+                start = time.perf_counter()
+                await request(reader, writer, command)
+                latencies.setdefault(command.split()[0], []).append(time.perf_counter() - start)
+        writer.write(b'exit\n')
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def run_load(socket_path, sessions, rounds):
+    latencies = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(socket_path, rounds, latencies) for _ in range(sessions)))
+    return latencies, time.perf_counter() - start
+
+
+async def wait_for_socket(socket_path, timeout=30.0):
+    """Ждёт, пока запущенный сервер начнёт принимать соединения."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_unix_connection(socket_path)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+            continue
+        writer.write(b'exit\n')
+        writer.close()
+        return
+
+
+def report(latencies, elapsed, sessions):
+    total = sum(len(values) for values in latencies.values())
+    print(f"{sessions} sessions, {total} commands in {elapsed:.3f} s ({total / elapsed:.1f} commands/sec)")
+    print(f"{'command':<10} {'count':>8} {'p50, ms':>10} {'p99, ms':>10} {'max, ms':>10}")
+    every = sorted(value for values in latencies.values() for value in values)
+    for name, values in sorted(latencies.items()) + [('all', every)]:
+        values = sorted(values)
+        print(f"{name:<10} {len(values):>8} {percentile(values, 0.5) * 1e3:>10.2f} "
+              f"{percentile(values, 0.99) * 1e3:>10.2f} {values[-1] * 1e3:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the emulator server with many concurrent sessions.')
+    parser.add_argument('--socket', help='Unix socket of a running server (default: start one)')
+    parser.add_argument('--sessions', type=int, default=100, help='Concurrent sessions')
+    parser.add_argument('--rounds', type=int, default=10, help='Command mix repetitions per session')
+    parser.add_argument('--entries', type=int, default=10000, help='Files in the synthetic archive')
+    args = parser.parse_args()
+
+    if args.socket:
+        latencies, elapsed = asyncio.run(run_load(args.socket, args.sessions, args.rounds))
+        report(latencies, elapsed, args.sessions)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, 'bench.zip')
+        socket_path = os.path.join(tmp, 'emul.sock')
+        make_archive(zip_path, args.entries)
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'emul_server.py'), '--zip_path', zip_path,
+                                   '--log_path', os.path.join(tmp, 'server.log'), '--socket', socket_path])
+        try:
+            asyncio.run(wait_for_socket(socket_path))
+            latencies, elapsed = asyncio.run(run_load(socket_path, args.sessions, args.rounds))
+        finally:
+            server.terminate()
+            server.wait()
+    report(latencies, elapsed, args.sessions)
+
+
+if __name__ == '__main__':
+    main()
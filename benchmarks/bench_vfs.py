@@ -0,0 +1,77 @@
+"""
+Бенчмарк команд ls, cd и rmdir эмулятора на синтетических архивах разного размера.
+
+Задержка одной команды должна оставаться примерно постоянной при росте числа членов архива.
+
+Запуск:
+    python benchmarks/bench_vfs.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emul_cmd import Emulator  # noqa: E402
+
+
+def make_archive(path, entries, fanout=100):
+    """
+    Создаёт архив с entries пустыми файлами, разложенными по директориям по fanout штук.
+
+    :param path: Путь к создаваемому архиву
+    :param entries: Число файлов
+    :param fanout: Число файлов в одной директории
+    """
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as zf:
+        zf.writestr('root/', b'')
+        for i in range(entries):
+            zf.writestr(f'root/d{i // fanout}/f{i}.txt', b'')
+
+
+def measure(func, repeat):
+    """Возвращает среднее время одного вызова func в микросекундах."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def bench(entries, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, 'bench.zip')
+        make_archive(zip_path, entries)
+
+        emulator = Emulator('bench', 'bench', zip_path, os.path.join(tmp, 'bench.log'))
+        # Перезапись архива измеряется отдельно, здесь интересна только стоимость индекса
+        emulator._remove_from_zip = lambda path: None
+
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            emulator.cd('root/d0')
+            ls_time = measure(emulator.ls, repeat)
+            cd_time = measure(lambda: (emulator.cd('..'), emulator.cd('d0')), repeat) / 2
+            rmdir_time = measure(lambda: emulator.rmdir('/root/missing'), repeat)
+        finally:
+            sys.stdout.close()
+            sys.stdout = sys.__stdout__
+    return ls_time, cd_time, rmdir_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ls/cd/rmdir latency against archive size.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Archive sizes (entries)')
+    parser.add_argument('--repeat', type=int, default=1000, help='Calls per command')
+    args = parser.parse_args()
+
+    print(f"{'entries':>10} {'ls, us':>10} {'cd, us':>10} {'rmdir, us':>10}")
+    for entries in args.sizes:
+        ls_time, cd_time, rmdir_time = bench(entries, args.repeat)
+        print(f"{entries:>10} {ls_time:>10.1f} {cd_time:>10.1f} {rmdir_time:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
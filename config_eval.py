@@ -0,0 +1,354 @@
+"""
+Вычисление констант конфигурационного языка.
+
+Выражение ![ ... ] компилируется один раз в функцию Python: постфиксная запись переводится
+в исходный текст вида sqrt((_0 + _1) * _3) и компилируется. Исходный текст зависит только
+от формы выражения — последовательности операций, — поэтому функции кэшируются по форме:
+в сгенерированных конфигурациях тысячи выражений отличаются лишь именами и числами, и компиляция
+выполняется единицы раз. Операнды — числа и значения констант — аргументы функции.
+
+Evaluator строит граф зависимостей между объявлениями и вычисляет константы лениво, по
+требованию: порядок объявлений не важен, циклы выдаются как ошибки, а константа, которая
+не попадает в результат и ни на что в нём не влияет, не вычисляется. evaluate получает все
+значения сразу и, пока константы объявлены до использования, обходится проходом по порядку.
+
+Набор операций расширяется через register_operation.
+"""
+from itertools import repeat
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import config_vector
+from config_parser import Array, Expression, Node, Set, to_python
+from config_vector import array, checked, plain, quiet
+
+# Операция: (число операндов, шаблон исходного текста от операндов {0}, {1}, ...)
+OPERATIONS: Dict[str, Tuple[int, str]] = {
+    '+': (2, '({0} + {1})'),
+    '-': (2, '({0} - {1})'),
+    '*': (2, '({0} * {1})'),
+    '/': (2, '({0} / {1})'),
+}
+# Глобальные имена скомпилированных функций
+FUNCTIONS: Dict[str, Callable] = {}
+# Имя операции -> оно же: по нему форма выражения строится без цикла на Python
+_operation_names: Dict[str, str] = {token: token for token in OPERATIONS}
+
+# Скомпилированные функции по форме выражения
+_compiled: Dict[Tuple[Any, ...], Callable] = {}
+
+
+def register_operation(token: str, arity: int, function: Callable):
+    """
+    Добавляет операцию выражений или заменяет существующую.
+
+    :param token: Имя операции в выражении, например 'pow'
+    :param arity: Число операндов, снимаемых со стека
+    :param function: Функция от операндов; её результат кладётся на стек
+    """
+    name = f'_{len(FUNCTIONS)}_{token}' if token.isidentifier() else f'_{len(FUNCTIONS)}'
+    FUNCTIONS[name] = function
+    OPERATIONS[token] = (arity, f'{name}({", ".join(f"{{{i}}}" for i in range(arity))})')
+    _operation_names[token] = token
+    _compiled.clear()
+
+
+def length(value: Any) -> float:
+    return float(len(value))
+
+
+# Числа и массивы (config_vector): поэлементно, с broadcasting числа
+register_operation('sqrt', 1, config_vector.sqrt)
+register_operation('pow', 2, config_vector.power)
+register_operation('min', 2, config_vector.minimum)
+register_operation('max', 2, config_vector.maximum)
+register_operation('abs', 1, abs)
+# Свёртки массива в число
+register_operation('len', 1, length)
+register_operation('sum', 1, config_vector.total)
+register_operation('maxof', 1, config_vector.largest)
+register_operation('minof', 1, config_vector.smallest)
+
+
+def literal(value: Array) -> Any:
+    """Значение массива для вычислений: плоский — Vector или ndarray (config_vector.array), вложенный — списки."""
+    return array(value.items) if value.flat else to_python(value)
+
+
+def position(expression: Expression, index: int) -> str:
+    item = expression.items[index]
+    return f'Строка {item.line}, столбец {item.column}'
+
+
+def compile_expression(expression: Expression) -> Callable:
+    """
+    Компилирует выражение.
+
+    :return: Функция с аргументом на каждый токен: на местах операндов — числа и значения констант,
+        аргументы на местах операций не используются. Так аргументы собираются без разбора токенов
+    :raises ValueError: Если операндов не хватает или их остаётся больше одного
+    """
+    # Форма: операции на своих местах, None на месте операндов
+    shape = tuple(map(_operation_names.get, expression.tokens))
+    function = _compiled.get(shape)
+    if function is None:
+        function = _compiled[shape] = compile_shape(expression, shape)
+    return function
+
+
+def compile_shape(expression: Expression, shape: Tuple[Optional[str], ...]) -> Callable:
+    stack = []
+    for index, token in enumerate(shape):
+        if token is None:
+            stack.append(f'_{index}')
+            continue
+        arity, template = OPERATIONS[token]
+        if len(stack) < arity:
+            raise ValueError(f'{position(expression, index)}: не хватает операндов для {token}')
+        operands = stack[len(stack) - arity:]
+        del stack[len(stack) - arity:]
+        stack.append(template.format(*operands))
+    if len(stack) != 1:
+        raise ValueError(f'Строка {expression.line}, столбец {expression.column}: некорректное выражение')
+    parameters = [f'_{index}' for index in range(len(shape))]
+    code = compile(f'lambda {", ".join(parameters)}: {stack[0]}', '<config>', 'eval')
+    return eval(code, FUNCTIONS)
+
+
+def call(function: Callable, arguments: Sequence[Any], name: str, expression: Expression) -> Any:
+    try:
+        value = function(*arguments)
+        return value if type(value) is float else checked(value)
+    except (ArithmeticError, ValueError, TypeError) as e:
+        raise ValueError(f'Строка {expression.line}, столбец {expression.column}: '
+                         f'ошибка вычисления {name}: {e}') from None
+
+
+def evaluate_with(expression: Expression, name: str, constants: Dict[str, Any]) -> Any:
+    """Вычисляет выражение по уже известным значениям констант (ссылки вперёд — ошибка)."""
+    function = compile_expression(expression)
+    try:
+        arguments = [token if type(token) is float or token in OPERATIONS else constants[token]
+                     for token in expression.tokens]
+    except KeyError as e:
+        reference = e.args[0]
+        raise ValueError(f'{position(expression, expression.tokens.index(reference))}: '
+                         f'неизвестный токен в выражении: {reference}') from None
+    return call(function, arguments, name, expression)
+
+
+class _Unset:
+    # Сравнение ndarray с маркером не поэлементное: in по аргументам сравнивает по тождеству
+    __array_ufunc__ = None
+
+
+_UNSET = _Unset()
+
+
+class Evaluator:
+    """
+    Ленивое вычисление объявлений программы по графу зависимостей.
+
+    Ссылка на имя в выражении указывает на ближайшее объявление выше, а если его нет — на первое
+    ниже; так повторное объявление set a = ![a 1 +] опирается на прежнее значение a.
+    """
+
+    def __init__(self, statements: List[Node]):
+        """
+        :param statements: Объявления Set и Assign по порядку
+        :raises ValueError: Со всеми некорректными выражениями и ссылками на необъявленные имена
+        """
+        self.statements = statements
+        self.names: List[str] = [statement.name if type(statement) is Set else statement.key
+                                 for statement in statements]
+        # Числа и текст — готовые значения; выражения вычисляются по требованию
+        self.values: List[Any] = [value if type(value) is float or type(value) is str else
+                                  literal(value) if type(value) is Array else _UNSET
+                                  for value in [statement.value for statement in statements]]
+        # Для выражений: функция и номера объявлений, значения которых она принимает
+        self.functions: Dict[int, Callable] = {}
+        self.dependencies: Dict[int, List[Optional[int]]] = {}
+        names = self.names
+        values = self.values
+        count = len(names)
+        # Имя -> последнее объявление, в порядке первого объявления
+        self.index: Dict[str, int] = dict(zip(names, range(count)))
+        # Без повторных объявлений у имени одно объявление, и ссылки разрешаются по всей таблице;
+        # иначе — по таблице объявлений выше текущего выражения, которая дополняется по ходу.
+        # Числа выражений — тоже значения в values, за объявлениями, и в той же таблице (ключи float);
+        # операции в ней указывают на None в values — этот аргумент функция не использует
+        redefined = len(self.index) < count
+        resolve = {} if redefined else dict(self.index)
+        operations = dict.fromkeys(OPERATIONS, len(values))
+        resolve.update(operations)
+        values.append(None)
+        first = dict(zip(reversed(names), range(count - 1, -1, -1))) if redefined else self.index
+        known = 0  # Объявления до known уже в resolve
+        errors = []
+        for number in [number for number, value in enumerate(values) if value is _UNSET]:
+            if redefined:
+                resolve.update(zip(names[known:number], range(known, number)))
+                resolve.update(operations)  # Константа с именем операции не перекрывает её
+                known = number
+            expression = statements[number].value
+            try:
+                function = compile_expression(expression)
+            except ValueError as e:
+                errors.append(str(e))
+                function = None
+            operands = expression.tokens
+            dependencies = list(map(resolve.get, operands))
+            if None in dependencies:
+                for slot, operand in enumerate(operands):
+                    if dependencies[slot] is not None:
+                        continue
+                    if type(operand) is float:
+                        if operand not in resolve:
+                            resolve[operand] = len(values)
+                            values.append(operand)
+                        dependencies[slot] = resolve[operand]
+                        continue
+                    # Выше объявления нет: ссылка на первое ниже
+                    dependencies[slot] = first.get(operand)
+                    if dependencies[slot] is None:
+                        errors.append(f'{position(expression, expression.tokens.index(operand))}: '
+                                      f'неизвестный токен в выражении: {operand}')
+            self.functions[number] = function
+            self.dependencies[number] = dependencies
+        if errors:
+            raise ValueError('\n'.join(errors))
+
+    def reset(self):
+        """Забывает значения выражений: следующее обращение вычисляет их заново теми же функциями."""
+        values = self.values
+        for number in self.functions:
+            values[number] = _UNSET
+
+    def __getitem__(self, name: str) -> Any:
+        with quiet():
+            return plain(self.value(self.index[name]))
+
+    def value(self, number: int) -> Any:
+        """Значение объявления number; сначала вычисляются ещё не вычисленные зависимости."""
+        values = self.values
+        if values[number] is not _UNSET:
+            return values[number]
+        dependencies = self.dependencies
+        active = set()  # Объявления на пути от number, ждущие своих зависимостей
+        stack = [number]
+        while stack:
+            current = stack[-1]
+            if values[current] is not _UNSET:
+                stack.pop()
+                continue
+            pending = [target for target in dependencies[current] if values[target] is _UNSET]
+            if pending and current not in active:
+                for target in pending:
+                    if target in active or target == current:
+                        raise self.cycle_error(stack, active, current, target)
+                active.add(current)
+                stack.extend(pending)
+                continue
+            statement = self.statements[current]
+            values[current] = call(self.functions[current], [values[target] for target in dependencies[current]],
+                                   self.names[current], statement.value)
+            active.discard(current)
+            stack.pop()
+        return values[number]
+
+    def cycle_error(self, stack: List[int], active: set, current: int, target: int) -> ValueError:
+        # Ждущие объявления в стеке идут в порядке пути от первого вычисляемого до current
+        path = []
+        for number in stack:
+            if number in active and number not in path:
+                path.append(number)
+        path.append(current)
+        path = path[path.index(target):]
+        path.append(target)
+        cycle = ' -> '.join(f'{self.names[number]} (строка {self.statements[number].line})' for number in path)
+        return ValueError(f'Циклическая зависимость констант: {cycle}')
+
+    def result(self) -> Dict[str, Any]:
+        """Все имена с их последними значениями, в порядке первого объявления."""
+        values = self.values
+        functions = self.functions
+        dependencies = self.dependencies
+        result = {}
+        with quiet():
+            for name, number in self.index.items():
+                value = values[number]
+                if value is _UNSET:
+                    arguments = [values[target] for target in dependencies[number]]
+                    if _UNSET in arguments:
+                        # Ссылка вперёд или на прежнее объявление имени: обход графа
+                        value = self.value(number)
+                    else:
+                        try:
+                            value = functions[number](*arguments)
+                            if type(value) is not float:
+                                value = checked(value)
+                            values[number] = value
+                        except (ArithmeticError, ValueError, TypeError):
+                            # Повтор через value() выдаёт ошибку с позицией
+                            value = self.value(number)
+                result[name] = value if type(value) is float or type(value) is str else plain(value)
+        return result
+
+
+class _Deferred(Exception):
+    """Внутренний сигнал evaluate: программу вычисляет Evaluator."""
+
+
+def evaluate(statements: List[Node]) -> Dict[str, Any]:
+    """
+    Все имена программы с последними значениями, в порядке первого объявления (как Evaluator.result).
+
+    Обычно константы объявлены до использования: тогда хватает одного прохода по порядку без графа
+    зависимостей. Ссылка вперёд, ошибка в выражении или константа с именем операции передают
+    программу Evaluator — он же выдаёт ошибки с позициями.
+    """
+    # Аргументы функции выражения берутся из одной таблицы по токенам: в ней константы, числа
+    # выражений (ключ float, значение — само число) и операции (значение не используется)
+    constants = {token: token for token in OPERATIONS}
+    numbers = []
+    arrays = []  # Имена со значениями-массивами: перед возвратом они становятся списками
+    operation = _operation_names.get
+    compiled = _compiled
+    get = constants.get
+    unset = repeat(_UNSET)
+    try:
+        with quiet():
+            for statement in statements:
+                name = statement.name if type(statement) is Set else statement.key
+                value = statement.value
+                if type(value) is Expression:
+                    tokens = value.tokens
+                    function = compiled.get(tuple(map(operation, tokens))) or compile_expression(value)
+                    arguments = list(map(get, tokens, unset))
+                    if _UNSET in arguments:
+                        for slot, token in enumerate(tokens):
+                            if arguments[slot] is _UNSET:
+                                if type(token) is not float:
+                                    raise _Deferred()
+                                if token not in constants:
+                                    constants[token] = token
+                                    numbers.append(token)
+                                arguments[slot] = token
+                    value = function(*arguments)
+                    if type(value) is not float:
+                        value = checked(value)
+                        arrays.append(name)
+                elif type(value) is Array:
+                    value = literal(value)
+                    arrays.append(name)
+                if name in OPERATIONS:
+                    raise _Deferred()
+                constants[name] = value
+    except (_Deferred, ArithmeticError, ValueError, TypeError):
+        return Evaluator(statements).result()
+    for token in OPERATIONS:
+        del constants[token]
+    for number in numbers:
+        del constants[number]
+    for name in arrays:
+        constants[name] = plain(constants[name])
+    return constants
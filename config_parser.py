@@ -0,0 +1,580 @@
+"""
+Лексер и парсер учебного конфигурационного языка.
+
+Текст разбирается за один проход: лексер TOKEN_RE выдаёт токены, а парсер рекурсивным спуском
+строит из них объявления. Грамматика языка задана только этим парсером.
+
+Результат — типизированное дерево: Program из Set и Assign, значения — float, str, Array и Expression,
+у узлов есть номер строки и столбца. Ошибка не прерывает разбор: парсер пропускает объявление
+до конца и продолжает, а все найденные ошибки выдаются вместе в ConfigSyntaxError.
+"""
+import gc
+import re
+from contextlib import contextmanager
+from itertools import islice
+from operator import itemgetter
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+_NAME = r'[_a-zA-Z][-_a-zA-Z0-9]*'
+# Число с точкой в любом месте (1.5, 5., .5), как принимал float(). В массиве точка — разделитель
+# элементов, и Parser.array делит по ней такой токен: {1.2.3.} — это [1, 2, 3]
+_NUMBER = r'[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?'
+
+# Пробелы и токен. Комментарий — только строка, начинающаяся с '#': он идёт к пробелам перед её
+# переводом строки, и парсер его не видит; знак '#' внутри строки остаётся частью значения.
+# Последний токен всегда пустой — конец текста
+TOKEN_RE = re.compile(rf"""
+    ((?:^[^\S\n]*\#[^\n]*)?[^\S\n]*)
+    (
+        \n | {_NUMBER} | {_NAME} | !\[ | [{{}}\[\]=.*/+-] | \S | \Z
+    )
+""", re.VERBOSE | re.MULTILINE)
+
+# Столько символов текста разбивается на токены за раз: токены всего большого файла заняли бы
+# в памяти в разы больше него самого
+WINDOW = 1 << 20
+
+_NAME_START = frozenset('_abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
+_DIGITS = frozenset('0123456789')
+_NUMBER_START = _DIGITS | frozenset('+-.')  # У числа, начинающегося с '+', '-' или '.', больше одного символа
+
+OPERATORS = frozenset('+-*/')
+
+
+@contextmanager
+def gc_paused():
+    """
+    Отключает сборщик мусора на время блока. Дерево большого файла — миллионы объектов без циклов:
+    сборщик, обходящий их снова и снова, только замедлял бы разбор.
+
+    gc.disable() действует на весь процесс, включая другие потоки, поэтому блок охватывает только
+    построение дерева (Parser.parse и разбор участка в режиме --watch), но не вычисление и не код
+    вызывающего. После блока прежнее состояние сборщика восстанавливается.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class Node:
+    """Узел дерева разбора; line и column — позиция начала узла в тексте (с 1)."""
+    __slots__ = ('line', 'column')
+    fields: Tuple[str, ...] = ()
+
+    def __eq__(self, other):
+        # Позиции не сравниваются: одинаковые объявления на разных строках равны
+        return type(self) is type(other) and all(getattr(self, name) == getattr(other, name)
+                                                 for name in self.fields)
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.fields)
+        return f'{type(self).__name__}({values})'
+
+
+class Number(Node):
+    """Число в выражении."""
+    __slots__ = fields = ('value',)
+
+    def __init__(self, value: float, line: int = 0, column: int = 0):
+        self.value = value
+        self.line = line
+        self.column = column
+
+
+class Name(Node):
+    """Имя в выражении: ссылка на константу или функция вроде sqrt."""
+    __slots__ = fields = ('name',)
+
+    def __init__(self, name: str, line: int = 0, column: int = 0):
+        self.name = name
+        self.line = line
+        self.column = column
+
+
+class Operator(Node):
+    __slots__ = fields = ('symbol',)
+
+    def __init__(self, symbol: str, line: int = 0, column: int = 0):
+        self.symbol = symbol
+        self.line = line
+        self.column = column
+
+
+class Array(Node):
+    """Массив: элементы — числа (float) и вложенные массивы (Array); flat — вложенных нет."""
+    __slots__ = ('items', 'flat')
+    fields = ('items',)
+
+    def __init__(self, items: List[Any], line: int = 0, column: int = 0, flat: bool = True):
+        self.items = items
+        self.flat = flat
+        self.line = line
+        self.column = column
+
+
+class Expression(Node):
+    """
+    Выражение ![ ... ] в постфиксной записи.
+
+    tokens — элементы в порядке вычисления: float для чисел, str для имён и операций.
+    Узлы элементов с позициями (items) строятся по требованию, например для сообщения об ошибке.
+    """
+    __slots__ = ('tokens', '_items', '_source')
+    fields = ('tokens',)
+
+    def __init__(self, tokens: List[Any], line: int = 0, column: int = 0,
+                 items: Optional[List[Node]] = None, source: Optional[Tuple[str, int, int]] = None):
+        """
+        :param items: Готовые узлы элементов
+        :param source: Или текст между скобками со строкой и столбцом его начала, по которому они строятся
+        """
+        self.tokens = tokens
+        self.line = line
+        self.column = column
+        self._items = items
+        self._source = source
+
+    @property
+    def items(self) -> List[Node]:
+        if self._items is None:
+            text, line, column = self._source
+            line_start = 1 - column  # Начало строки относительно text
+            items = []
+            values = iter(self.tokens)
+            for match in TOKEN_RE.finditer(text):
+                token = match[2]
+                if token == '\n':
+                    line += 1
+                    line_start = match.end()
+                    continue
+                if not token:
+                    break
+                value = next(values)
+                column = match.start(2) - line_start + 1
+                if type(value) is float:
+                    items.append(Number(value, line, column))
+                elif value in OPERATORS:
+                    items.append(Operator(value, line, column))
+                else:
+                    items.append(Name(value, line, column))
+            self._items = items
+        return self._items
+
+
+Value = Union[float, str, Array, Expression]
+
+
+class Set(Node):
+    """Объявление константы: set name = value (число, выражение или массив)."""
+    __slots__ = fields = ('name', 'value')
+
+    def __init__(self, name: str, value: Value, line: int = 0, column: int = 0):
+        self.name = name
+        self.value = value
+        self.line = line
+        self.column = column
+
+
+class Assign(Node):
+    """Ключ выходного файла: key = { ... } или key = текст (остаток строки как есть)."""
+    __slots__ = fields = ('key', 'value')
+
+    def __init__(self, key: str, value: Value, line: int = 0, column: int = 0):
+        self.key = key
+        self.value = value
+        self.line = line
+        self.column = column
+
+
+class Program(Node):
+    __slots__ = fields = ('statements',)
+
+    def __init__(self, statements: List[Node]):
+        self.statements = statements
+        self.line = 1
+        self.column = 1
+
+
+class ConfigSyntaxError(SyntaxError):
+    """Все синтаксические ошибки текста; errors — список (строка, столбец, сообщение)."""
+
+    def __init__(self, errors: List[Tuple[int, int, str]]):
+        self.errors = errors
+        super().__init__('\n'.join(f'Строка {line}, столбец {column}: {message}'
+                                   for line, column, message in errors))
+
+
+class _Recover(Exception):
+    """Внутренний сигнал: ошибка записана, разбор продолжается со следующего объявления."""
+
+
+def describe(token: str) -> str:
+    if not token:
+        return 'конец текста'
+    if token == '\n':
+        return 'конец строки'
+    return repr(token)
+
+
+class Parser:
+    """
+    Участок текста разбивается на токены одним вызовом TOKEN_RE.findall, и парсер идёт по списку
+    строк-токенов индексом. Столбец токена и исходный текст значения собираются по требованию
+    из пар (пробелы, токен) текущей строки.
+    """
+
+    def __init__(self, text: str, first_line: int = 1, partial: bool = False):
+        """
+        :param text: Текст на конфигурационном языке
+        :param first_line: Номер первой строки text (если разбирается фрагмент файла)
+        :param partial: text — блок потока: объявление, не законченное к его концу, не ошибка,
+            а остаток rest, который разбирается заново вместе со следующим блоком
+        """
+        self.text = text
+        self.first_line = first_line
+        self.errors: List[Tuple[int, int, str]] = []
+        self.line = first_line
+        self.line_first = 0  # Первый токен текущей строки
+        self.depth = 0  # Число открытых скобок на текущем токене
+        self.start = 0  # Начало участка в text
+        self.matches: List[Tuple[str, str]] = []  # Пробелы и токен
+        self.tokens: List[str] = []  # Токены участка; он кончается пустым
+        self.index = 0  # Текущий токен
+        self.partial = partial
+        self.rest: Optional[int] = None  # Начало незаконченного объявления в text
+        self.rest_line = 0
+
+    def parse(self) -> Program:
+        """Разбирает весь текст; при ошибках бросает ConfigSyntaxError со всеми ними."""
+        with gc_paused():
+            statements = self.statements()
+        if self.errors:
+            raise ConfigSyntaxError(self.errors)
+        return Program(statements)
+
+    def statements(self) -> List[Node]:
+        """Объявления текста по порядку; ошибки собираются в self.errors."""
+        statements = []
+        text = self.text
+        start, size = 0, WINDOW
+        while True:
+            end = text.find('\n', start + size)
+            last = end < 0
+            end = len(text) if last else end + 1
+            self.tokenize(start, end)
+            rest = self.window(statements, self.partial or not last)
+            if rest is None:
+                if last:
+                    break
+                start, size = end, WINDOW
+            elif last:
+                self.rest, self.rest_line = rest
+                break
+            else:
+                # Объявление не закончено к концу участка и разбирается заново со следующим;
+                # если оно длиннее участка, участок вдвое больше
+                size = size * 2 if rest[0] == start else WINDOW
+                start, self.line = rest
+        return statements
+
+    def tokenize(self, start: int, end: int):
+        """Токены участка text[start:end], который начинается с начала строки."""
+        self.start = start
+        self.matches = TOKEN_RE.findall(self.text, start, end)
+        self.tokens = list(map(itemgetter(1), self.matches))
+        self.line_first = self.index = 0
+
+    def window(self, statements: List[Node], partial: bool) -> Optional[Tuple[int, int]]:
+        """
+        Объявления участка.
+
+        :param partial: Объявление со скобками, не закрытыми к концу участка, не ошибка
+        :return: Начало в text и номер строки такого объявления или None
+        """
+        tokens = self.tokens
+        append = statements.append
+        i = 0
+        while True:
+            token = tokens[i]
+            if token == '\n':
+                i += 1
+                self.line += 1
+                self.line_first = i
+                continue
+            if not token:
+                return None
+            first, line = i, self.line
+            errors = len(self.errors)
+            self.index = i
+            self.depth = 0
+            try:
+                append(self.statement())
+            except _Recover:
+                self.synchronize()
+                if partial and not tokens[self.index] and self.depth > 0:
+                    del self.errors[errors:]
+                    return self.start + len(self.source(0, first)), line
+            i = self.index
+
+    def source(self, first: int, end: int) -> str:
+        """Исходный текст токенов участка с first по end (не включая) с пробелами перед ними."""
+        return ''.join(map(''.join, self.matches[first:end]))
+
+    def column(self, index: int) -> int:
+        return len(self.source(self.line_first, index)) + len(self.matches[index][0]) + 1
+
+    def error(self, message: str, position: Optional[Tuple[int, int]] = None):
+        line, column = position or (self.line, self.column(self.index))
+        self.errors.append((line, column, message))
+        raise _Recover()
+
+    def synchronize(self):
+        """Пропускает остаток ошибочного объявления, включая ещё не закрытые им скобки."""
+        tokens = self.tokens
+        i = self.index
+        depth = self.depth
+        while True:
+            token = tokens[i]
+            if not token:
+                break
+            if token in ('{', '![', '['):
+                depth += 1
+            elif token in ('}', ']'):
+                depth -= 1
+            elif token == '\n':
+                if depth <= 0:
+                    break
+                self.line += 1
+                self.line_first = i + 1
+            i += 1
+        self.index = i
+        self.depth = depth
+
+    def statement(self) -> Node:
+        tokens = self.tokens
+        i = self.index
+        token = tokens[i]
+        # Объявление начинается со строки: перед ним только отступ
+        line, column = self.line, len(self.matches[i][0]) + 1
+        if token[0] not in _NAME_START:
+            self.error(f'Ожидалось объявление, найдено {describe(token)}')
+        if token == 'set':
+            self.index = i = i + 1
+            name = tokens[i]
+            if name[:1] not in _NAME_START:
+                self.error(f'Ожидалось имя константы, найдено {describe(name)}')
+            self.index += 1
+            self.expect('=')
+            node = Set(name, self.constant_value(), line, column)
+        else:
+            # Ключ — всё до '=' в той же строке, в нём могут быть пробелы: my key = 3
+            first = i
+            i += 1
+            while tokens[i] not in ('=', '\n', ''):
+                i += 1
+            key = token + self.source(first + 1, i) if i > first + 1 else token
+            self.index = i
+            self.expect('=')
+            node = Assign(key, self.array() if tokens[self.index] == '{' else self.text_value(), line, column)
+        token = tokens[self.index]
+        if token and token != '\n':
+            self.error(f'Лишний текст после значения: {describe(token)}')
+        return node
+
+    def expect(self, token: str):
+        if self.tokens[self.index] != token:
+            self.error(f"Ожидалось '{token}', найдено {describe(self.tokens[self.index])}")
+        self.index += 1
+
+    def constant_value(self) -> Value:
+        token = self.tokens[self.index]
+        first = token[:1]
+        if first in _DIGITS or first in _NUMBER_START and len(token) > 1:
+            self.index += 1
+            return float(token)
+        if token == '![':
+            return self.expression()
+        if token == '{':
+            return self.array()
+        self.error(f'Некорректное значение константы: {describe(token)}')
+
+    def text_value(self) -> str:
+        tokens = self.tokens
+        i = self.index
+        if tokens[i] in ('\n', ''):
+            self.error('Ожидалось значение')
+        # Значение — остаток строки: его токены не разбираются
+        try:
+            end = tokens.index('\n', i)
+        except ValueError:
+            end = tokens.index('', i)
+        self.index = end
+        return tokens[i] + self.source(i + 1, end) if end > i + 1 else tokens[i]
+
+    def array(self) -> Array:
+        tokens = self.tokens
+        i = self.index
+        position = self.line, self.column(i)
+        i += 1
+        # Чаще всего массив плоский и в одну строку, а каждый элемент с точкой: { 1. 2. 3. }
+        try:
+            end = tokens.index('}', i)
+            elements = tokens[i:end]
+            text = ' '.join(elements) + ' '
+            if text.count('.') == len(elements) == text.count('. '):
+                items = list(map(float, elements))
+                self.index = end + 1
+                return Array(items, *position)
+        except ValueError:
+            pass  # Нет '}' или элемент вроде '.': ошибку найдёт разбор по токенам
+        self.depth += 1
+        items = []
+        append = items.append
+        flat = True
+        separated = True  # Следующим может идти элемент: после '{' или '.'
+        while True:
+            token = tokens[i]
+            if token == '}':
+                break
+            if token == '\n':
+                i += 1
+                self.line += 1
+                self.line_first = i
+                continue
+            self.index = i
+            if not token:
+                self.error('Массив не закрыт', position)
+            if token[0] in _NUMBER_START and token not in ('+', '-'):
+                # Точки в числе — разделители: '1.5' — два элемента, '2.' — элемент и разделитель
+                column = self.column(i)
+                offset = 0
+                for part in token.split('.'):
+                    if offset:
+                        if separated:
+                            self.error("Некорректный элемент массива: '.'", (self.line, column + offset - 1))
+                        separated = True
+                    if part:
+                        if not separated:
+                            self.error(f"Ожидалась '.' или '}}', найдено {part!r}", (self.line, column + offset))
+                        try:
+                            append(float(part))
+                        except ValueError:
+                            self.error(f'Некорректный элемент массива: {part!r}', (self.line, column + offset))
+                        separated = False
+                    offset += len(part) + 1
+            elif not separated:
+                self.error(f"Ожидалась '.' или '}}', найдено {describe(token)}")
+            elif token == '{':
+                append(self.array())
+                i = self.index
+                flat = False
+                separated = False
+                continue
+            else:
+                self.error(f'Некорректный элемент массива: {describe(token)}')
+            i += 1
+        self.depth -= 1
+        self.index = i + 1
+        return Array(items, *position, flat=flat)
+
+    def expression(self) -> Expression:
+        tokens = self.tokens
+        first = self.index
+        position = self.line, self.column(first)
+        self.depth += 1
+        i = first + 1
+        values = []
+        append = values.append
+        while True:
+            token = tokens[i]
+            if token == ']':
+                break
+            start = token[:1]
+            if start in _NAME_START or token in OPERATORS:
+                append(token)
+            elif start in _NUMBER_START:
+                append(float(token))
+            elif token == '\n':
+                self.line += 1
+                self.line_first = i + 1
+            else:
+                self.index = i
+                if not token:
+                    self.error('Выражение не закрыто', position)
+                self.error(f'Некорректный токен в выражении: {describe(token)}')
+            i += 1
+        self.index = i
+        if not values:
+            self.error('Пустое выражение', position)
+        self.depth -= 1
+        self.index = i + 1
+        # Текст между скобками — для позиций элементов; он начинается сразу за '!['
+        return Expression(values, *position, source=(self.source(first + 1, i), position[0], position[1] + 2))
+
+
+def parse(text: str, first_line: int = 1) -> Program:
+    """Разбирает текст на конфигурационном языке в дерево; ошибки — ConfigSyntaxError."""
+    return Parser(text, first_line).parse()
+
+
+class StreamParser:
+    """
+    Разбор потока строк блоками: в памяти только текущий блок и начало незаконченного в нём
+    объявления. Объявления выдаются по мере разбора, ошибки копятся в errors и в конце
+    бросаются вместе в ConfigSyntaxError — как при разборе всего текста сразу.
+    """
+
+    def __init__(self, lines: Iterable[str], first_line: int = 1, block_lines: int = 1024):
+        """
+        :param lines: Строки с переводами строк, как при чтении файла
+        :param first_line: Номер первой строки
+        :param block_lines: Число строк в блоке
+        """
+        self.lines = lines
+        self.first_line = first_line
+        self.block_lines = block_lines
+        self.errors: List[Tuple[int, int, str]] = []
+
+    def __iter__(self) -> Iterator[Node]:
+        lines = iter(self.lines)
+        line = self.first_line
+        rest = ''
+        size = self.block_lines
+        while True:
+            block = list(islice(lines, size))
+            if not block:
+                break
+            text = rest + ''.join(block)
+            parser = Parser(text, line, partial=True)
+            yield from parser.statements()
+            self.errors.extend(parser.errors)
+            if parser.rest is None:
+                line += text.count('\n')
+                rest = ''
+                size = self.block_lines
+            else:
+                line = parser.rest_line
+                rest = text[parser.rest:]
+                # Объявление длиннее блока: следующий блок вдвое больше, чтобы повторный разбор
+                # его начала стоил в сумме не больше линейного
+                size = size * 2 if parser.rest == 0 else self.block_lines
+        if rest:
+            # Вход кончился внутри объявления: разбор без partial выдаёт ошибку незакрытой скобки
+            parser = Parser(rest, line)
+            yield from parser.statements()
+            self.errors.extend(parser.errors)
+        if self.errors:
+            raise ConfigSyntaxError(self.errors)
+
+
+def to_python(value: Value) -> Any:
+    """Значение без вычисления выражений: числа, строки и вложенные списки."""
+    if isinstance(value, Array):
+        if value.flat:
+            return value.items[:]
+        return [to_python(item) if isinstance(item, Array) else item for item in value.items]
+    return value
@@ -0,0 +1,177 @@
+"""
+Массивы в выражениях конфигурационного языка.
+
+Плоский массив { 1. 2. 3. } в выражении — Vector: список чисел, у которого +, -, *, / поэлементные,
+с числом — для каждого элемента (broadcasting). Функции sqrt, abs, pow, min, max тоже работают
+поэлементно, свёртки sum, maxof и minof дают число.
+
+Если установлен NumPy, массив от NUMPY_MIN элементов — numpy.ndarray, и операции над ним выполняет
+NumPy; перед записью в TOML plain переводит результат в список. Без NumPy те же операции
+выполняются на Python. На маленьких массивах перевод списка в ndarray дороже самой операции,
+поэтому они всегда считаются на Python.
+"""
+import math
+import operator
+from contextlib import nullcontext
+from typing import Any, Callable, List
+
+try:
+    import numpy
+except ImportError:  # Без NumPy массивы считаются на Python
+    numpy = None
+
+# Длина массива, с которой операции над ним выполняет NumPy
+NUMPY_MIN = 256
+
+
+def is_large(value: Any) -> bool:
+    """Операцию с этим операндом выполняет NumPy."""
+    return numpy is not None and (type(value) is numpy.ndarray or type(value) is Vector and len(value) >= NUMPY_MIN)
+
+
+def as_array(value: Any) -> Any:
+    return value if type(value) is float else numpy.asarray(value, dtype=float)
+
+
+def length_error(a: List[float], b: List[float]) -> ValueError:
+    return ValueError(f'длины массивов различаются: {len(a)} и {len(b)}')
+
+
+def elementwise(scalar: Callable[[float, float], float], array: Callable) -> Callable[[Any, Any], Any]:
+    """
+    Поэлементная функция двух операндов (чисел, Vector или ndarray) с broadcasting числа.
+
+    :param scalar: Функция двух чисел
+    :param array: Та же функция над ndarray
+    """
+    def function(a, b):
+        if type(a) is float and type(b) is float:
+            return scalar(a, b)
+        if is_large(a) or is_large(b):
+            # NumPy растянул бы массив из одного элемента; длины проверяются, как и без него
+            if type(a) is not float and type(b) is not float and len(a) != len(b):
+                raise length_error(a, b)
+            return array(as_array(a), as_array(b))
+        if type(a) is float and type(b) is Vector:
+            return Vector([scalar(a, y) for y in b])
+        if type(a) is Vector and type(b) is float:
+            return Vector([scalar(x, b) for x in a])
+        if type(a) is Vector and type(b) is Vector:
+            if len(a) != len(b):
+                raise length_error(a, b)
+            return Vector(map(scalar, a, b))
+        raise TypeError(f'операнды не числа и не массивы: {type(a).__name__}, {type(b).__name__}')
+    return function
+
+
+def mapped(scalar: Callable[[float], float], array: Callable) -> Callable[[Any], Any]:
+    """Поэлементная функция одного операнда."""
+    def function(x):
+        if type(x) is float:
+            return scalar(x)
+        if is_large(x):
+            return array(as_array(x))
+        if type(x) is Vector:
+            return Vector(map(scalar, x))
+        raise TypeError(f'операнд не число и не массив: {type(x).__name__}')
+    return function
+
+
+def reduction(python: Callable[[List[float]], float], array: Callable) -> Callable[[Any], float]:
+    """Свёртка массива в число; число остаётся собой."""
+    def function(x):
+        if type(x) is float:
+            return x
+        if is_large(x):
+            return float(array(as_array(x)))
+        if type(x) is Vector:
+            return float(python(x))
+        raise TypeError(f'операнд не число и не массив: {type(x).__name__}')
+    return function
+
+
+class Vector(list):
+    """Плоский массив чисел с поэлементной арифметикой; остаётся списком для сравнения и записи в TOML."""
+    __slots__ = ()
+    # ndarray слева не выполняет операцию сам (растянул бы Vector из одного элемента), а передаёт её
+    # отражённому методу Vector, который проверяет длины
+    __array_ufunc__ = None
+
+    def _binary(operation: Callable[[float, float], float]):
+        # Поэлементно с числом или массивом (Vector или ndarray) той же длины
+        def forward(self, other):
+            if type(other) is float:
+                if is_large(self):
+                    return operation(as_array(self), other)
+                return Vector([operation(x, other) for x in self])
+            if type(other) is Vector or is_large(other):
+                if len(self) != len(other):
+                    raise length_error(self, other)
+                if is_large(self) or is_large(other):
+                    return operation(as_array(self), as_array(other))
+                return Vector(map(operation, self, other))
+            return NotImplemented
+
+        def reflected(self, other):
+            if type(other) is float:
+                if is_large(self):
+                    return operation(other, as_array(self))
+                return Vector([operation(other, x) for x in self])
+            if is_large(other):
+                if len(self) != len(other):
+                    raise length_error(other, self)
+                return operation(as_array(other), as_array(self))
+            return NotImplemented
+        return forward, reflected
+
+    __add__, __radd__ = _binary(operator.add)
+    __sub__, __rsub__ = _binary(operator.sub)
+    __mul__, __rmul__ = _binary(operator.mul)
+    __truediv__, __rtruediv__ = _binary(operator.truediv)
+    del _binary
+
+    def __abs__(self):
+        if is_large(self):
+            return abs(as_array(self))
+        return Vector(map(abs, self))
+
+
+def array(items: List[float]) -> Any:
+    """Плоский массив для выражений: большой сразу становится ndarray, чтобы не переводить его в каждой операции."""
+    if numpy is not None and len(items) >= NUMPY_MIN:
+        return numpy.array(items, dtype=float)
+    return Vector(items)
+
+
+def checked(value: Any) -> Any:
+    """
+    Проверяет результат выражения, не являющийся числом. NumPy при делении на ноль и корне
+    из отрицательного даёт inf и nan; здесь это ошибка, как и у тех же операций на Python.
+    """
+    if numpy is not None and type(value) is numpy.ndarray and not numpy.isfinite(value).all():
+        raise ValueError('нечисловой элемент массива (деление на ноль, корень из отрицательного или переполнение)')
+    return value
+
+
+def quiet():
+    """Контекст вычисления: предупреждения NumPy о inf и nan не выводятся, их ловит checked."""
+    return numpy.errstate(all='ignore') if numpy is not None else nullcontext()
+
+
+def plain(value: Any) -> Any:
+    """Значение для записи в TOML: Vector и ndarray становятся списками."""
+    if type(value) is Vector:
+        return list(value)
+    if numpy is not None and type(value) is numpy.ndarray:
+        return value.tolist()
+    return value
+
+
+sqrt = mapped(math.sqrt, numpy.sqrt if numpy is not None else None)
+power = elementwise(math.pow, numpy.power if numpy is not None else None)
+minimum = elementwise(min, numpy.minimum if numpy is not None else None)
+maximum = elementwise(max, numpy.maximum if numpy is not None else None)
+# Сумма — точная (math.fsum) и с NumPy: numpy.sum округляет по-другому, и результат зависел бы от его наличия
+total = reduction(math.fsum, (lambda values: math.fsum(values.tolist())) if numpy is not None else None)
+largest = reduction(max, numpy.max if numpy is not None else None)
+smallest = reduction(min, numpy.min if numpy is not None else None)
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import struct
+import sys
+from array import array
+
+MAGIC = b'DEPIDX\0\0'
+VERSION = 2
+
+# magic, version, validator (sha256 of the index signature or content), strings, packages, dependencies,
+# virtual names with a provider
+HEADER = struct.Struct('<8sI32sIIII')
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'dep_visualizer')
+
+def cache_path_for(cache_dir, repo_url):
+    return os.path.join(cache_dir, hashlib.sha256(repo_url.encode('utf-8')).hexdigest()[:32] + '.idx')
+
+def _to_bytes(values):
+    # Arrays are stored little-endian regardless of the machine
+    if sys.byteorder == 'big':
+        values = array('I', values)
+        values.byteswap()
+    return values.tobytes()
+
+def _from_bytes(data):
+    values = array('I')
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def save_packages(path, validator, packages, provides):
+    # Every name (package or dependency) is stored once; packages and edges are arrays of string ids
+    ids = {}
+    def string_id(name):
+        number = ids.get(name)
+        if number is None:
+            number = ids[name] = len(ids)
+        return number
+
+    package_ids = array('I')
+    offsets = array('I', [0])
+    deps = array('I')
+    for name, dependencies in packages.items():
+        package_ids.append(string_id(name))
+        deps.extend(string_id(dep) for dep in dependencies)
+        offsets.append(len(deps))
+    provided = array('I')
+    for virtual, provider in provides.items():
+        provided.append(string_id(virtual))
+        provided.append(string_id(provider))
+    strings = '\n'.join(ids).encode('utf-8')
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = path + '.temp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, validator, len(strings), len(package_ids), len(deps), len(provides)))
+        f.write(_to_bytes(package_ids))
+        f.write(_to_bytes(offsets))
+        f.write(_to_bytes(deps))
+        f.write(_to_bytes(provided))
+        f.write(strings)
+    os.replace(temp_path, path)
+
+def load_packages(path, validator=None):
+    # Returns (packages, provides), or None if there is no cache, it is damaged, or it was built for another index snapshot
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, version, saved_validator, strings_size, package_count, dep_count, provide_count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or (validator is not None and saved_validator != validator):
+        return None
+    if len(data) != HEADER.size + (2 * package_count + 1 + dep_count + 2 * provide_count) * 4 + strings_size:
+        return None
+
+    pos = HEADER.size
+    package_ids = _from_bytes(data[pos:pos + package_count * 4])
+    pos += package_count * 4
+    offsets = _from_bytes(data[pos:pos + (package_count + 1) * 4])
+    pos += (package_count + 1) * 4
+    deps = _from_bytes(data[pos:pos + dep_count * 4])
+    pos += dep_count * 4
+    provided = _from_bytes(data[pos:pos + provide_count * 8])
+    pos += provide_count * 8
+    strings = data[pos:].decode('utf-8').split('\n')
+
+    names = list(map(strings.__getitem__, package_ids))
+    dep_names = list(map(strings.__getitem__, deps))
+    offsets = offsets.tolist()
+    packages = {name: dep_names[offsets[number]:offsets[number + 1]] for number, name in enumerate(names)}
+    provided = list(map(strings.__getitem__, provided))
+    provides = dict(zip(provided[::2], provided[1::2]))
+    return packages, provides
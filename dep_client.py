@@ -0,0 +1,103 @@
+import argparse
+import itertools
+import json
+import socket
+import sys
+
+class QueryError(Exception):
+    pass
+
+class DependencyClient:
+    # Blocking client of dep_server; one connection, requests answered in order
+    def __init__(self, socket_path=None, host='127.0.0.1', port=8766):
+        if socket_path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(socket_path)
+        else:
+            self.sock = socket.create_connection((host, port))
+        self.file = self.sock.makefile('rwb')
+        self.ids = itertools.count(1)
+
+    def send(self, op, **params):
+        request_id = next(self.ids)
+        self.file.write(json.dumps({'id': request_id, 'op': op, **params}).encode('utf-8') + b'\n')
+        return request_id
+
+    def receive(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError('server closed the connection')
+        response = json.loads(line)
+        if 'error' in response:
+            raise QueryError(response['error'])
+        return response['result']
+
+    def query(self, op, **params):
+        self.send(op, **params)
+        self.file.flush()
+        return self.receive()
+
+    def query_many(self, requests, batch=256):
+        # Pipelined: a batch of requests is written before its first response is read. Batches stay
+        # small enough for the responses to fit in socket buffers while the client is still writing
+        requests = iter(requests)
+        results = []
+        while True:
+            sent = 0
+            for op, params in itertools.islice(requests, batch):
+                self.send(op, **params)
+                sent += 1
+            if not sent:
+                return results
+            self.file.flush()
+            results.extend(self.receive() for _ in range(sent))
+
+    def dependencies(self, package, depth=1):
+        return self.query('deps', package=package, depth=depth)
+
+    def dependents(self, package, depth=1):
+        return self.query('rdeps', package=package, depth=depth)
+
+    def closure_size(self, package):
+        return self.query('closure', package=package)['size']
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Query a running dep_server.')
+    parser.add_argument('--socket', help='Unix socket path of the server')
+    parser.add_argument('--host', default='127.0.0.1', help='TCP host of the server')
+    parser.add_argument('--port', type=int, default=8766, help='TCP port of the server')
+    parser.add_argument('op', choices=['deps', 'rdeps', 'closure', 'contains', 'stats', 'reload'])
+    parser.add_argument('package', nargs='?', help='Package to query')
+    parser.add_argument('--depth', type=int, default=1, help='Depth of deps/rdeps (above 1 returns a graph)')
+    parser.add_argument('--dependency', help='Dependency to look for with "contains"')
+    parser.add_argument('--members', action='store_true', help='List closure members, not only the size')
+    args = parser.parse_args()
+
+    params = {}
+    if args.package:
+        params['package'] = args.package
+    if args.op in ('deps', 'rdeps'):
+        params['depth'] = args.depth
+    if args.dependency:
+        params['dependency'] = args.dependency
+    if args.members:
+        params['members'] = True
+    try:
+        with DependencyClient(args.socket, args.host, args.port) as client:
+            print(json.dumps(client.query(args.op, **params), indent=2))
+    except (OSError, QueryError) as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+class DependencyClosure:
+    # Full transitive closure of every package at once. Cycles are condensed into strongly
+    # connected components, and each component's closure is an int bitmask over component
+    # numbers, built bottom-up from the closures of its dependencies. The component's own bit
+    # is left out of its mask: dependencies come out of Tarjan's algorithm first and get small
+    # numbers, so masks stay as short as the highest-numbered dependency.
+
+    def __init__(self, index):
+        self.names = list(index.packages)
+        self.number = {name: number for number, name in enumerate(self.names)}
+        # Only edges between real packages; unresolved names are not part of any closure
+        self.successors = [[self.number[dep] for dep in index.dependencies(name) if dep in self.number]
+                           for name in self.names]
+        self.component, self.components = strongly_connected_components(self.successors)
+        self.masks = closure_masks(self.successors, self.component, self.components)
+        # Components with several members: a set bit stands for more than one package
+        self._cyclic = {number: len(members) for number, members in enumerate(self.components) if len(members) > 1}
+        self._cyclic_mask = sum(1 << number for number in self._cyclic)
+
+    def size(self, name):
+        # Number of packages in the closure, the package itself (and its cycle) included
+        own = self.component[self.number[name]]
+        mask = self.masks[own]
+        size = mask.bit_count() + len(self.components[own])
+        cyclic = mask & self._cyclic_mask
+        while cyclic:
+            low = cyclic & -cyclic
+            size += self._cyclic[low.bit_length() - 1] - 1
+            cyclic ^= low
+        return size
+
+    def sizes(self):
+        return {name: self.size(name) for name in self.names}
+
+    def contains(self, name, dep):
+        if dep not in self.number:
+            return False
+        own = self.component[self.number[name]]
+        other = self.component[self.number[dep]]
+        return other == own or bool(self.masks[own] >> other & 1)
+
+    def members(self, name):
+        own = self.component[self.number[name]]
+        mask = self.masks[own]
+        result = [self.names[node] for node in self.components[own]]
+        while mask:
+            low = mask & -mask
+            result.extend(self.names[node] for node in self.components[low.bit_length() - 1])
+            mask ^= low
+        return result
+
+    def cycles(self):
+        return [[self.names[node] for node in self.components[number]] for number in self._cyclic]
+
+def closure_masks(successors, component, components):
+    # Bitmask of the components reachable from each component, its own bit left out
+    masks = []
+    for number, members in enumerate(components):
+        mask = 0
+        for node in members:
+            for successor in successors[node]:
+                other = component[successor]
+                if other != number:
+                    mask |= masks[other] | 1 << other
+        masks.append(mask)
+    return masks
+
+def transitive_reduction(graph):
+    # Drops an edge u -> v when v is also reachable through another dependency of u.
+    # Edges inside a cycle, and edges leaving it through cycle members, are kept as they are
+    names = list(graph)
+    number = {name: position for position, name in enumerate(names)}
+    for deps in graph.values():
+        for dep in deps:
+            if dep not in number:
+                number[dep] = len(names)
+                names.append(dep)
+    successors = [[number[dep] for dep in graph.get(name, [])] for name in names]
+    component, components = strongly_connected_components(successors)
+    masks = closure_masks(successors, component, components)
+
+    reduced = {}
+    for name, deps in graph.items():
+        own = component[number[name]]
+        reachable = 0
+        for dep in deps:
+            other = component[number[dep]]
+            if other != own:
+                reachable |= masks[other]
+        reduced[name] = [dep for dep in deps if not reachable >> component[number[dep]] & 1]
+    return reduced
+
+def strongly_connected_components(successors):
+    # Iterative Tarjan: returns (component number of each node, list of components), with every
+    # component listed after all components it depends on
+    count = len(successors)
+    order = [-1] * count
+    low = [0] * count
+    on_stack = [False] * count
+    stack = []
+    component = [-1] * count
+    components = []
+    counter = 0
+    for root in range(count):
+        if order[root] != -1:
+            continue
+        order[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, 0)]
+        while work:
+            node, position = work[-1]
+            edges = successors[node]
+            if position < len(edges):
+                work[-1] = (node, position + 1)
+                successor = edges[position]
+                if order[successor] == -1:
+                    order[successor] = low[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack[successor] = True
+                    work.append((successor, 0))
+                elif on_stack[successor] and order[successor] < low[node]:
+                    low[node] = order[successor]
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if low[node] < low[parent]:
+                    low[parent] = low[node]
+            if low[node] == order[node]:
+                members = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component[member] = len(components)
+                    members.append(member)
+                    if member == node:
+                        break
+                components.append(members)
+    return component, components
@@ -0,0 +1,43 @@
+import csv
+import json
+
+def _quote(name):
+    return '"' + name.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def write_dot(graph, f):
+    # Edges go straight to the file, only one package's lines are built in memory at a time
+    f.write('digraph dependencies {\n')
+    for pkg, deps in graph.items():
+        source = _quote(pkg)
+        if not deps:
+            f.write(f'    {source};\n')
+        f.write(''.join(f'    {source} -> {_quote(dep)};\n' for dep in deps))
+    f.write('}\n')
+
+def write_json(graph, f):
+    # Adjacency object {"package": ["dependency", ...]}, written one package at a time
+    f.write('{')
+    for number, (pkg, deps) in enumerate(graph.items()):
+        f.write(',\n' if number else '\n')
+        f.write(f'  {json.dumps(pkg)}: {json.dumps(deps)}')
+    f.write('\n}\n')
+
+def write_csv(graph, f):
+    writer = csv.writer(f)
+    writer.writerow(['package', 'dependency'])
+    for pkg, deps in graph.items():
+        writer.writerows((pkg, dep) for dep in deps)
+
+WRITERS = {'dot': write_dot, 'json': write_json, 'csv': write_csv}
+
+def collapse_fanout(graph, limit):
+    # A package with more than `limit` dependencies keeps `limit` of them, preferring those
+    # expanded further in the graph, and the rest become one "+N more" node
+    collapsed = {}
+    for pkg, deps in graph.items():
+        if len(deps) <= limit:
+            collapsed[pkg] = deps
+            continue
+        kept = sorted(deps, key=lambda dep: not graph.get(dep))[:limit]
+        collapsed[pkg] = kept + [f'{pkg} (+{len(deps) - len(kept)} more)']
+    return collapsed
@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import dep_cache
+from dep_closure import DependencyClosure
+from dep_visualizer import build_dependency_graph, index_validator, load_repositories
+
+# Requests and responses are single-line JSON objects, over a socket or stdin/stdout:
+#   {"id": 1, "op": "deps", "package": "curl", "depth": 1}
+#   {"id": 1, "result": ["ca-certificates", "libcurl", "musl"]}
+# A failed request gets {"id": ..., "error": "..."} instead of "result".
+
+def index_digest(index):
+    # A hash of the loaded data: a reload that brings the same index keeps the built closure
+    data = repr((sorted(index.packages.items()), sorted(index.provides.items())))
+    return hashlib.sha256(data.encode('utf-8')).digest()
+
+class IndexState:
+    # One loaded snapshot of the repositories; replaced as a whole on reload, never modified
+    def __init__(self, index, validators, digest, generation, closure=None):
+        self.index = index
+        self.validators = validators
+        self.digest = digest
+        self.generation = generation
+        self.loaded = time.time()
+        # Built with the snapshot, off the event loop: at startup or in the reload thread
+        self.closure = closure if closure is not None else DependencyClosure(index)
+
+class DependencyServer:
+    def __init__(self, repos, cache_dir=None, poll_interval=60.0):
+        self.repos = repos
+        self.cache_dir = cache_dir
+        self.poll_interval = poll_interval
+        self.state = None
+        self.queries = 0
+        self._reload_lock = threading.Lock()
+
+    def _validators(self):
+        try:
+            return [index_validator(repo) for repo in self.repos]
+        except Exception:
+            return None
+
+    def load(self, validators=None):
+        with self._reload_lock:
+            if validators is None:
+                validators = self._validators()
+            index = load_repositories(self.repos, self.cache_dir)
+            digest = index_digest(index)
+            old = self.state
+            if old is not None and digest == old.digest:
+                # Nothing changed in the data, only the validators are recorded
+                state = IndexState(old.index, validators, digest, old.generation, old.closure)
+            else:
+                state = IndexState(index, validators, digest, old.generation + 1 if old else 1)
+            # A single reference assignment: every query sees either the old or the new snapshot
+            self.state = state
+
+    def changed(self):
+        # The new validators if the repositories changed, else None. A snapshot loaded while they
+        # could not be computed (None) is reloaded once with these, then compared as usual
+        validators = self._validators()
+        if validators is None or validators == self.state.validators:
+            return None
+        return validators
+
+    def reload_in_background(self, validators=None):
+        def reload():
+            try:
+                self.load(validators)
+            except (Exception, SystemExit) as e:
+                # The old snapshot stays in service
+                print(f'Warning: reload failed: {e}', file=sys.stderr)
+        threading.Thread(target=reload, daemon=True).start()
+
+    def watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            validators = self.changed()
+            if validators is not None:
+                print('Repository changed, reloading', file=sys.stderr)
+                self.reload_in_background(validators)
+
+    def start_watcher(self):
+        if self.poll_interval > 0:
+            threading.Thread(target=self.watch, daemon=True).start()
+
+    def _package(self, index, request):
+        name = request.get('package')
+        if not isinstance(name, str):
+            raise ValueError('"package" is required')
+        resolved = index.resolve(name)
+        if resolved not in index.packages:
+            raise KeyError(f"package '{name}' not found")
+        return resolved
+
+    def query(self, request):
+        state = self.state
+        index = state.index
+        op = request.get('op')
+        if op in ('deps', 'rdeps'):
+            name = self._package(index, request)
+            depth = int(request.get('depth', 1))
+            if depth <= 1:
+                return index.dependencies(name) if op == 'deps' else index.dependents(name)
+            return build_dependency_graph(index, [name], depth, op == 'rdeps')
+        if op == 'closure':
+            name = self._package(index, request)
+            result = {'size': state.closure.size(name)}
+            if request.get('members'):
+                result['members'] = state.closure.members(name)
+            return result
+        if op == 'contains':
+            name = self._package(index, request)
+            return state.closure.contains(name, index.resolve(request.get('dependency', '')))
+        if op == 'stats':
+            return {'packages': len(index.packages), 'generation': state.generation,
+                    'loaded': state.loaded, 'queries': self.queries}
+        if op == 'reload':
+            self.reload_in_background()
+            return {'generation': state.generation}
+        raise ValueError(f'unknown op {op!r}')
+
+    def handle_line(self, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('request must be a JSON object')
+            request_id = request.get('id')
+            response = {'id': request_id, 'result': self.query(request)}
+        except KeyError as e:
+            response = {'id': request_id, 'error': e.args[0]}
+        except (ValueError, TypeError) as e:
+            response = {'id': request_id, 'error': str(e)}
+        self.queries += 1
+        return json.dumps(response)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    writer.write(self.handle_line(line).encode('utf-8') + b'\n')
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path=None, host='127.0.0.1', port=8766):
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(self.handle, path=socket_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        print(f'Serving {len(self.state.index.packages)} packages on {socket_path or f"{host}:{port}"}',
+              file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    def serve_stdin(self, stdin, stdout):
+        for line in stdin:
+            if line.strip():
+                stdout.write(self.handle_line(line) + '\n')
+                stdout.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description='Answer dependency queries from an index loaded once.')
+    parser.add_argument('--repository', required=True, action='append',
+                        help='Repository URL or local directory; repeat for several, highest priority first')
+    parser.add_argument('--cache-dir', default=dep_cache.default_cache_dir(),
+                        help='Directory for parsed index cache (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true', help='Always download and parse the index')
+    parser.add_argument('--socket', help='Unix socket path to listen on')
+    parser.add_argument('--port', type=int, help='TCP port to listen on (loopback unless --host is given)')
+    parser.add_argument('--host', default='127.0.0.1', help='TCP host to listen on')
+    parser.add_argument('--stdin', action='store_true', help='Read requests from stdin and write responses to stdout')
+    parser.add_argument('--poll', type=float, default=60.0,
+                        help='Seconds between checks of the repositories for a new index (0 disables reload)')
+    args = parser.parse_args()
+    if not (args.socket or args.port or args.stdin):
+        parser.error('one of --socket, --port or --stdin is required')
+
+    out = sys.stdout
+    if args.stdin:
+        # stdout carries the protocol; progress messages of the loader go to stderr
+        sys.stdout = sys.stderr
+    server = DependencyServer(args.repository, None if args.no_cache else args.cache_dir, args.poll)
+    server.load()
+    server.start_watcher()
+    try:
+        if args.stdin:
+            server.serve_stdin(sys.stdin, out)
+        else:
+            asyncio.run(server.serve(args.socket, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,6 @@
 import argparse
+import hashlib
+import io
 import urllib.request
 import tarfile
 import gzip
@@ -6,96 +8,306 @@ import os
 import sys
 import tempfile
 import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-def download_apkindex(repo_url):
-    index_url = repo_url.rstrip('/') + '/APKINDEX.tar.gz'
-    tmp_dir = tempfile.mkdtemp()
-    index_path = os.path.join(tmp_dir, 'APKINDEX.tar.gz')
+import dep_cache
+from dep_closure import DependencyClosure, transitive_reduction
+from dep_output import WRITERS, collapse_fanout
+
+def index_location(repo):
+    # A repository is a URL (http(s)://, file://) or a local directory containing APKINDEX.tar.gz
+    if os.path.isdir(repo):
+        return os.path.join(repo, 'APKINDEX.tar.gz')
+    return repo.rstrip('/') + '/APKINDEX.tar.gz'
+
+def open_apkindex(repo):
+    location = index_location(repo)
+    if os.path.isfile(location):
+        return open(location, 'rb')
+    return urllib.request.urlopen(location)
+
+def fetch_validator(repo):
+    # Signed indexes start with a .SIGN.* member that identifies the index content, so only
+    # the first few kilobytes are downloaded; unsigned ones (local builds) are hashed whole,
+    # and the body read for that is returned too so that it is not downloaded a second time
+    with open_apkindex(repo) as stream:
+        with tarfile.open(fileobj=gzip.GzipFile(fileobj=stream), mode='r|') as tar:
+            member = tar.next()
+            if member is not None and member.name.startswith('.SIGN.'):
+                return hashlib.sha256(member.name.encode('utf-8') + tar.extractfile(member).read()).digest(), None
+    with open_apkindex(repo) as stream:
+        body = stream.read()
+    return hashlib.sha256(body).digest(), body
+
+def index_validator(repo):
+    return fetch_validator(repo)[0]
+
+def read_apkindex_lines(stream):
+    # APKINDEX.tar.gz is several concatenated gzip streams (signature + index), which GzipFile
+    # handles and tarfile's own 'r|gz' does not; the tar is read sequentially without extraction
+    with tarfile.open(fileobj=gzip.GzipFile(fileobj=stream), mode='r|') as tar:
+        for member in tar:
+            if member.name == 'APKINDEX':
+                for line in tar.extractfile(member):
+                    yield line.decode('utf-8', errors='replace').rstrip('\n')
+                return
+    raise tarfile.TarError('APKINDEX not found in the archive')
+
+def clean_dependency(dep):
+    return dep.split('=')[0].split('<')[0].split('>')[0].split('~')[0]
+
+def iter_apkindex(lines):
+    pkg_info = {}
+    for line in lines:
+        if not line.strip():
+            if 'name' in pkg_info:
+                yield pkg_info
+            pkg_info = {}
+        elif line.startswith('P:'):
+            pkg_info['name'] = line[2:].strip()
+        elif line.startswith('D:'):
+            deps = line[2:].split()
+            # '!pkg' means "conflicts with pkg", not a dependency
+            pkg_info['dependencies'] = [clean_dependency(dep) for dep in deps if not dep.startswith('!')]
+            pkg_info['conflicts'] = [clean_dependency(dep[1:]) for dep in deps if dep.startswith('!')]
+        elif line.startswith('p:'):
+            pkg_info['provides'] = [clean_dependency(name) for name in line[2:].split()]
+        elif line.startswith('k:'):
+            pkg_info['provider_priority'] = int(line[2:].strip() or 0)
+    if 'name' in pkg_info:
+        yield pkg_info
+
+class PackageIndex:
+    def __init__(self, packages, provides, reverse=None):
+        self.packages = packages  # name -> dependency names as written in D:
+        self.provides = provides  # virtual name (so:, cmd:, pc:, ...) -> chosen provider
+        self._reverse = reverse  # dependency name as written in D: -> packages that list it
+        self._virtuals = None  # provider -> virtual names resolved to it
+
+    def resolve(self, dep):
+        # A real package with this name wins over virtual providers
+        return dep if dep in self.packages else self.provides.get(dep, dep)
+
+    def dependencies(self, pkg):
+        # Several D: entries may resolve to one provider; keep the first, in D: order
+        deps = dict.fromkeys(map(self.resolve, self.packages.get(pkg, ())))
+        deps.pop(pkg, None)
+        return list(deps)
+
+    @property
+    def reverse(self):
+        # Indexes loaded from the cache get the reverse index in one pass over the edges on first use
+        if self._reverse is None:
+            reverse = {}
+            for name, deps in self.packages.items():
+                for dep in deps:
+                    reverse.setdefault(dep, []).append(name)
+            self._reverse = reverse
+        return self._reverse
+
+    def dependents(self, pkg):
+        if self._virtuals is None:
+            virtuals = {}
+            for virtual, provider in self.provides.items():
+                if virtual not in self.packages:
+                    virtuals.setdefault(provider, []).append(virtual)
+            self._virtuals = virtuals
+        result = []
+        seen = {pkg}
+        for name in [pkg] + self._virtuals.get(pkg, []):
+            for dependent in self.reverse.get(name, []):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    result.append(dependent)
+        return result
+
+def parse_apkindex(stream):
+    packages = {}
+    candidates = {}
+    reverse = {}
     try:
-        print(f'Downloading APKINDEX from {index_url}...')
-        urllib.request.urlretrieve(index_url, index_path)
+        for pkg_info in iter_apkindex(read_apkindex_lines(stream)):
+            name = pkg_info['name']
+            packages[name] = pkg_info.get('dependencies', [])
+            for dep in packages[name]:
+                reverse.setdefault(dep, []).append(name)
+            # Highest provider_priority wins, ties go to the smallest name, so the choice
+            # does not depend on the order of packages in the index
+            choice = (-pkg_info.get('provider_priority', 0), name)
+            for virtual in pkg_info.get('provides', []):
+                if virtual not in candidates or choice < candidates[virtual]:
+                    candidates[virtual] = choice
+    except (tarfile.TarError, OSError, EOFError) as e:
+        print(f'Error reading APKINDEX: {e}')
+        sys.exit(1)
+    provides = {virtual: choice[1] for virtual, choice in candidates.items()}
+    return PackageIndex(packages, provides, reverse)
+
+def download_index(repo):
+    print(f'Downloading APKINDEX from {index_location(repo)}...')
+    try:
+        stream = open_apkindex(repo)
     except Exception as e:
         print(f'Error downloading APKINDEX: {e}')
         sys.exit(1)
-    return index_path, tmp_dir
+    with stream:
+        return parse_apkindex(stream)
 
-def extract_apkindex(index_path, tmp_dir):
-    apkindex_file = os.path.join(tmp_dir, 'APKINDEX')
+def load_index(repo, cache_dir=None, refresh=False):
+    if cache_dir is None:
+        return download_index(repo)
+    cache_path = dep_cache.cache_path_for(cache_dir, repo)
     try:
-        with tarfile.open(index_path, 'r:gz') as tar:
-            tar.extractall(path=tmp_dir)
+        validator, body = fetch_validator(repo)
     except Exception as e:
-        print(f'Error extracting APKINDEX: {e}')
-        sys.exit(1)
-    return apkindex_file
+        # Offline: fall back to the last cached snapshot of this repository, if any
+        cached = None if refresh else dep_cache.load_packages(cache_path)
+        if cached is None:
+            print(f'Error downloading APKINDEX: {e}')
+            sys.exit(1)
+        print(f'Warning: cannot check APKINDEX ({e}), using cached index')
+        return PackageIndex(*cached)
+
+    if not refresh:
+        cached = dep_cache.load_packages(cache_path, validator)
+        if cached is not None:
+            return PackageIndex(*cached)
+    index = download_index(repo) if body is None else parse_apkindex(io.BytesIO(body))
+    try:
+        dep_cache.save_packages(cache_path, validator, index.packages, index.provides)
+    except OSError as e:
+        print(f'Warning: cannot write index cache: {e}')
+    return index
 
-def parse_apkindex(apkindex_file):
+def load_repository(repo, cache_dir=None, refresh=False):
+    # Runs in a worker process; the reverse index is left behind and rebuilt while merging
+    index = load_index(repo, cache_dir, refresh)
+    return index.packages, index.provides
+
+def merge_indexes(indexes):
+    # Indexes come in priority order: a package or virtual name is taken from the first
+    # repository that has it, and the reverse index is filled as packages are accepted
     packages = {}
-    with open(apkindex_file, 'r') as f:
-        content = f.read()
-    entries = content.strip().split('\n\n')
-    for entry in entries:
-        lines = entry.strip().split('\n')
-        pkg_info = {}
-        for line in lines:
-            if line.startswith('P:'):
-                pkg_info['name'] = line[2:].strip()
-            elif line.startswith('D:'):
-                deps_line = line[2:].strip()
-                deps = deps_line.split()
-                # Clean up dependency names
-                deps = [dep.split('=')[0].split('<')[0].split('>')[0].split('~')[0] for dep in deps]
-                pkg_info['dependencies'] = deps
-        if 'name' in pkg_info:
-            name = pkg_info['name']
-            packages[name] = pkg_info.get('dependencies', [])
-    return packages
+    provides = {}
+    reverse = {}
+    for repo_packages, repo_provides in indexes:
+        for name, deps in repo_packages.items():
+            if name in packages:
+                continue
+            packages[name] = deps
+            for dep in deps:
+                reverse.setdefault(dep, []).append(name)
+        for virtual, provider in repo_provides.items():
+            provides.setdefault(virtual, provider)
+    return PackageIndex(packages, provides, reverse)
 
-def build_dependency_graph(packages, package_name, max_depth):
-    graph = {}
-    visited = set()
-    def dfs(pkg, depth):
-        if depth > max_depth or pkg in visited:
-            return
-        visited.add(pkg)
-        deps = packages.get(pkg, [])
-        graph[pkg] = deps
-        for dep in deps:
-            dfs(dep, depth + 1)
-    if package_name not in packages:
-        print(f"Package '{package_name}' not found in the repository.")
+def load_repositories(repos, cache_dir=None, refresh=False):
+    if len(repos) == 1:
+        return load_index(repos[0], cache_dir, refresh)
+    # Parsing is CPU-bound, so repositories are loaded in separate processes rather than threads:
+    # the wall-clock time is close to that of the slowest repository
+    workers = min(len(repos), os.cpu_count() or 1)
+    if workers == 1:
+        return merge_indexes(load_repository(repo, cache_dir, refresh) for repo in repos)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        indexes = list(pool.map(load_repository, repos, [cache_dir] * len(repos), [refresh] * len(repos)))
+    return merge_indexes(indexes)
+
+def build_dependency_graph(index, package_names, max_depth, reverse=False):
+    # Breadth-first from all roots at once: every package is expanded at its shortest depth,
+    # and each package and edge is visited once however many roots share them
+    package_names = [index.resolve(name) for name in package_names]
+    missing = [name for name in package_names if name not in index.packages]
+    for name in missing:
+        print(f"Package '{name}' not found in the repository.")
+    if missing:
         sys.exit(1)
-    dfs(package_name, 1)
+    graph = {}
+    depth = dict.fromkeys(package_names, 1)
+    queue = deque(depth)
+    while queue:
+        pkg = queue.popleft()
+        neighbours = index.dependents(pkg) if reverse else index.dependencies(pkg)
+        if reverse:
+            # Edges keep the dependency direction: dependent -> pkg
+            for dependent in neighbours:
+                graph.setdefault(dependent, []).append(pkg)
+        else:
+            graph[pkg] = neighbours
+        if depth[pkg] >= max_depth:
+            continue
+        for neighbour in neighbours:
+            if neighbour not in depth:
+                depth[neighbour] = depth[pkg] + 1
+                queue.append(neighbour)
     return graph
 
-def generate_dot(graph):
-    dot = 'digraph dependencies {\n'
-    for pkg, deps in graph.items():
-        for dep in deps:
-            dot += f'    "{pkg}" -> "{dep}";\n'
-    dot += '}'
-    return dot
+def print_closures(index, package_names=None):
+    closure = DependencyClosure(index)
+    names = [index.resolve(name) for name in package_names] if package_names else closure.names
+    print(f'{len(closure.names)} packages, {len(closure.components)} strongly connected components, '
+          f'{len(closure.cycles())} cycles')
+    sizes = [(closure.size(name), name) for name in names if name in closure.number]
+    for size, name in sorted(sizes, key=lambda item: (-item[0], item[1])):
+        print(f'{name}\t{size}')
 
 def main():
     parser = argparse.ArgumentParser(description='Visualize package dependencies for Alpine Linux packages.')
-    parser.add_argument('--visualizer', required=True, help='Path to the graph visualization program (e.g., dot)')
-    parser.add_argument('--package', required=True, help='Name of the package to analyze')
+    parser.add_argument('--visualizer', help='Path to the graph visualization program (e.g., dot)')
+    parser.add_argument('--package', nargs='+', help='Name(s) of the package(s) to analyze')
+    parser.add_argument('--reverse', action='store_true', help='Show packages that depend on the given ones')
     parser.add_argument('--depth', type=int, default=3, help='Maximum depth of dependency analysis')
-    parser.add_argument('--repository', required=True, help='URL of the Alpine Linux repository')
+    parser.add_argument('--repository', required=True, action='append',
+                        help='URL of the Alpine Linux repository (http(s)://, file://) or a local directory; '
+                             'repeat for several repositories, listed from the highest priority')
+    parser.add_argument('--cache-dir', default=dep_cache.default_cache_dir(),
+                        help='Directory for parsed index cache (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true', help='Always download and parse the index')
+    parser.add_argument('--refresh', action='store_true', help='Ignore the cached index and rebuild it')
+    parser.add_argument('--closure', action='store_true',
+                        help='Print full dependency closure sizes (of --package, or of every package) instead of a graph')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='dot',
+                        help='Graph output format: Graphviz DOT, JSON adjacency or CSV edge list')
+    parser.add_argument('--output', help='Path of the graph file (default: a temporary directory)')
+    parser.add_argument('--reduce', action='store_true',
+                        help='Drop edges implied by other paths (transitive reduction)')
+    parser.add_argument('--max-fanout', type=int,
+                        help='Show at most this many dependencies per package, the rest as one "+N more" node')
     args = parser.parse_args()
+    if not args.closure:
+        if not args.package:
+            parser.error('--package is required unless --closure is given')
+        if not args.visualizer and not args.output:
+            parser.error('--visualizer or --output is required')
 
-    index_path, tmp_dir = download_apkindex(args.repository)
-    apkindex_file = extract_apkindex(index_path, tmp_dir)
-    packages = parse_apkindex(apkindex_file)
+    index = load_repositories(args.repository, None if args.no_cache else args.cache_dir, args.refresh)
+    if args.closure:
+        print_closures(index, args.package)
+        return
 
-    graph = build_dependency_graph(packages, args.package, args.depth)
-    dot_content = generate_dot(graph)
+    graph = build_dependency_graph(index, args.package, args.depth, args.reverse)
+    if args.reduce:
+        graph = transitive_reduction(graph)
+    if args.max_fanout:
+        graph = collapse_fanout(graph, args.max_fanout)
 
-    dot_file = os.path.join(tmp_dir, 'dependencies.dot')
-    with open(dot_file, 'w') as f:
-        f.write(dot_content)
+    # A temporary directory is only needed when --output does not say where to write; the image goes next to it
+    if args.output:
+        dot_file = args.output
+        output_image = os.path.splitext(dot_file)[0] + '.png'
+        if output_image == dot_file:
+            output_image += '.png'
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        dot_file = os.path.join(tmp_dir, 'dependencies.' + args.format)
+        output_image = os.path.join(tmp_dir, 'dependencies.png')
+    with open(dot_file, 'w', newline='' if args.format == 'csv' else None) as f:
+        WRITERS[args.format](graph, f)
+    if args.format != 'dot' or not args.visualizer:
+        print(f'Wrote dependency graph to {dot_file}')
+        return
 
-    output_image = os.path.join(tmp_dir, 'dependencies.png')
     try:
         subprocess.run([args.visualizer, dot_file, '-Tpng', '-o', output_image], check=True)
         print(f'Generated dependency graph image at {output_image}')
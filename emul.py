@@ -1,11 +1,26 @@
 import os
 import string
 import zipfile
-import tkinter as tk
-from tkinter import scrolledtext
+try:
+    import tkinter as tk
+    from tkinter import scrolledtext
+except ImportError:  # Сервер (emul_server.py) и пакетный режим работают без tkinter
+    tk = scrolledtext = None
 import os
 import select
 import sys
+import queue
+import threading
+import codecs
+import itertools
+import re
+from collections import deque
+
+from emul_commands import execute_command, stream_output
+from emul_grep import load_trigram_index
+from emul_index import load_tree
+from emul_log import get_logger
+from emul_vfs import FileTree, OverlayTree, ZipContent, render_paths, render_tree, usage
 
 
 def add_folder(path, folder_name):
@@ -16,8 +31,104 @@ def remove_last_folder(path):
     return os.path.dirname(path)
 
 
+def is_binary(chunk):
+    """Проверяет по началу файла, является ли он двоичным (есть нулевые байты или это не UTF-8)."""
+    if b'\0' in chunk:
+        return True
+    try:
+        # final=False: многобайтовый символ может быть разрезан границей части
+        codecs.getincrementaldecoder('utf-8')().decode(chunk, final=False)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+def skip_continuation(chunk):
+    """
+    Часть, прочитанная с середины файла, без начальных байтов продолжения (0x80-0xBF):
+    граница части могла разрезать многобайтовый символ UTF-8, а в нём их не больше трёх.
+    """
+    start = 0
+    while start < min(3, len(chunk)) and 0x80 <= chunk[start] <= 0xBF:
+        start += 1
+    return chunk[start:]
+
+
+def decode_chunks(chunks):
+    """Декодирует части файла из UTF-8, не разрезая многобайтовые символы на границах частей."""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def hexdump(chunks):
+    """Шестнадцатеричный дамп частей двоичного файла: смещение, 16 байт и их ASCII-представление."""
+    offset = 0
+    rest = b''
+    for chunk in itertools.chain(chunks, [None]):
+        data = rest + chunk if chunk is not None else rest
+        # Последняя неполная строка печатается только в конце файла
+        end = len(data) if chunk is None else len(data) - len(data) % 16
+        lines = []
+        for pos in range(0, end, 16):
+            row = data[pos:pos + 16]
+            text = ''.join(chr(byte) if 32 <= byte < 127 else '.' for byte in row)
+            lines.append(f"{offset + pos:08x}  {row.hex(' '):<47}  {text}\n")
+        if lines:
+            yield ''.join(lines)
+        offset += end
+        rest = data[end:]
+
+
+def head_lines(text_chunks, count):
+    """Первые count строк текста; чтение файла прекращается сразу после них."""
+    if count <= 0:
+        return
+    for chunk in text_chunks:
+        pos = -1
+        for _ in range(count):
+            pos = chunk.find('\n', pos + 1)
+            if pos < 0:
+                break
+            count -= 1
+        if pos >= 0 and count == 0:
+            yield chunk[:pos + 1]
+            return
+        yield chunk
+
+
+def iter_lines(text_chunks):
+    """Строки текста без символа перевода строки; строка может быть разрезана границей частей."""
+    partial = ''
+    for chunk in text_chunks:
+        parts = (partial + chunk).split('\n')
+        partial = parts.pop()
+        yield from parts
+    if partial:
+        yield partial
+
+
+def tail_lines(text_chunks, count):
+    """Последние count строк текста; в памяти хранится не больше count строк."""
+    lines = deque(maxlen=count)
+    partial = ''
+    for chunk in text_chunks:
+        parts = (partial + chunk).split('\n')
+        partial = parts.pop()
+        lines.extend(part + '\n' for part in parts)
+    if partial:
+        lines.append(partial)
+    return ''.join(lines) if count > 0 else ''
+
+
 class Emulator:
-    def __init__(self, username, hostname, zip_path, log_path):
+    def __init__(self, username, hostname, zip_path, log_path, cache_size=64 * 1024 * 1024, chunk_size=64 * 1024,
+                 image=None):
         """
         Конструктор класса Emulator. Инициализирует пользователя, ПК, путь к архиву файловой системы и файл лога.
 
@@ -25,6 +136,10 @@ class Emulator:
         :param hostname: Имя компьютера
         :param zip_path: Путь к архиву файловой системы (ZIP)
         :param log_path: Путь к файлу лога
+        :param cache_size: Лимит кэша содержимого файлов в байтах
+        :param chunk_size: Размер части, которой читаются файлы в cat, head и tail
+        :param image: Общий образ архива (ArchiveImage); если задан, архив не открывается заново,
+                      а изменения дерева видны только этому эмулятору
         """
         self.username = username
         self.hostname = hostname
@@ -32,22 +147,25 @@ class Emulator:
         self.absolute_path = r"C:\Users\marka\Desktop\Konfig"
         self.zip_path = zip_path
         self.log_path = log_path
-        self.file_system = {}  # Словарь для хранения распакованных файлов и папок
-        self._load_file_system()  # Распаковываем архив в память
-
-    def _log(self, command, output):
+        self.logger = get_logger(log_path)  # Журнал действий в формате CSV
+        self.cache_size = cache_size
+        self.chunk_size = chunk_size
+        self.image = image
+        self.tree = FileTree()  # Иерархический индекс файлов и папок архива
+        self.content = None  # Чтение содержимого файлов по требованию
+        self.trigrams = None  # Триграммный индекс содержимого для grep, строится при первом поиске
+        self._load_file_system()  # Читаем оглавление архива
+
+    def _log(self, command, output, directory=None):
         """
-        Метод для записи команды пользователя и вывода программы в лог-файл.
+        Метод для записи команды пользователя и вывода программы в лог-файл (CSV с датой и временем).
+        Запись выполняется фоновым потоком общего журнала, команда не ждёт диска.
 
         :param command: Ввод пользователя
         :param output: Вывод программы
+        :param directory: Директория, в которой была введена команда (по умолчанию — текущая)
         """
-        with open(self.log_path, 'a') as log_file:
-            # Записываем ввод команды с текущим местоположением пользователя
-            log_file.write(f"{self.username}@{self.hostname}:{self._get_prompt_directory()}$ {command}\n")
-            # Записываем результат команды
-            if output:
-                log_file.write(f"{output}\n")
+        self.logger.log(self.username, self.hostname, directory or self._get_prompt_directory(), command, output)
 
     def _get_prompt_directory(self):
         """Метод для получения текущей директории для отображения в prompt."""
@@ -55,41 +173,47 @@ class Emulator:
 
     def _load_file_system(self):
         """
-        Метод для распаковки ZIP архива в виртуальную файловую систему.
+        Метод для загрузки оглавления ZIP архива в виртуальную файловую систему.
+        Дерево файлов берётся из сохранённого рядом с архивом индекса; центральный каталог
+        читается, только если архив изменился. Содержимое файлов распаковывается по требованию.
         """
-        if zipfile.is_zipfile(self.zip_path):
-            with zipfile.ZipFile(self.zip_path, 'r') as zip_ref:
-                for file in zip_ref.namelist():
-                    # Удаляем начальные / для удобства работы с файлами
-                    normalized_path = file.lstrip('/')
-                    self.file_system[normalized_path] = zip_ref.read(file).decode('utf-8')  # Добавляем файлы и их содержимое в словарь
+        if self.image is not None:
+            self.tree = OverlayTree(self.image.tree)
+            self.content = self.image.content
+        elif zipfile.is_zipfile(self.zip_path):
+            self.tree, zip_file = load_tree(self.zip_path)
+            self.content = ZipContent(self.zip_path, self.cache_size, zip_file=zip_file)
         else:
             print("Error: provided file is not a ZIP archive.")
 
+    def close(self):
+        """
+        Закрывает архив файловой системы (общий образ закрывает его владелец).
+        Лог сбрасывается на диск при завершении программы.
+        """
+        if self.image is None:
+            if self.content is not None:
+                self.content.close()
+            if self.trigrams is not None:
+                self.trigrams.close()
+        self.content = None
+        self.trigrams = None
+
     def ls(self, directory=None):
         """
         Команда 'ls' выводит список файлов и папок в указанной директории (или текущей, если аргумент не передан).
         """
-        if directory:
-            path = os.path.join(self.current_directory, directory).lstrip('/')
+        node = self.tree.resolve(directory or '', self.current_directory)
+
+        if node is None:
+            response = "Error: directory not found."
+        elif not node.is_dir:
+            response = node.name
+        elif node.children:
+            response = '\n'.join(node.children)
         else:
-            path = self.current_directory.lstrip('/')
-
-        output = []
-        found_files = False
-        for file in self.file_system:
-            if file.startswith(path):
-                relative_path = file[len(path):].strip('/')
-                if '/' not in relative_path:
-                    output.append(relative_path)
-                    found_files = True
-
-        if not found_files:
-            output.append("Directory is empty.")
-
-        # Печатаем и возвращаем результат команды
-        response = '\n'.join(output)
-        print(response)
+            response = "Directory is empty."
+
         return response
 
     def cd(self, path):
@@ -98,43 +222,217 @@ class Emulator:
 
         :param path: Путь к новой директории
         """
+        node = self.tree.resolve(path, self.current_directory)
+        if node is None or not node.is_dir:
+            return "Error: directory not found."
         if path == "..":
             # Переход на уровень выше
             if self.current_directory != '/':
-                self.current_directory = os.path.dirname(self.current_directory.rstrip('/')) + '/'
                 self.absolute_path = remove_last_folder(self.absolute_path)
         else:
-            # Переход в указанную директорию
-            new_directory = os.path.join(self.current_directory, path).lstrip('/')
-            if any(f.startswith(new_directory) for f in self.file_system.keys()):
-                self.current_directory = new_directory.rstrip('/') + '/'
-                self.absolute_path = add_folder(self.absolute_path, path)
-            else:
-                response = "Error: directory not found."
-                print(response)
-                return response
+            self.absolute_path = add_folder(self.absolute_path, path)
+        self.current_directory = node.path() or '/'
         return ""
 
+    def _find_file(self, filename):
+        """Возвращает узел файла по пути относительно текущей директории или None."""
+        node = self.tree.resolve(filename, self.current_directory)
+        if node is None or node.is_dir:
+            return None
+        return node
+
+    def _not_found(self, filename):
+        file_path = os.path.join(self.current_directory, filename)  # Путь в виртуальной системе
+        return f"Файл '{filename}' не найден в текущей директории: {file_path}"
+
+    def _open_chunks(self, node):
+        """Возвращает (первая часть файла, итератор по всем частям файла)."""
+        chunks = self.content.iter_chunks(node.info, self.chunk_size)
+        first = next(chunks, b'')
+        return first, itertools.chain([first], chunks)
+
     def cat(self, filename):
         """
         Команда 'cat' выводит содержимое файла по абсолютному пути.
+        Файл распаковывается частями по мере вывода; двоичные файлы выводятся шестнадцатеричным дампом.
 
         :param filename: Имя файла для чтения
-        :return: Содержимое файла или сообщение об ошибке
+        :return: Итератор частей содержимого файла или сообщение об ошибке
         """
-        file_path = os.path.join(self.current_directory, filename)  # Путь в виртуальной системе
-        if file_path in self.file_system:  # Проверяем, существует ли файл в виртуальной системе
-            return self.file_system[file_path]  # Возвращаем содержимое файла
-        else:
-            return f"Файл '{filename}' не найден в текущей директории: {file_path}"
+        node = self._find_file(filename)
+        if node is None:  # Проверяем, существует ли файл в виртуальной системе
+            return self._not_found(filename)
+        first, chunks = self._open_chunks(node)
+        if is_binary(first):
+            return hexdump(chunks)
+        return decode_chunks(chunks)
+
+    def head(self, filename, lines=10):
+        """
+        Команда 'head' выводит первые строки файла. Распаковывается только начало файла.
+
+        :param filename: Имя файла для чтения
+        :param lines: Число строк
+        """
+        node = self._find_file(filename)
+        if node is None:
+            return self._not_found(filename)
+        first, chunks = self._open_chunks(node)
+        if is_binary(first):
+            return f"Error: '{filename}' is a binary file."
+        return head_lines(decode_chunks(chunks), lines)
+
+    def tail(self, filename, lines=10):
+        """
+        Команда 'tail' выводит последние строки файла.
+        Несжатые файлы читаются с конца, сжатые распаковываются потоком с хранением только последних строк.
+
+        :param filename: Имя файла для чтения
+        :param lines: Число строк
+        """
+        node = self._find_file(filename)
+        if node is None:
+            return self._not_found(filename)
+
+        if self.content.is_seekable(node.info):
+            # Читаем с конца, пока не наберётся нужное число переводов строки
+            data = b''
+            for chunk in self.content.iter_chunks_reversed(node.info, self.chunk_size):
+                data = chunk + data
+                if data.count(b'\n', 0, len(data) - 1) >= lines:
+                    break
+            # Прочитанное с середины файла и проверяемый конец могут начинаться внутри символа UTF-8
+            if len(data) < node.info.file_size:
+                data = skip_continuation(data)
+            sample = data[-self.chunk_size:]
+            if len(sample) < len(data):
+                sample = skip_continuation(sample)
+            if is_binary(sample):
+                return f"Error: '{filename}' is a binary file."
+            return tail_lines(decode_chunks([data]), lines)
+
+        first, chunks = self._open_chunks(node)
+        if is_binary(first):
+            return f"Error: '{filename}' is a binary file."
+        return tail_lines(decode_chunks(chunks), lines)
+
+    def du(self, path=None):
+        """
+        Команда 'du' выводит суммарный размер и число файлов в директории (или размер файла).
+        Итоги хранятся в дереве, поэтому команда не обходит поддерево.
+
+        :param path: Путь к файлу или директории (по умолчанию — текущая директория)
+        """
+        node = self.tree.resolve(path or '', self.current_directory)
+        if node is None:
+            return "Error: file or directory not found."
+        return usage(node)
+
+    def tree_view(self, path=None):
+        """
+        Команда 'tree' выводит дерево директорий и файлов.
+
+        :param path: Путь к директории (по умолчанию — текущая директория)
+        """
+        node = self.tree.resolve(path or '', self.current_directory)
+        if node is None:
+            return "Error: directory not found."
+        return render_tree(node)
+
+    def find(self, path=None, name=None, kind=None):
+        """
+        Команда 'find' ищет файлы и директории по шаблону имени и типу.
+
+        :param path: Директория, с которой начинается поиск (по умолчанию — текущая)
+        :param name: Шаблон имени, например '*.txt'
+        :param kind: 'f' — только файлы, 'd' — только директории
+        """
+        node = self.tree.resolve(path or '', self.current_directory)
+        if node is None:
+            return "Error: directory not found."
+        return render_paths(self.tree.find(node, name, kind))
+
+    def _trigram_index(self):
+        """Триграммный индекс архива: общий индекс образа или собственный, загружаемый при первом поиске."""
+        if self.trigrams is None:
+            if self.image is not None:
+                self.trigrams = self.image.trigram_index()
+            else:
+                self.trigrams = load_trigram_index(self.zip_path, self.tree, self.content)
+        return self.trigrams
+
+    def grep(self, pattern, path=None, recursive=False):
+        """
+        Команда 'grep' выводит строки файлов, в которых есть совпадение с регулярным выражением.
+
+        Для директории файлы-кандидаты выбираются по триграммному индексу,
+        распаковываются только они. Без -r просматриваются только файлы самой директории.
+
+        :param pattern: Регулярное выражение
+        :param path: Файл или директория (по умолчанию — текущая директория)
+        :param recursive: Искать во всех вложенных директориях
+        """
+        try:
+            regex = re.compile(pattern)
+        except re.error as error:
+            return f"Error: invalid pattern: {error}"
+        node = self.tree.resolve(path or '', self.current_directory)
+        if node is None:
+            return "Error: file or directory not found."
+        if not node.is_dir:
+            return self._grep_lines(regex, [node], with_names=False)
+        return self._grep_lines(regex, self._grep_candidates(pattern, node, recursive), with_names=True)
+
+    def _grep_candidates(self, pattern, directory, recursive):
+        """Файлы директории, которые по триграммному индексу могут содержать совпадение."""
+        prefix = directory.path()
+        for name in self._trigram_index().candidates(pattern):
+            if not name.startswith(prefix) or (not recursive and '/' in name[len(prefix):]):
+                continue
+            # Файл мог быть удалён из дерева этого эмулятора после построения индекса
+            node = self.tree.resolve('/' + name)
+            if node is not None and not node.is_dir:
+                yield node
+
+    def _grep_lines(self, regex, nodes, with_names, batch=1000):
+        """Совпавшие строки файлов частями по batch строк; двоичные файлы пропускаются."""
+        lines = []
+        for node in nodes:
+            first, chunks = self._open_chunks(node)
+            if is_binary(first):
+                continue
+            prefix = f"/{node.path()}:" if with_names else ""
+            for line in iter_lines(decode_chunks(chunks)):
+                if regex.search(line):
+                    lines.append(prefix + line)
+                    if len(lines) >= batch:
+                        yield '\n'.join(lines) + '\n'
+                        lines = []
+        if lines:
+            yield '\n'.join(lines)
 
     def echo(self, text):
         """Выводит текст."""
         return text
 
 class EmulatorGUI:
-    def __init__(self, emulator):
+    def __init__(self, emulator, scrollback_lines=10000, chunk_size=64 * 1024, poll_interval=50):
+        """
+        Графический интерфейс эмулятора. Команды выполняются в отдельном потоке, их вывод
+        передаётся в окно частями, поэтому окно не зависает на больших файлах и директориях.
+
+        :param emulator: Экземпляр Emulator
+        :param scrollback_lines: Максимальное число строк в области вывода (старые строки удаляются)
+        :param chunk_size: Размер части вывода в символах, передаваемой в окно за один раз
+        :param poll_interval: Период опроса очереди вывода в миллисекундах
+        """
         self.emulator = emulator
+        self.scrollback_lines = scrollback_lines
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self._output_queue = queue.Queue(maxsize=64)  # Части вывода от рабочего потока
+        self._cancel = threading.Event()  # Флаг прерывания команды (Ctrl+C)
+        self._worker = None  # Поток, выполняющий текущую команду
 
         # Создаем главное окно
         self.window = tk.Tk()
@@ -157,8 +455,9 @@ class EmulatorGUI:
         self.command_entry = tk.Entry(self.window, width=80, bg="black", fg="green", font=("Consolas", 12), insertbackground="green")
         self.command_entry.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
 
-        # Привязываем событие нажатия Enter
+        # Привязываем событие нажатия Enter и прерывание команды по Ctrl+C
         self.command_entry.bind('<Return>', self.run_command)
+        self.window.bind('<Control-c>', self.cancel_command)
 
         # Настройка растягивания
         self.window.grid_rowconfigure(0, weight=1)  # Растягиваем область вывода по вертикали
@@ -170,52 +469,95 @@ class EmulatorGUI:
         self.window.mainloop()
 
     def run_command(self, event):
-        """Обработчик ввода команды и её выполнения."""
+        """Обработчик ввода команды: запускает её выполнение в рабочем потоке."""
+        if self._worker is not None:
+            return "break"  # Предыдущая команда ещё выполняется
+
         command = self.command_entry.get()
-        self.output_text.config(state='normal')
-        self.output_text.insert(tk.END, f"{emulator.username}@{emulator.hostname}:{emulator._get_prompt_directory()}$ {command}\n")
-        self.output_text.config(state='disabled')
-        with open(emulator.log_path, 'a') as log_file:
-            # Записываем ввод команды с текущим местоположением пользователя
-            log_file.write(f"{emulator.username}@{emulator.hostname}:{emulator._get_prompt_directory()}$ {command}\n")
+        directory = self.emulator._get_prompt_directory()
+        self._append_output(f"{self.emulator.username}@{self.emulator.hostname}:{directory}$ {command}\n")
         self.command_entry.delete(0, tk.END)  # Очищаем поле ввода
 
-        # Получаем результат команды из эмулятора
-        output = self.execute_command(command)
-        with open(emulator.log_path, 'a') as log_file:
-            log_file.write(f"{output}\n")
-        # Обновляем область вывода
+        if command == "exit":
+            # Окно можно закрыть только из основного потока
+            self.emulator._log(command, "Exiting emulator...", directory)
+            self.emulator.close()
+            self.window.destroy()
+            return
+
+        self._cancel.clear()
+        self._worker = threading.Thread(target=self._run_worker, args=(command, directory), daemon=True)
+        self._worker.start()
+        self.window.after(self.poll_interval, self._poll_output)
+
+    def cancel_command(self, event):
+        """Обработчик Ctrl+C: прерывает выполняющуюся команду."""
+        if self._worker is None:
+            return None  # Команды нет — оставляем стандартное поведение (копирование)
+        self._cancel.set()
+        return "break"
+
+    def _run_worker(self, command, directory):
+        """Выполняет команду в рабочем потоке и передаёт её вывод в очередь частями."""
+        def write(chunk):
+            # Очередь ограничена, поэтому чтение файла не опережает вывод в окно
+            while not self._cancel.is_set():
+                try:
+                    self._output_queue.put(chunk, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            output = self.execute_command(command)
+            preview = stream_output(output, write, self.chunk_size)
+        except Exception as e:
+            preview = f"Error: {e}"
+            self._output_queue.put(preview)
+        # Записываем действие в лог (для больших выводов — только начало)
+        self.emulator._log(command, preview, directory)
+
+        self._output_queue.put("^C\n" if self._cancel.is_set() else "\n")
+        self._output_queue.put(None)  # Признак завершения команды
+
+    def _poll_output(self):
+        """Переносит накопившиеся части вывода в окно; вызывается из цикла Tk через after()."""
+        finished = False
+        chunks = []
+        try:
+            while len(chunks) < 16:
+                chunk = self._output_queue.get_nowait()
+                if chunk is None:
+                    finished = True
+                    break
+                chunks.append(chunk)
+        except queue.Empty:
+            pass
+
+        if chunks:
+            self._append_output(''.join(chunks))
+
+        if finished:
+            self._worker = None
+            # Обновляем строку с текущей директорией
+            self.host_display.config(text=f"current directory: {self.emulator.username}@{self.emulator.hostname}:{self.emulator._get_prompt_directory()}$")
+        else:
+            self.window.after(self.poll_interval, self._poll_output)
 
-        self.host_display.config(text=f"current directory: {emulator.username}@{emulator.hostname}:{emulator._get_prompt_directory()}$")
-        self.host_display.update()
+    def _append_output(self, text):
+        """Добавляет текст в область вывода и удаляет старые строки сверх лимита прокрутки."""
         self.output_text.config(state='normal')
-        self.output_text.insert(tk.END, f"{output}\n")
+        self.output_text.insert(tk.END, text)
+        lines = int(self.output_text.index('end-1c').split('.')[0])
+        if lines > self.scrollback_lines:
+            self.output_text.delete('1.0', f"{lines - self.scrollback_lines + 1}.0")
         self.output_text.config(state='disabled')
         self.output_text.yview(tk.END)  # Прокрутка вниз
 
     def execute_command(self, command):
         """Метод для выполнения команд через эмулятор."""
-        if command.startswith("ls"):
-            args = command.split(" ")
-            if len(args) == 2:
-                return self.emulator.ls(args[1])
-            else:
-                return self.emulator.ls()
-        elif command.startswith("cd "):
-            return self.emulator.cd(command.split(" ")[1])
-        elif command.startswith("cat"):
-            return self.emulator.cat(command.split(" ")[1])
-        elif command.startswith("echo"):
-            args = command.split(" ")
-            if len(args) >= 2:
-                return self.emulator.echo(args[1])
-            else:
-                return self.emulator.echo()
-        elif command == "exit":
-            self.window.destroy()
-            return "Exiting emulator..."
-        else:
-            return "Unknown command."
+        return execute_command(self.emulator, command)
 
 
 # Основной код
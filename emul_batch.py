@@ -0,0 +1,173 @@
+"""
+Пакетный (безоконный) режим эмулятора.
+
+Выполняет команды из файла сценария или stdin на одном экземпляре Emulator без GUI
+и в конце печатает пропускную способность и гистограмму задержек по каждой команде.
+Умеет воспроизводить записанные сеансы из лога эмулятора (CSV или старый текстовый формат).
+
+Запуск:
+    python emul_batch.py --zip_path zxc.zip --log_path batch.log script.txt
+    python emul_batch.py --zip_path zxc.zip --log_path batch.log --format log emulator.log
+"""
+import argparse
+import csv
+import importlib
+import re
+import sys
+import time
+
+from emul_commands import execute_command, stream_output
+from emul_log import FIELDS
+
+# Границы корзин гистограммы задержек в секундах
+BUCKETS = [1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0]
+BUCKET_LABELS = ['<10us', '<100us', '<1ms', '<10ms', '<100ms', '<1s', '>=1s']
+
+# Строка приглашения в старом текстовом логе: user1@my_pc:zxc/$ ls
+PROMPT_RE = re.compile(r'[^@\s]+@[^:\s]+:\S*\$ (.*)$')
+# Начало строки CSV-лога: дата и время записи (CsvLogger.log)
+CSV_ROW_RE = re.compile(r'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d(?:\.\d+)?,')
+
+
+def read_script(lines):
+    """Команды из сценария: по одной в строке, пустые строки и комментарии (#) пропускаются."""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def read_log(lines):
+    """
+    Команды из лога эмулятора.
+    Поддерживается CSV-формат и старый текстовый формат, где команды записаны после приглашения,
+    а строки вывода пропускаются. Формат определяется для каждой записи: в лог, начатый в старом
+    формате, могут быть дописаны строки CSV.
+    """
+    header = ','.join(FIELDS)
+    lines = iter(lines)
+    for line in lines:
+        if line.rstrip('\r\n') == header:
+            continue
+        if CSV_ROW_RE.match(line):
+            # Вывод команды может занимать несколько строк внутри кавычек: запись кончается,
+            # когда кавычки сбалансированы (внутри поля они удваиваются)
+            record = [line]
+            quotes = line.count('"')
+            while quotes % 2:
+                line = next(lines, None)
+                if line is None:
+                    break
+                record.append(line)
+                quotes += line.count('"')
+            row = next(csv.reader(record), None)
+            if row and len(row) == len(FIELDS) and row[FIELDS.index('command')]:
+                yield row[FIELDS.index('command')]
+            continue
+        match = PROMPT_RE.search(line.rstrip('\r\n'))
+        if match and match.group(1).strip():
+            yield match.group(1).strip()
+
+
+def run_batch(emulator, commands, stop_at_exit=False):
+    """
+    Выполняет команды на эмуляторе, записывая каждую в лог эмулятора.
+
+    :param emulator: Экземпляр Emulator
+    :param commands: Итератор строк команд
+    :param stop_at_exit: Команда exit завершает выполнение; иначе она пропускается
+        (в логе из нескольких сеансов exit отделяет сеансы, а не завершает воспроизведение)
+    :return: Словарь имя команды -> список задержек в секундах
+    """
+    latencies = {}
+    for command in commands:
+        if command == "exit":
+            if stop_at_exit:
+                break
+            continue
+        directory = emulator._get_prompt_directory()
+        start = time.perf_counter()
+        # Потоковый вывод учитывается целиком: время включает чтение файла до конца
+        output = stream_output(execute_command(emulator, command), lambda chunk: None)
+        elapsed = time.perf_counter() - start
+        emulator._log(command, output, directory)
+        latencies.setdefault(command.split()[0], []).append(elapsed)
+    return latencies
+
+
+def percentile(sorted_values, fraction):
+    """Перцентиль по отсортированному списку (метод ближайшего ранга)."""
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def histogram(values):
+    """Раскладывает задержки по корзинам BUCKETS."""
+    counts = [0] * (len(BUCKETS) + 1)
+    for value in values:
+        for index, bound in enumerate(BUCKETS):
+            if value < bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+    return counts
+
+
+def format_report(latencies, elapsed):
+    """Текстовый отчёт: общая пропускная способность и задержки по каждой команде."""
+    total = sum(len(values) for values in latencies.values())
+    rate = total / elapsed if elapsed > 0 else 0.0
+    lines = [f"{total} commands in {elapsed:.3f} s ({rate:.1f} commands/sec)", ""]
+
+    header = f"{'command':<10} {'count':>8} {'p50, us':>10} {'p99, us':>10} {'max, us':>10}  " + \
+        ' '.join(f"{label:>7}" for label in BUCKET_LABELS)
+    lines.append(header)
+    for name in sorted(latencies):
+        values = sorted(latencies[name])
+        counts = ' '.join(f"{count:>7}" for count in histogram(values))
+        lines.append(f"{name:<10} {len(values):>8} {percentile(values, 0.5) * 1e6:>10.1f} "
+                     f"{percentile(values, 0.99) * 1e6:>10.1f} {values[-1] * 1e6:>10.1f}  {counts}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run emulator commands from a script or a recorded log without GUI.')
+    parser.add_argument('script', nargs='?', default='-', help='Script or log file (default: stdin)')
+    parser.add_argument('--zip_path', required=True, help='Path to the virtual filesystem archive')
+    parser.add_argument('--log_path', required=True, help='Path to the emulator log file')
+    parser.add_argument('--format', choices=['script', 'log'], default='script',
+                        help='Input format: one command per line, or an emulator log to replay')
+    parser.add_argument('--shell', choices=['emul', 'emul_cmd'], default='emul',
+                        help='Emulator implementation to run the commands against')
+    parser.add_argument('--stop-at-exit', action='store_true',
+                        help='Stop at the first exit command instead of skipping it')
+    parser.add_argument('--username', default='user1', help='User name shown in the log')
+    parser.add_argument('--hostname', default='my_pc', help='Host name shown in the log')
+    args = parser.parse_args()
+
+    # emul.py импортирует tkinter, поэтому реализация загружается только по требованию
+    emulator_class = importlib.import_module(args.shell).Emulator
+    emulator = emulator_class(args.username, args.hostname, args.zip_path, args.log_path)
+
+    stream = sys.stdin if args.script == '-' else open(args.script, 'r', encoding='utf-8', errors='replace', newline='')
+    reader = read_log if args.format == 'log' else read_script
+    try:
+        start = time.perf_counter()
+        latencies = run_batch(emulator, reader(stream), args.stop_at_exit)
+        # Как и при выходе из эмулятора, переносим накопленные изменения в архив
+        if getattr(emulator, 'sync', None) is not None:
+            emulator.sync()
+        elapsed = time.perf_counter() - start
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if getattr(emulator, 'close', None) is not None:
+            emulator.close()
+        emulator.logger.close()
+
+    print(format_report(latencies, elapsed))
+
+
+if __name__ == '__main__':
+    main()
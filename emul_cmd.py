@@ -1,6 +1,10 @@
-import os
 import zipfile
-import shutil
+
+from emul_commands import execute_command, stream_output
+from emul_index import load_tree
+from emul_journal import MutationJournal
+from emul_log import get_logger
+from emul_vfs import FileTree, render_paths, render_tree, usage
 
 
 class Emulator:
@@ -18,22 +22,22 @@ class Emulator:
         self.current_directory = '/'  # Текущая директория (начинаем с корня '/')
         self.zip_path = zip_path
         self.log_path = log_path
-        self.file_system = {}  # Словарь для хранения распакованных файлов и папок
+        self.logger = get_logger(log_path)  # Журнал действий в формате CSV
+        self.tree = FileTree()  # Иерархический индекс файлов и папок архива
+        self.journal = MutationJournal(zip_path)  # Изменения, ещё не перенесённые в архив
         self._load_file_system()  # Распаковываем архив в память
+        self._replay_journal()  # Восстанавливаем изменения, не сохранённые в прошлом сеансе
 
-    def _log(self, command, output):
+    def _log(self, command, output, directory=None):
         """
-        Метод для записи команды пользователя и вывода программы в лог-файл.
+        Метод для записи команды пользователя и вывода программы в лог-файл (CSV с датой и временем).
+        Запись выполняется фоновым потоком общего журнала, команда не ждёт диска.
 
         :param command: Ввод пользователя
         :param output: Вывод программы
+        :param directory: Директория, в которой была введена команда (по умолчанию — текущая)
         """
-        with open(self.log_path, 'a') as log_file:
-            # Записываем ввод команды с текущим местоположением пользователя
-            log_file.write(f"{self.username}@{self.hostname}:{self._get_prompt_directory()}$ {command}\n")
-            # Записываем результат команды
-            if output:
-                log_file.write(f"{output}\n")
+        self.logger.log(self.username, self.hostname, directory or self._get_prompt_directory(), command, output)
 
     def _get_prompt_directory(self):
         """Метод для получения текущей директории для отображения в prompt."""
@@ -41,41 +45,46 @@ class Emulator:
 
     def _load_file_system(self):
         """
-        Метод для распаковки ZIP архива в виртуальную файловую систему.
+        Метод для загрузки дерева файлов ZIP архива в виртуальную файловую систему.
+        Дерево берётся из сохранённого рядом с архивом индекса; центральный каталог
+        читается, только если архив изменился.
         """
         if zipfile.is_zipfile(self.zip_path):
-            with zipfile.ZipFile(self.zip_path, 'r') as zip_ref:
-                for file in zip_ref.namelist():
-                    # Удаляем начальные / для удобства работы с файлами
-                    normalized_path = file.lstrip('/')
-                    self.file_system[normalized_path] = True  # Добавляем файлы и папки в словарь
+            self.tree, zip_file = load_tree(self.zip_path)
+            if zip_file is not None:
+                zip_file.close()
         else:
             print("Error: provided file is not a ZIP archive.")
 
+    def _replay_journal(self):
+        """
+        Метод для воспроизведения журнала изменений поверх загруженного архива.
+        Журнал остаётся на диске, если прошлый сеанс завершился без сохранения изменений в архив.
+        """
+        for op, name, data in self.journal.entries:
+            if op == 'delete':
+                node = self.tree.resolve('/' + name)
+                if node is None or node is self.tree.root:
+                    continue
+                self.tree.remove(node)
+            else:
+                self.tree.add(name)
+
     def ls(self, directory=None):
         """
         Команда 'ls' выводит список файлов и папок в указанной директории (или текущей, если аргумент не передан).
         """
-        if directory:
-            path = os.path.join(self.current_directory, directory).lstrip('/')
+        node = self.tree.resolve(directory or '', self.current_directory)
+
+        if node is None:
+            response = "Error: directory not found."
+        elif not node.is_dir:
+            response = node.name
+        elif node.children:
+            response = '\n'.join(node.children)
         else:
-            path = self.current_directory.lstrip('/')
-
-        output = []
-        found_files = False
-        for file in self.file_system:
-            if file.startswith(path):
-                relative_path = file[len(path):].strip('/')
-                if '/' not in relative_path:
-                    output.append(relative_path)
-                    found_files = True
-
-        if not found_files:
-            output.append("Directory is empty.")
-
-        # Печатаем и возвращаем результат команды
-        response = '\n'.join(output)
-        print(response)
+            response = "Directory is empty."
+
         return response
 
     def cd(self, path):
@@ -84,19 +93,10 @@ class Emulator:
 
         :param path: Путь к новой директории
         """
-        if path == "..":
-            # Переход на уровень выше
-            if self.current_directory != '/':
-                self.current_directory = os.path.dirname(self.current_directory.rstrip('/')) + '/'
-        else:
-            # Переход в указанную директорию
-            new_directory = os.path.join(self.current_directory, path).lstrip('/')
-            if any(f.startswith(new_directory) for f in self.file_system):
-                self.current_directory = new_directory.rstrip('/') + '/'
-            else:
-                response = "Error: directory not found."
-                print(response)
-                return response
+        node = self.tree.resolve(path, self.current_directory)
+        if node is None or not node.is_dir:
+            return "Error: directory not found."
+        self.current_directory = node.path() or '/'
         return ""
 
     def rmdir(self, path=None):
@@ -106,40 +106,72 @@ class Emulator:
         Если аргумент не передан, выводится сообщение об ошибке.
         """
         if path is None:
-            response = "Error: rmdir command requires an argument."
-            print(response)
-            return response
-
-        full_path = os.path.join(self.current_directory, path).rstrip('/') + '/'
+            return "Error: rmdir command requires an argument."
 
-        # Проверяем, есть ли в директории другие файлы
-        has_files = any(f.startswith(full_path) and f != full_path for f in self.file_system)
+        node = self.tree.resolve(path, self.current_directory)
 
-        if has_files:
+        if node is None or not node.is_dir or node is self.tree.root:
+            response = "Error: directory not found."
+        elif node.children:
+            # В директории есть другие файлы
             response = f"Error: directory '{path}' is not empty. Remove all files inside first."
-        elif full_path in self.file_system:
-            del self.file_system[full_path]  # Удаляем директорию из виртуальной файловой системы
+        else:
+            full_path = node.path()
+            self.tree.remove(node)  # Удаляем директорию из виртуальной файловой системы
             self._remove_from_zip(full_path)  # Удаляем директорию из ZIP-архива
             response = f"Directory '{path}' has been removed."
-        else:
-            response = "Error: directory not found."
 
-        print(response)
         return response
 
     def _remove_from_zip(self, file_to_remove):
         """
         Метод для удаления файла или директории из ZIP архива.
+        Удаление записывается в журнал, сам архив пересобирается при sync или выходе из эмулятора.
+        """
+        self.journal.delete(file_to_remove)
+
+    def sync(self):
         """
-        temp_zip = self.zip_path + '.temp'  # Временный файл для нового архива
-        with zipfile.ZipFile(self.zip_path, 'r') as zip_ref:
-            with zipfile.ZipFile(temp_zip, 'w') as new_zip:
-                for item in zip_ref.infolist():
-                    # Проверяем, что файл или папка не совпадают с удаляемым
-                    if not item.filename.startswith(file_to_remove):
-                        new_zip.writestr(item, zip_ref.read(item.filename))
-        # Заменяем старый архив новым
-        os.replace(temp_zip, self.zip_path)
+        Команда 'sync' переносит накопленные изменения в ZIP архив.
+        """
+        applied = self.journal.compact()
+        return f"{applied} change(s) saved to the archive."
+
+    def du(self, path=None):
+        """
+        Команда 'du' выводит суммарный размер и число файлов в директории (или размер файла).
+        Итоги хранятся в дереве, поэтому команда не обходит поддерево.
+
+        :param path: Путь к файлу или директории (по умолчанию — текущая директория)
+        """
+        node = self.tree.resolve(path or '', self.current_directory)
+        if node is None:
+            return "Error: file or directory not found."
+        return usage(node)
+
+    def tree_view(self, path=None):
+        """
+        Команда 'tree' выводит дерево директорий и файлов.
+
+        :param path: Путь к директории (по умолчанию — текущая директория)
+        """
+        node = self.tree.resolve(path or '', self.current_directory)
+        if node is None:
+            return "Error: directory not found."
+        return render_tree(node)
+
+    def find(self, path=None, name=None, kind=None):
+        """
+        Команда 'find' ищет файлы и директории по шаблону имени и типу.
+
+        :param path: Директория, с которой начинается поиск (по умолчанию — текущая)
+        :param name: Шаблон имени, например '*.txt'
+        :param kind: 'f' — только файлы, 'd' — только директории
+        """
+        node = self.tree.resolve(path or '', self.current_directory)
+        if node is None:
+            return "Error: directory not found."
+        return render_paths(self.tree.find(node, name, kind))
 
     def uname(self, args=None):
         """
@@ -164,6 +196,8 @@ class Emulator:
         """
         Метод выхода из эмулятора. Вносим изменения прямо в архив.
         """
+        self.journal.compact()
+        self.logger.close()
         print("All changes saved to the archive.")
         exit()
 
@@ -181,35 +215,9 @@ if __name__ == "__main__":
     while True:
         print()
         command = input(f"{username}@{hostname}:{emulator._get_prompt_directory()}$ ")
-        if command.startswith("ls"):
-            # Поддержка аргумента для команды ls
-            args = command.split(" ")
-            if len(args) == 2:
-                output = emulator.ls(args[1])
-            else:
-                output = emulator.ls()
-            emulator._log(command, output)
-        elif command.startswith("cd "):
-            output = emulator.cd(command.split(" ")[1])
-            emulator._log(command, output)
-        elif command.startswith("rmdir"):
-            args = command.split(" ")
-            if len(args) == 2:
-                output = emulator.rmdir(args[1])
-            else:
-                output = emulator.rmdir()
-            emulator._log(command, output)
-        elif command.startswith("uname"):
-            args = command.split(" ")
-            if len(args) == 2:
-                output = emulator.uname(args[1])
-            else:
-                output = emulator.uname()
-            print(output)
-            emulator._log(command, output)
-        elif command == "exit":
+        if command == "exit":
             emulator.exit_emulator()
-        else:
-            response = "Unknown command."
-            print(response)
-            emulator._log(command, response)
+        output = stream_output(execute_command(emulator, command), lambda chunk: print(chunk, end=''))
+        if output:
+            print()
+        emulator._log(command, output)
@@ -0,0 +1,206 @@
+COMMANDS = {}  # Имя команды -> обработчик(emulator, args)
+
+METHODS = {'tree': 'tree_view'}  # Команды, имя метода которых отличается от имени команды
+
+LOG_OUTPUT_LIMIT = 4096  # Сколько символов потокового вывода попадает в лог
+
+
+def command(name):
+    """
+    Декоратор для регистрации обработчика команды в общей таблице.
+    Имя команды совпадает с именем метода эмулятора, который её выполняет (исключения — в METHODS).
+
+    :param name: Имя команды
+    """
+    def register(handler):
+        COMMANDS[name] = handler
+        return handler
+    return register
+
+
+def execute_command(emulator, command_line):
+    """
+    Разбирает строку команды и выполняет её на эмуляторе.
+
+    Команда считается неизвестной, если её нет в таблице или эмулятор её не поддерживает
+    (например, rmdir есть только в emul_cmd.py, а cat — только в emul.py).
+
+    :param emulator: Экземпляр Emulator из emul.py или emul_cmd.py
+    :param command_line: Ввод пользователя
+    :return: Вывод команды
+    """
+    args = command_line.split()
+    if not args:
+        return ""
+    name, args = args[0], args[1:]
+    handler = COMMANDS.get(name)
+    if handler is None or getattr(emulator, METHODS.get(name, name), None) is None:
+        return "Unknown command."
+    return handler(emulator, args)
+
+
+def iter_output(output, chunk_size=64 * 1024):
+    """
+    Возвращает вывод команды частями. Команды возвращают либо строку,
+    либо итератор частей (потоковый вывод cat, head, tail).
+
+    :param output: Результат execute_command
+    :param chunk_size: Размер части строкового вывода в символах
+    """
+    if isinstance(output, str):
+        for start in range(0, len(output), chunk_size):
+            yield output[start:start + chunk_size]
+    else:
+        yield from output
+
+
+class OutputPreview:
+    """Начало вывода команды (не длиннее limit символов) для записи в лог."""
+
+    def __init__(self, limit=LOG_OUTPUT_LIMIT):
+        self.limit = limit
+        self.truncated = False
+        self._parts = []
+        self._size = 0
+
+    def add(self, chunk):
+        room = self.limit - self._size
+        if room > 0:
+            self._parts.append(chunk[:room])
+            self._size += len(self._parts[-1])
+        if len(chunk) > room:
+            self.truncated = True
+
+    def text(self):
+        text = ''.join(self._parts)
+        return text + '...' if self.truncated else text
+
+
+def stream_output(output, write, chunk_size=64 * 1024, preview_limit=LOG_OUTPUT_LIMIT):
+    """
+    Передаёт вывод команды частями в функцию write.
+    Если write возвращает False, вывод прерывается и дальнейшее чтение файла не выполняется.
+
+    :param output: Результат execute_command
+    :param write: Функция, получающая очередную часть вывода
+    :param chunk_size: Размер части строкового вывода в символах
+    :param preview_limit: Сколько символов вывода вернуть для записи в лог
+    :return: Начало вывода (не длиннее preview_limit) для записи в лог
+    """
+    preview = OutputPreview(preview_limit)
+    chunks = iter_output(output, chunk_size)
+    try:
+        for chunk in chunks:
+            preview.add(chunk)
+            if write(chunk) is False:
+                preview.truncated = True
+                break
+    finally:
+        chunks.close()
+    return preview.text()
+
+
+def _parse_count(args, default=10):
+    """Разбирает аргументы head/tail: [-n N | -N] FILE. Возвращает (N, FILE) или None."""
+    count = default
+    if args and args[0] == '-n' and len(args) >= 2:
+        count, args = args[1], args[2:]
+    elif args and args[0].startswith('-') and args[0][1:].isdigit():
+        count, args = args[0][1:], args[1:]
+    if not args or not str(count).isdigit():
+        return None
+    return int(count), args[0]
+
+
+@command('ls')
+def _ls(emulator, args):
+    return emulator.ls(*args[:1])
+
+
+@command('cd')
+def _cd(emulator, args):
+    if not args:
+        return "Error: cd command requires an argument."
+    return emulator.cd(args[0])
+
+
+@command('cat')
+def _cat(emulator, args):
+    if not args:
+        return "Error: cat command requires an argument."
+    return emulator.cat(args[0])
+
+
+@command('head')
+def _head(emulator, args):
+    parsed = _parse_count(args)
+    if parsed is None:
+        return "Usage: head [-n N] FILE"
+    count, filename = parsed
+    return emulator.head(filename, count)
+
+
+@command('tail')
+def _tail(emulator, args):
+    parsed = _parse_count(args)
+    if parsed is None:
+        return "Usage: tail [-n N] FILE"
+    count, filename = parsed
+    return emulator.tail(filename, count)
+
+
+@command('du')
+def _du(emulator, args):
+    return emulator.du(*args[:1])
+
+
+@command('tree')
+def _tree(emulator, args):
+    return emulator.tree_view(*args[:1])
+
+
+@command('find')
+def _find(emulator, args):
+    path = None
+    name = kind = None
+    if args and not args[0].startswith('-'):
+        path, args = args[0], args[1:]
+    while args:
+        if args[0] == '-name' and len(args) >= 2:
+            name = args[1]
+        elif args[0] == '-type' and len(args) >= 2 and args[1] in ('f', 'd'):
+            kind = args[1]
+        else:
+            return "Usage: find [PATH] [-name PATTERN] [-type f|d]"
+        args = args[2:]
+    return emulator.find(path, name, kind)
+
+
+@command('grep')
+def _grep(emulator, args):
+    recursive = False
+    while args and args[0] in ('-r', '-R'):
+        recursive, args = True, args[1:]
+    if not args or len(args) > 2:
+        return "Usage: grep [-r] PATTERN [PATH]"
+    return emulator.grep(args[0], *args[1:], recursive=recursive)
+
+
+@command('echo')
+def _echo(emulator, args):
+    return emulator.echo(' '.join(args))
+
+
+@command('rmdir')
+def _rmdir(emulator, args):
+    return emulator.rmdir(*args[:1])
+
+
+@command('uname')
+def _uname(emulator, args):
+    return emulator.uname(*args[:1])
+
+
+@command('sync')
+def _sync(emulator, args):
+    return emulator.sync()
@@ -0,0 +1,323 @@
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+
+from emul_index import archive_key
+
+MAGIC = b'EMULTRI1'
+VERSION = 1
+
+# Заголовок: сигнатура, версия, размер архива, mtime архива (нс), хеш центрального каталога,
+# число документов, число триграмм, суммарная длина списков документов, размер блока имён, длина пути к архиву
+HEADER = struct.Struct('<8sIQq32sIIQQI')
+
+# Документ (текстовый член архива): смещение и длина имени в блоке имён
+DOCUMENT = struct.Struct('<QI')
+
+# Триграмма и её список документов: три байта, номер первого элемента в массиве списков, длина списка.
+# Таблица отсортирована по триграммам, поиск — двоичный.
+TRIGRAM = struct.Struct('<3sII')
+
+POSTING = array('I').itemsize
+
+_SPECIAL = '.^$*+?{}[]\\|()'
+# Число шестнадцатеричных цифр в кодах символов \xHH, \uXXXX и \UXXXXXXXX
+_CODE_LENGTHS = {'x': 2, 'u': 4, 'U': 8}
+
+
+def trigram_path_for(zip_path):
+    """Путь к файлу триграммного индекса, лежащему рядом с архивом."""
+    return zip_path + '.tri'
+
+
+def required_literals(pattern):
+    """
+    Строки, которые обязательно входят в любое совпадение с регулярным выражением pattern.
+
+    Разбор консервативный: учитываются только литералы вне групп, а выражения с альтернативой
+    или флагами вида (?i) не дают литералов вовсе. Лишний кандидат проверяется регулярным выражением,
+    пропущенный — нет, поэтому ошибаться можно только в сторону меньшего числа литералов.
+    """
+    if '|' in pattern or '(?' in pattern:
+        return []
+
+    literals = []
+    run = []
+    depth = 0
+
+    def close():
+        if run:
+            literals.append(''.join(run))
+            run.clear()
+
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        i += 1
+        if char == '\\' and i < len(pattern):
+            char = pattern[i]
+            i += 1
+            if char.isalnum():
+                # Класс (\d, \w), граница (\b), обратная ссылка или код символа: тело кода (\x48, \u0410,
+                # \N{...}, \012) пропускается целиком, иначе его цифры сошли бы за обязательный литерал
+                if char in _CODE_LENGTHS:
+                    i += _CODE_LENGTHS[char]
+                elif char == 'N' and pattern.startswith('{', i):
+                    end = pattern.find('}', i)
+                    i = len(pattern) if end < 0 else end + 1
+                elif char.isdigit():
+                    # Восьмеричный код — до трёх цифр, обратная ссылка — до двух
+                    end = i
+                    while end < len(pattern) and end < i + 2 and pattern[end].isdigit():
+                        end += 1
+                    i = end
+                close()
+                continue
+        elif char == '[':
+            close()
+            if i < len(pattern) and pattern[i] == '^':
+                i += 1
+            if i < len(pattern) and pattern[i] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            i += 1
+            continue
+        elif char in '*?{':
+            if run:
+                run.pop()  # Символ перед квантификатором может отсутствовать
+            close()
+            if char == '{':
+                end = pattern.find('}', i)
+                i = len(pattern) if end < 0 else end + 1
+            continue
+        elif char == '(':
+            close()
+            depth += 1
+            continue
+        elif char == ')':
+            close()
+            depth -= 1
+            continue
+        elif char in _SPECIAL:  # . ^ $ +
+            close()
+            continue
+
+        if depth == 0:
+            run.append(char)
+        else:
+            close()
+    close()
+    return literals
+
+
+def pattern_trigrams(pattern):
+    """Триграммы (в байтах UTF-8), которые обязательно есть в файле, содержащем совпадение."""
+    result = set()
+    for literal in required_literals(pattern):
+        data = literal.encode('utf-8')
+        result.update(data[i:i + 3] for i in range(len(data) - 2))
+    return result
+
+
+def _iter_members(tree, content, chunk_size=1024 * 1024):
+    """
+    Текстовые члены архива: (имя, первая часть содержимого, открытый член архива для чтения остального).
+    Двоичные файлы (с нулевым байтом в начале) пропускаются, как grep -I.
+    """
+    for node in tree.walk():
+        info = node.info
+        if node.is_dir or info is None or not node.explicit:
+            continue
+        with content.zip_file.open(info) as member:
+            first = member.read(chunk_size)
+            if b'\0' in first:
+                continue
+            yield node.path(), first, member
+
+
+def build_trigram_index(index_file, tree, content, key, chunk_size=1024 * 1024):
+    """
+    Строит триграммный индекс текстовых членов архива и записывает его в файл.
+
+    :param index_file: Файл, открытый на запись в бинарном режиме
+    :param tree: Дерево файлов архива (то же, что загружает эмулятор)
+    :param content: ZipContent архива; файлы распаковываются потоком, в обход кэша
+    :param key: Результат archive_key для архива
+    """
+    names = bytearray()
+    documents = []
+    postings = {}  # Триграмма -> номера документов по возрастанию
+
+    for number, (name, first, member) in enumerate(_iter_members(tree, content, chunk_size)):
+        encoded = name.encode('utf-8')
+        documents.append(DOCUMENT.pack(len(names), len(encoded)))
+        names += encoded
+
+        seen = set()
+        tail = b''
+        chunk = first
+        while chunk:
+            # Два последних байта предыдущей части, чтобы не потерять триграммы на границе
+            data = tail + chunk
+            seen.update(data[i:i + 3] for i in range(len(data) - 2))
+            tail = data[-2:]
+            chunk = member.read(chunk_size)
+        for trigram in seen:
+            documents_of = postings.get(trigram)
+            if documents_of is None:
+                documents_of = postings[trigram] = array('I')
+            documents_of.append(number)
+
+    table = []
+    lists = []
+    position = 0
+    for trigram in sorted(postings):
+        documents_of = postings[trigram]
+        table.append(TRIGRAM.pack(trigram, position, len(documents_of)))
+        lists.append(documents_of.tobytes())
+        position += len(documents_of)
+
+    path, size, mtime_ns, cd_hash = key
+    path_bytes = path.encode('utf-8')
+    index_file.write(HEADER.pack(MAGIC, VERSION, size, mtime_ns, cd_hash, len(documents), len(table),
+                                 position, len(names), len(path_bytes)))
+    index_file.write(path_bytes)
+    index_file.write(b''.join(documents))
+    index_file.write(b''.join(table))
+    index_file.write(b''.join(lists))
+    index_file.write(names)
+    index_file.flush()
+
+
+class TrigramIndex:
+    """
+    Триграммный индекс, отображённый в память: для запроса возвращает члены архива,
+    которые могут содержать совпадение. Списки документов читаются только для триграмм запроса.
+    """
+
+    def __init__(self, index_file, mapping):
+        self._file = index_file
+        self._mapping = mapping
+        header = HEADER.unpack_from(mapping, 0)
+        self.count = header[5]
+        self.trigram_count = header[6]
+        self._documents_offset = HEADER.size + header[9]
+        self._table_offset = self._documents_offset + self.count * DOCUMENT.size
+        self._postings_offset = self._table_offset + self.trigram_count * TRIGRAM.size
+        self._names_offset = self._postings_offset + header[7] * POSTING
+
+    @classmethod
+    def open(cls, index_path, key):
+        """
+        Открывает индекс, если он построен для того же архива в том же состоянии.
+
+        :return: TrigramIndex или None, если индекса нет, он повреждён или устарел
+        """
+        try:
+            index_file = open(index_path, 'rb')
+        except OSError:
+            return None
+        return cls.from_file(index_file, key)
+
+    @classmethod
+    def from_file(cls, index_file, key):
+        """Отображает в память открытый файл индекса; при несовпадении ключа закрывает его и возвращает None."""
+        try:
+            mapping = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            index_file.close()
+            return None
+
+        path, size, mtime_ns, cd_hash = key
+        valid = len(mapping) >= HEADER.size
+        if valid:
+            (magic, version, saved_size, saved_mtime, saved_hash, count, trigram_count, posting_count,
+             names_size, path_length) = HEADER.unpack_from(mapping, 0)
+            saved_path = mapping[HEADER.size:HEADER.size + path_length].decode('utf-8', errors='replace')
+            valid = (magic == MAGIC and version == VERSION and saved_size == size and saved_mtime == mtime_ns
+                     and saved_hash == cd_hash and saved_path == path
+                     and len(mapping) == HEADER.size + path_length + count * DOCUMENT.size
+                     + trigram_count * TRIGRAM.size + posting_count * POSTING + names_size)
+        if not valid:
+            mapping.close()
+            index_file.close()
+            return None
+        return cls(index_file, mapping)
+
+    def name(self, number):
+        """Имя члена архива (без начального '/') по номеру документа."""
+        offset, length = DOCUMENT.unpack_from(self._mapping, self._documents_offset + number * DOCUMENT.size)
+        start = self._names_offset + offset
+        return self._mapping[start:start + length].decode('utf-8')
+
+    def _postings(self, trigram):
+        """Номера документов, содержащих триграмму (пустой массив, если таких нет)."""
+        low, high = 0, self.trigram_count
+        while low < high:
+            middle = (low + high) // 2
+            offset = self._table_offset + middle * TRIGRAM.size
+            current = self._mapping[offset:offset + 3]
+            if current < trigram:
+                low = middle + 1
+            elif current > trigram:
+                high = middle
+            else:
+                _, first, length = TRIGRAM.unpack_from(self._mapping, offset)
+                start = self._postings_offset + first * POSTING
+                return array('I', self._mapping[start:start + length * POSTING])
+        return array('I')
+
+    def candidates(self, pattern):
+        """
+        Имена членов архива, в которых может быть совпадение с pattern, в порядке документов.
+        Если из шаблона не извлекается ни одной триграммы, кандидаты — все текстовые файлы.
+        """
+        trigrams = pattern_trigrams(pattern)
+        if not trigrams:
+            numbers = range(self.count)
+        else:
+            lists = sorted((self._postings(trigram) for trigram in trigrams), key=len)
+            found = set(lists[0])
+            for documents_of in lists[1:]:
+                if not found:
+                    break
+                found.intersection_update(documents_of)
+            numbers = sorted(found)
+        for number in numbers:
+            yield self.name(number)
+
+    def close(self):
+        self._mapping.close()
+        self._file.close()
+
+
+def load_trigram_index(zip_path, tree, content, index_path=None):
+    """
+    Загружает триграммный индекс архива; если его нет или он устарел, строит и сохраняет заново.
+
+    :param zip_path: Путь к архиву
+    :param tree: Дерево файлов архива
+    :param content: ZipContent архива
+    :param index_path: Путь к файлу индекса (по умолчанию — рядом с архивом)
+    :return: TrigramIndex
+    """
+    index_path = index_path or trigram_path_for(zip_path)
+    key = archive_key(zip_path)
+    index = TrigramIndex.open(index_path, key)
+    if index is not None:
+        return index
+
+    temp_path = index_path + '.temp'
+    try:
+        with open(temp_path, 'wb') as index_file:
+            build_trigram_index(index_file, tree, content, key)
+        os.replace(temp_path, index_path)
+    except OSError:
+        # Без права записи рядом с архивом индекс живёт во временном файле до конца работы
+        index_file = tempfile.TemporaryFile()
+        build_trigram_index(index_file, tree, content, key)
+        return TrigramIndex.from_file(index_file, key)
+    return TrigramIndex.open(index_path, key)
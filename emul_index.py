@@ -0,0 +1,325 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import zipfile
+from collections import deque
+
+from emul_vfs import FileTree, Node, ZipContent
+
+MAGIC = b'EMULIDX1'
+VERSION = 2
+
+# Заголовок: сигнатура, версия, размер архива, mtime архива (нс), хеш центрального каталога,
+# число записей, размер блока имён, длина пути к архиву
+HEADER = struct.Struct('<8sIQq32sQQI')
+
+# Запись об узле дерева. Узлы записаны в порядке обхода в ширину, поэтому дети каждой
+# директории занимают непрерывный диапазон записей [first_child, first_child + child_count).
+# Поля: смещение и длина имени узла, смещение и длина полного имени члена архива (0 — неявная директория),
+# first_child, child_count, header_offset, compress_size, file_size, CRC, флаги узла,
+# compress_type, flag_bits, дата и время в формате DOS, итоги по поддереву (файлы, директории,
+# исходный и сжатый размер)
+RECORD = struct.Struct('<IIIIIIQQQIHHHHHQQQQ')
+
+FLAG_DIR = 0x1
+FLAG_EXPLICIT = 0x2
+
+_EOCD = struct.Struct('<4s4H2LH')
+_EOCD64_LOCATOR = struct.Struct('<4sLQL')
+_EOCD64 = struct.Struct('<4sQ2H2L4Q')
+
+
+def index_path_for(zip_path):
+    """Путь к файлу индекса, лежащему рядом с архивом."""
+    return zip_path + '.idx'
+
+
+def central_directory_hash(fp):
+    """
+    Хеш центрального каталога архива. Каталог находится по записи EOCD в конце файла
+    (с учётом ZIP64), сами члены архива не читаются.
+
+    :param fp: Архив, открытый как бинарный файл
+    """
+    fp.seek(0, os.SEEK_END)
+    file_size = fp.tell()
+    tail_size = min(file_size, _EOCD.size + 0xFFFF)  # EOCD и комментарий к архиву
+    fp.seek(file_size - tail_size)
+    tail = fp.read(tail_size)
+    pos = tail.rfind(zipfile.stringEndArchive)
+    if pos < 0:
+        raise zipfile.BadZipFile("End of central directory not found")
+    eocd_offset = file_size - tail_size + pos
+    fields = _EOCD.unpack(tail[pos:pos + _EOCD.size])
+    cd_size, cd_offset = fields[5], fields[6]
+
+    if cd_offset == 0xFFFFFFFF or cd_size == 0xFFFFFFFF:
+        fp.seek(eocd_offset - _EOCD64_LOCATOR.size)
+        locator = _EOCD64_LOCATOR.unpack(fp.read(_EOCD64_LOCATOR.size))
+        fp.seek(locator[2])
+        eocd64 = _EOCD64.unpack(fp.read(_EOCD64.size))
+        cd_size, cd_offset = eocd64[7], eocd64[8]
+
+    digest = hashlib.sha256()
+    fp.seek(cd_offset)
+    remaining = cd_size
+    while remaining:
+        chunk = fp.read(min(remaining, 1024 * 1024))
+        if not chunk:
+            break
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest.digest()
+
+
+def archive_key(zip_path):
+    """Ключ актуальности индекса: абсолютный путь, размер и mtime архива, хеш центрального каталога."""
+    stat = os.stat(zip_path)
+    with open(zip_path, 'rb') as fp:
+        cd_hash = central_directory_hash(fp)
+    return os.path.abspath(zip_path), stat.st_size, stat.st_mtime_ns, cd_hash
+
+
+def _dos_date_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+
+def _date_time(dos_date, dos_time):
+    return ((dos_date >> 9) + 1980, (dos_date >> 5) & 0xF, dos_date & 0x1F,
+            dos_time >> 11, (dos_time >> 5) & 0x3F, (dos_time & 0x1F) * 2)
+
+
+def save_index(index_path, tree, key):
+    """
+    Сохраняет дерево в файл индекса. Файл записывается во временный файл и атомарно
+    подменяет старый, поэтому читатель никогда не увидит недописанный индекс.
+
+    :param index_path: Путь к файлу индекса
+    :param tree: Дерево, построенное по центральному каталогу (node.info — ZipInfo)
+    :param key: Результат archive_key для архива
+    """
+    path, size, mtime_ns, cd_hash = key
+    names = bytearray()
+    records = []
+
+    # Обход в ширину: дети каждой директории получают соседние номера записей
+    order = [tree.root]
+    queue = deque([tree.root])
+    while queue:
+        node = queue.popleft()
+        if node.is_dir:
+            for child in node.children.values():
+                order.append(child)
+                queue.append(child)
+
+    index_of = {id(node): number for number, node in enumerate(order)}
+    for node in order:
+        name = node.name.encode('utf-8')
+        name_offset = len(names)
+        names += name
+        info = node.info
+        filename = info.orig_filename.encode('utf-8') if node.explicit and info is not None else b''
+        filename_offset = len(names)
+        names += filename
+
+        first_child = child_count = 0
+        if node.is_dir and node.children:
+            first_child = index_of[id(next(iter(node.children.values())))]
+            child_count = len(node.children)
+        flags = (FLAG_DIR if node.is_dir else 0) | (FLAG_EXPLICIT if filename else 0)
+        if filename:
+            dos_date, dos_time = _dos_date_time(info.date_time)
+            records.append(RECORD.pack(name_offset, len(name), filename_offset, len(filename),
+                                       first_child, child_count, info.header_offset, info.compress_size,
+                                       info.file_size, info.CRC, flags, info.compress_type, info.flag_bits,
+                                       dos_date, dos_time, node.files, node.dirs, node.size, node.compressed))
+        else:
+            records.append(RECORD.pack(name_offset, len(name), filename_offset, 0,
+                                       first_child, child_count, 0, 0, 0, 0, flags, 0, 0, 0, 0,
+                                       node.files, node.dirs, node.size, node.compressed))
+
+    path_bytes = path.encode('utf-8')
+    temp_path = index_path + '.temp'
+    with open(temp_path, 'wb') as index_file:
+        index_file.write(HEADER.pack(MAGIC, VERSION, size, mtime_ns, cd_hash, len(records), len(names),
+                                     len(path_bytes)))
+        index_file.write(path_bytes)
+        index_file.write(b''.join(records))
+        index_file.write(names)
+    os.replace(temp_path, index_path)
+
+
+class MappedIndex:
+    """
+    Индекс, отображённый в память. Узлы дерева создаются лениво: при обращении к children
+    директории из индекса читается только диапазон записей её детей.
+    """
+
+    def __init__(self, index_file, mapping, key):
+        """
+        :param index_file: Открытый файл индекса
+        :param mapping: mmap этого файла
+        :param key: Результат archive_key для архива
+        """
+        self._file = index_file
+        self._mapping = mapping
+        self.key = key
+        header = HEADER.unpack_from(mapping, 0)
+        self.count = header[5]
+        self._records_offset = HEADER.size + header[7]
+        self._names_offset = self._records_offset + self.count * RECORD.size
+
+    @classmethod
+    def open(cls, index_path, key):
+        """
+        Открывает индекс, если он построен для того же архива в том же состоянии.
+
+        :return: MappedIndex или None, если индекса нет, он повреждён или устарел
+        """
+        try:
+            index_file = open(index_path, 'rb')
+        except OSError:
+            return None
+        try:
+            mapping = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            index_file.close()
+            return None
+
+        path, size, mtime_ns, cd_hash = key
+        valid = len(mapping) >= HEADER.size
+        if valid:
+            magic, version, saved_size, saved_mtime, saved_hash, count, names_size, path_length = \
+                HEADER.unpack_from(mapping, 0)
+            saved_path = mapping[HEADER.size:HEADER.size + path_length].decode('utf-8', errors='replace')
+            valid = (magic == MAGIC and version == VERSION and saved_size == size and saved_mtime == mtime_ns
+                     and saved_hash == cd_hash and saved_path == path
+                     and len(mapping) == HEADER.size + path_length + count * RECORD.size + names_size)
+        if not valid:
+            mapping.close()
+            index_file.close()
+            return None
+        return cls(index_file, mapping, key)
+
+    def _name(self, offset, length):
+        start = self._names_offset + offset
+        return self._mapping[start:start + length].decode('utf-8')
+
+    def tree(self):
+        """Возвращает дерево, в котором пока создан только корень."""
+        tree = FileTree()
+        tree.index = self  # Индекс должен жить, пока жив отображённый в память файл
+        record = RECORD.unpack_from(self._mapping, self._records_offset)
+        root = tree.root
+        root.files, root.dirs, root.size, root.compressed = record[15:]
+        if record[5]:
+            root._loader = (self, 0)
+        return tree
+
+    def load_children(self, node, number):
+        """Создаёт дочерние узлы директории по записи с номером number."""
+        record = RECORD.unpack_from(self._mapping, self._records_offset + number * RECORD.size)
+        first_child, child_count = record[4], record[5]
+        children = node._children
+        offset = self._records_offset + first_child * RECORD.size
+        for child_number in range(first_child, first_child + child_count):
+            (name_offset, name_length, filename_offset, filename_length, grand_first, grand_count,
+             header_offset, compress_size, file_size, crc, flags, compress_type, flag_bits,
+             dos_date, dos_time, files, dirs, size, compressed) = RECORD.unpack_from(self._mapping, offset)
+            offset += RECORD.size
+
+            name = self._name(name_offset, name_length)
+            child = Node(name, node, is_dir=bool(flags & FLAG_DIR))
+            child.files, child.dirs, child.size, child.compressed = files, dirs, size, compressed
+            if flags & FLAG_EXPLICIT:
+                info = zipfile.ZipInfo(self._name(filename_offset, filename_length), _date_time(dos_date, dos_time))
+                info.header_offset = header_offset
+                info.compress_size = compress_size
+                info.file_size = file_size
+                info.CRC = crc
+                info.compress_type = compress_type
+                info.flag_bits = flag_bits
+                child.info = info
+                child.explicit = True
+            if grand_count:
+                child._loader = (self, child_number)
+            children[name] = child
+
+    def close(self):
+        self._mapping.close()
+        self._file.close()
+
+
+def build_tree(zip_file):
+    """Строит дерево по центральному каталогу открытого архива."""
+    tree = FileTree()
+    for info in zip_file.infolist():
+        # Удаляем начальные / для удобства работы с файлами
+        tree.add(info.filename.lstrip('/'), info)
+    return tree
+
+
+def load_tree(zip_path, index_path=None):
+    """
+    Загружает дерево файлов архива: из индекса, если он актуален, иначе — по центральному каталогу
+    с пересохранением индекса.
+
+    :param zip_path: Путь к архиву
+    :param index_path: Путь к файлу индекса (по умолчанию — рядом с архивом)
+    :return: (дерево, ZipFile) — ZipFile открыт, только если пришлось читать центральный каталог, иначе None
+    """
+    index_path = index_path or index_path_for(zip_path)
+    key = archive_key(zip_path)
+    index = MappedIndex.open(index_path, key)
+    if index is not None:
+        return index.tree(), None
+
+    zip_file = zipfile.ZipFile(zip_path, 'r')
+    tree = build_tree(zip_file)
+    try:
+        save_index(index_path, tree, key)
+    except OSError:
+        pass  # Индекс — только ускорение: без права записи просто работаем без него
+    return tree, zip_file
+
+
+class ArchiveImage:
+    """
+    Общий образ архива для нескольких сеансов: дерево файлов и кэш содержимого.
+    Дерево образа не изменяется; сеансы вносят изменения в собственные OverlayTree поверх него.
+    """
+
+    def __init__(self, zip_path, cache_size=64 * 1024 * 1024):
+        """
+        :param zip_path: Путь к архиву
+        :param cache_size: Лимит общего кэша содержимого файлов в байтах
+        """
+        self.zip_path = zip_path
+        self.tree, zip_file = load_tree(zip_path)
+        self.content = ZipContent(zip_path, cache_size, zip_file=zip_file)
+        self.trigrams = None  # Триграммный индекс для grep, загружается при первом поиске
+        self._trigrams_lock = threading.Lock()
+
+    def trigram_index(self):
+        """
+        Триграммный индекс содержимого архива, общий для всех сеансов.
+        Первые одновременные вызовы строят его один раз: остальные ждут готового индекса.
+        """
+        if self.trigrams is None:
+            with self._trigrams_lock:
+                if self.trigrams is None:
+                    # Импорт здесь: emul_grep сам зависит от emul_index
+                    from emul_grep import load_trigram_index
+                    self.trigrams = load_trigram_index(self.zip_path, self.tree, self.content)
+        return self.trigrams
+
+    def close(self):
+        """Закрывает архив и индексы образа."""
+        self.content.close()
+        if self.trigrams is not None:
+            self.trigrams.close()
+        if self.tree.index is not None:
+            self.tree.index.close()
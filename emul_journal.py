@@ -0,0 +1,222 @@
+import base64
+import copy
+import json
+import os
+import shutil
+import struct
+import zipfile
+
+from emul_vfs import data_offset
+
+
+# Внутреннее устройство ZipFile из CPython, через которое член архива пишется без пересжатия
+_ZIPFILE_INTERNALS = ('fp', 'start_dir', 'filelist', 'NameToInfo', '_didModify')
+
+
+def _strip_zip64_extra(extra):
+    """Удаляет из поля extra блок ZIP64 (id 0x0001): при записи заголовка он формируется заново."""
+    result = b''
+    pos = 0
+    while pos + 4 <= len(extra):
+        field_id, size = struct.unpack('<HH', extra[pos:pos + 4])
+        if field_id != 1:
+            result += extra[pos:pos + 4 + size]
+        pos += 4 + size
+    return result
+
+
+class MutationJournal:
+    """
+    Журнал изменений архива виртуальной файловой системы.
+
+    Удаления и записи не переписывают архив сразу, а дописываются в небольшой файл рядом с ним
+    (<архив>.journal, по одной JSON-строке на операцию). Архив пересобирается один раз —
+    при выходе из эмулятора или по команде sync. Если эмулятор аварийно завершился,
+    журнал остаётся на диске и воспроизводится при следующем запуске.
+    """
+
+    def __init__(self, zip_path):
+        """
+        :param zip_path: Путь к архиву, изменения которого записываются в журнал
+        """
+        self.zip_path = zip_path
+        self.path = zip_path + '.journal'
+        self.entries = []  # Операции в порядке записи: (операция, имя, данные)
+        self._file = None
+        self._load()
+
+    def _load(self):
+        """Читает журнал, оставшийся от предыдущего сеанса."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Последняя строка могла быть записана не полностью во время сбоя
+                    break
+                data = base64.b64decode(record['data']) if 'data' in record else None
+                self.entries.append((record['op'], record['name'], data))
+
+    def _append(self, record):
+        """Дописывает операцию в файл журнала и сбрасывает её на диск."""
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def delete(self, name):
+        """
+        Записывает удаление члена архива. Для директории (имя оканчивается на '/') удаляется всё поддерево.
+
+        :param name: Имя члена архива без начального '/'
+        """
+        self._append({'op': 'delete', 'name': name})
+        self.entries.append(('delete', name, None))
+
+    def write(self, name, data):
+        """
+        Записывает создание или замену члена архива.
+
+        :param name: Имя члена архива без начального '/'
+        :param data: Содержимое (bytes)
+        """
+        self._append({'op': 'write', 'name': name, 'data': base64.b64encode(data).decode('ascii')})
+        self.entries.append(('write', name, data))
+
+    @property
+    def pending(self):
+        """Есть ли изменения, ещё не перенесённые в архив."""
+        return bool(self.entries)
+
+    def compact(self):
+        """
+        Переносит накопленные изменения в архив и очищает журнал.
+
+        Сохраняемые члены архива копируются как есть, в сжатом виде, без распаковки и повторного сжатия.
+        Если у ZipFile нет нужного для этого внутреннего устройства, они распаковываются и сжимаются заново.
+
+        :return: Число применённых операций
+        """
+        if not self.entries:
+            return 0
+
+        # Сворачиваем журнал в итоговое состояние: имя -> новое содержимое (None — удалено)
+        overrides = {}
+        deleted_dirs = set()
+        for op, name, data in self.entries:
+            if op == 'delete':
+                overrides[name] = None
+                if name.endswith('/'):
+                    deleted_dirs.add(name)
+                    for written in [key for key in overrides if key.startswith(name) and key != name]:
+                        del overrides[written]
+            else:
+                overrides[name] = data
+
+        temp_zip = self.zip_path + '.temp'  # Временный файл для нового архива
+        with open(self.zip_path, 'rb') as source, zipfile.ZipFile(self.zip_path, 'r') as zip_ref:
+            with zipfile.ZipFile(temp_zip, 'w') as new_zip:
+                raw = self._raw_copy_supported(new_zip)
+                for item in zip_ref.infolist():
+                    name = item.filename.lstrip('/')
+                    if name in overrides or self._under_deleted_dir(name, deleted_dirs):
+                        continue
+                    if raw:
+                        self._copy_raw(source, new_zip, item)
+                    else:
+                        self._copy_recompressed(zip_ref, new_zip, item)
+                for name, data in overrides.items():
+                    if data is not None:
+                        new_zip.writestr(name, data, zipfile.ZIP_DEFLATED)
+            with open(temp_zip, 'rb+') as temp_file:
+                os.fsync(temp_file.fileno())
+        # Заменяем старый архив новым
+        os.replace(temp_zip, self.zip_path)
+
+        applied = len(self.entries)
+        self.clear()
+        return applied
+
+    @staticmethod
+    def _under_deleted_dir(name, deleted_dirs):
+        """Проверяет, лежит ли член архива внутри удалённой директории (O(глубина пути))."""
+        if not deleted_dirs:
+            return False
+        pos = name.find('/')
+        while 0 <= pos < len(name) - 1:
+            if name[:pos + 1] in deleted_dirs:
+                return True
+            pos = name.find('/', pos + 1)
+        return False
+
+    @staticmethod
+    def _raw_copy_supported(new_zip):
+        """Есть ли у ZipFile внутреннее устройство, которым пользуется _copy_raw."""
+        return (all(hasattr(new_zip, name) for name in _ZIPFILE_INTERNALS)
+                and hasattr(zipfile.ZipInfo, 'FileHeader') and not getattr(new_zip, '_writing', False))
+
+    @staticmethod
+    def _copy_recompressed(zip_ref, new_zip, item):
+        """
+        Копирует член архива через открытые API: распаковывает и сжимает тем же методом заново.
+
+        :param zip_ref: Исходный архив (ZipFile в режиме 'r')
+        :param new_zip: Новый архив (ZipFile в режиме 'w')
+        :param item: ZipInfo копируемого члена
+        """
+        new_item = copy.copy(item)
+        new_item.extra = _strip_zip64_extra(item.extra)
+        with zip_ref.open(item) as member, new_zip.open(new_item, 'w',
+                                                       force_zip64=item.file_size > zipfile.ZIP64_LIMIT) as target:
+            shutil.copyfileobj(member, target, 1024 * 1024)
+
+    @staticmethod
+    def _copy_raw(source, new_zip, item):
+        """
+        Копирует член архива в новый архив, не распаковывая его.
+
+        :param source: Исходный архив, открытый как бинарный файл
+        :param new_zip: Новый архив (ZipFile в режиме 'w')
+        :param item: ZipInfo копируемого члена
+        """
+        # Начало сжатых данных находится за локальным заголовком переменной длины
+        source.seek(data_offset(source, item))
+
+        new_item = copy.copy(item)
+        new_item.flag_bits &= ~0x08  # CRC и размеры известны заранее, дескриптор данных не нужен
+        new_item.extra = _strip_zip64_extra(item.extra)
+        new_zip.fp.seek(new_zip.start_dir)
+        new_item.header_offset = new_zip.start_dir
+        new_zip.fp.write(new_item.FileHeader())
+
+        remaining = item.compress_size
+        while remaining:
+            chunk = source.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated member: {item.filename}")
+            new_zip.fp.write(chunk)
+            remaining -= len(chunk)
+
+        # Регистрируем член архива, чтобы он попал в центральный каталог при закрытии
+        new_zip.filelist.append(new_item)
+        new_zip.NameToInfo[new_item.filename] = new_item
+        new_zip.start_dir = new_zip.fp.tell()
+        new_zip._didModify = True
+
+    def clear(self):
+        """Удаляет файл журнала и забывает накопленные операции."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.entries = []
+
+    def close(self):
+        """Закрывает файл журнала, не применяя изменения."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,176 @@
+import atexit
+import csv
+import datetime
+import os
+import queue
+import threading
+
+FIELDS = ['timestamp', 'user', 'host', 'directory', 'command', 'output']
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+class CsvLogger:
+    """
+    Журнал действий эмулятора в формате CSV: по строке на команду с датой и временем.
+
+    Строки передаются через очередь фоновому потоку, который пишет их пачками в открытый файл.
+    При завершении программы оставшиеся в очереди записи гарантированно сбрасываются на диск.
+    """
+
+    def __init__(self, path, batch_size=256, flush_interval=0.5, fsync='batch',
+                 max_bytes=10 * 1024 * 1024, backup_count=3):
+        """
+        :param path: Путь к файлу лога
+        :param batch_size: Максимальное число строк, записываемых за один сброс
+        :param flush_interval: Максимальная задержка (в секундах) перед записью строки в файл
+        :param fsync: Политика fsync: 'never', 'batch' (после каждой пачки) или 'always' (после каждой строки)
+        :param max_bytes: Размер файла, при превышении которого лог ротируется (0 — без ротации)
+        :param backup_count: Сколько старых файлов лога (path.1, path.2, ...) хранить
+        """
+        if fsync not in ('never', 'batch', 'always'):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue = queue.Queue()
+        self._file = None
+        self._writer = None
+        self._closed = False
+
+        # Новые записи дописываются в конец лога; ротация — по размеру, а также если лог записан
+        # не в CSV (старый текстовый формат): строки CSV без заголовка в нём не прочитать
+        if os.path.exists(path) and os.path.getsize(path) > 0 and (
+                not self._has_header() or self.max_bytes and os.path.getsize(path) >= self.max_bytes):
+            self._rotate()
+        self._open()
+
+        self._thread = threading.Thread(target=self._run, name='emulator-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, username, hostname, directory, command, output):
+        """
+        Ставит в очередь строку лога. Запись на диск выполняет фоновый поток.
+
+        :param username: Имя пользователя
+        :param hostname: Имя компьютера
+        :param directory: Текущая директория на момент ввода команды
+        :param command: Ввод пользователя
+        :param output: Вывод программы
+        """
+        if self._closed:
+            return
+        timestamp = datetime.datetime.now().isoformat(sep=' ', timespec='milliseconds')
+        self._queue.put([timestamp, username, hostname, directory, command, output or ''])
+
+    def flush(self):
+        """Дожидается, пока все поставленные в очередь строки будут записаны в файл."""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        """Записывает оставшиеся строки и останавливает фоновый поток. Повторный вызов ничего не делает."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        atexit.unregister(self.close)
+        with _loggers_lock:
+            if _loggers.get(self.path) is self:
+                del _loggers[self.path]
+
+    def _open(self):
+        """Открывает файл лога и при необходимости пишет строку заголовка."""
+        self._file = open(self.path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        if self._file.tell() == 0:
+            self._writer.writerow(FIELDS)
+
+    def _has_header(self):
+        """Начинается ли существующий файл лога со строки заголовка CSV."""
+        with open(self.path, 'r', newline='', encoding='utf-8', errors='replace') as log_file:
+            return log_file.readline().rstrip('\r\n') == ','.join(FIELDS)
+
+    def _rotate(self):
+        """Сдвигает резервные копии (path.1 -> path.2, ...) и переносит текущий лог в path.1."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _run(self):
+        """Цикл фонового потока: собирает пачку строк из очереди и записывает её одним сбросом."""
+        running = True
+        while running:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = []
+            waiters = []
+            while True:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if not running or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+
+        self._file.close()
+
+    def _write(self, batch):
+        """Записывает пачку строк, сбрасывает буфер и ротирует файл при превышении размера."""
+        for row in batch:
+            self._writer.writerow(row)
+            if self.fsync == 'always':
+                self._file.flush()
+                os.fsync(self._file.fileno())
+        self._file.flush()
+        if self.fsync == 'batch':
+            os.fsync(self._file.fileno())
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+            self._open()
+
+
+def get_logger(path, **options):
+    """
+    Возвращает общий журнал для файла path, создавая его при первом обращении.
+    Все эмуляторы, пишущие в один файл, используют один фоновый поток.
+
+    :param path: Путь к файлу лога
+    :param options: Параметры CsvLogger (используются только при создании)
+    """
+    with _loggers_lock:
+        logger = _loggers.get(path)
+        if logger is None:
+            logger = _loggers[path] = CsvLogger(path, **options)
+        return logger
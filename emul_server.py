@@ -0,0 +1,172 @@
+"""
+Сервер эмулятора: много одновременных сеансов поверх одного образа архива.
+
+Дерево файлов и кэш содержимого загружаются один раз и разделяются всеми сеансами (ArchiveImage).
+У каждого сеанса есть только текущая директория и собственное дерево-надстройка (OverlayTree),
+в которое вносятся изменения вроде rmdir; архив на диске сервер не изменяет.
+
+Протокол: клиент отправляет команду одной строкой. Сервер отвечает кадрами '<длина в байтах>\\n<UTF-8 текст>',
+последний кадр ответа — '0\\n'. Команда exit закрывает соединение.
+
+Запуск:
+    python emul_server.py --zip_path zxc.zip --log_path server.log --socket /tmp/emul.sock
+    python emul_server.py --zip_path zxc.zip --log_path server.log --port 8765
+"""
+import argparse
+import asyncio
+
+from emul import Emulator
+from emul_commands import OutputPreview, execute_command, iter_output
+from emul_index import ArchiveImage
+from emul_log import get_logger
+
+
+class Session(Emulator):
+    """Сеанс сервера: эмулятор на общем образе архива с изменениями только в своём дереве."""
+
+    def rmdir(self, path=None):
+        """
+        Команда 'rmdir' удаляет пустую директорию из дерева сеанса.
+        Другие сеансы и архив на диске изменение не видят.
+        """
+        if path is None:
+            return "Error: rmdir command requires an argument."
+
+        node = self.tree.resolve(path, self.current_directory)
+        if node is None or not node.is_dir or node is self.tree.root:
+            return "Error: directory not found."
+        if node.children:
+            return f"Error: directory '{path}' is not empty. Remove all files inside first."
+        self.tree.remove(node)
+        return f"Directory '{path}' has been removed."
+
+
+async def read_response(reader):
+    """
+    Читает ответ сервера на одну команду.
+
+    :param reader: asyncio.StreamReader соединения с сервером
+    :return: Вывод команды
+    """
+    parts = []
+    while True:
+        length = int(await reader.readline())
+        if not length:
+            return b''.join(parts).decode('utf-8', errors='replace')
+        parts.append(await reader.readexactly(length))
+
+
+async def request(reader, writer, command):
+    """Отправляет команду серверу и возвращает её вывод."""
+    writer.write(command.encode('utf-8') + b'\n')
+    await writer.drain()
+    return await read_response(reader)
+
+
+class EmulatorServer:
+    def __init__(self, image, log_path, username='user1', hostname='my_pc', chunk_size=64 * 1024):
+        """
+        :param image: Общий образ архива (ArchiveImage)
+        :param log_path: Путь к общему для всех сеансов файлу лога
+        :param username: Имя пользователя сеансов
+        :param hostname: Имя компьютера сеансов
+        :param chunk_size: Размер части, которой вывод команд отправляется клиенту
+        """
+        self.image = image
+        self.log_path = log_path
+        self.username = username
+        self.hostname = hostname
+        self.chunk_size = chunk_size
+        self.sessions = 0  # Число открытых сеансов
+
+    async def handle(self, reader, writer):
+        """Обслуживает одно соединение: по сеансу на клиента, команды выполняются по очереди."""
+        session = Session(self.username, self.hostname, self.image.zip_path, self.log_path,
+                          chunk_size=self.chunk_size, image=self.image)
+        self.sessions += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode('utf-8', errors='replace').strip()
+                if command == "exit":
+                    session._log(command, "")
+                    break
+                directory = session._get_prompt_directory()
+                # Команда выполняется в потоке: du по незагруженному дереву или первый grep
+                # (строит триграммный индекс) не задерживают другие сеансы
+                output = await asyncio.get_running_loop().run_in_executor(None, execute_command, session, command)
+                output = await self._send_output(writer, output)
+                session._log(command, output, directory)
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            session.close()
+            writer.close()
+
+    async def _send_output(self, writer, output):
+        """
+        Отправляет вывод команды кадрами. Каждая часть вывода готовится в потоке (распаковка для cat
+        и tail, обход дерева для tree и find), а цикл событий только отправляет её, поэтому длинный
+        вывод не задерживает другие сеансы.
+
+        :return: Начало вывода для записи в лог
+        """
+        loop = asyncio.get_running_loop()
+        preview = OutputPreview()
+        chunks = iter_output(output, self.chunk_size)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                if not chunk:
+                    continue
+                preview.add(chunk)
+                data = chunk.encode('utf-8', errors='replace')
+                writer.write(b'%d\n' % len(data) + data)
+                await writer.drain()
+        finally:
+            chunks.close()
+        writer.write(b'0\n')
+        await writer.drain()
+        return preview.text()
+
+    async def serve(self, socket_path=None, host='127.0.0.1', port=8765):
+        """Принимает соединения на Unix-сокете socket_path или на TCP host:port, пока не будет отменён."""
+        if socket_path:
+            server = await asyncio.start_unix_server(self.handle, path=socket_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve many emulator sessions over one shared archive image.')
+    parser.add_argument('--zip_path', required=True, help='Path to the virtual filesystem archive')
+    parser.add_argument('--log_path', required=True, help='Path to the log file shared by all sessions')
+    parser.add_argument('--socket', help='Unix socket path to listen on (default: TCP loopback)')
+    parser.add_argument('--host', default='127.0.0.1', help='TCP host to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port to listen on')
+    parser.add_argument('--cache_size', type=int, default=64 * 1024 * 1024, help='Shared content cache limit in bytes')
+    parser.add_argument('--username', default='user1', help='User name shown in the log')
+    parser.add_argument('--hostname', default='my_pc', help='Host name shown in the log')
+    args = parser.parse_args()
+
+    image = ArchiveImage(args.zip_path, args.cache_size)
+    logger = get_logger(args.log_path)
+    server = EmulatorServer(image, args.log_path, args.username, args.hostname)
+    try:
+        asyncio.run(server.serve(args.socket, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        image.close()
+        logger.close()
+
+
+if __name__ == '__main__':
+    main()
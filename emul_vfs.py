@@ -0,0 +1,514 @@
+import fnmatch
+import inspect
+import re
+import struct
+import threading
+import zipfile
+from collections import OrderedDict
+
+
+def data_offset(fp, info):
+    """
+    Смещение начала сжатых данных члена архива в файле.
+    Данные лежат за локальным заголовком, длина которого зависит от имени и поля extra.
+
+    :param fp: Архив, открытый как бинарный файл
+    :param info: ZipInfo члена архива
+    """
+    fp.seek(info.header_offset)
+    header = fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    return info.header_offset + zipfile.sizeFileHeader + name_length + extra_length
+
+
+def _sizes(info):
+    """Исходный и сжатый размер члена архива (0, 0 — если сведений о нём нет)."""
+    if info is None:
+        return 0, 0
+    return info.file_size, info.compress_size
+
+
+# Ленивая загрузка детей общего дерева: сеансы сервера обходят его из разных потоков
+_load_lock = threading.Lock()
+
+
+class Node:
+    """
+    Узел дерева виртуальной файловой системы: файл или директория.
+
+    У директории есть словарь дочерних узлов (имя -> узел), у файла children равен None.
+    Дочерние узлы директории могут загружаться лениво — при первом обращении к children.
+
+    Для каждого узла хранятся итоги по поддереву: число файлов и директорий (не считая самого узла),
+    суммарный исходный и сжатый размер членов архива. Они поддерживаются деревом при добавлении
+    и удалении узлов, поэтому размер любой директории известен за O(1).
+    """
+    __slots__ = ('name', 'parent', '_children', 'info', 'explicit', '_loader',
+                 'files', 'dirs', 'size', 'compressed')
+
+    def __init__(self, name, parent=None, is_dir=True, info=None):
+        """
+        :param name: Имя узла (последний компонент пути)
+        :param parent: Родительская директория (None для корня)
+        :param is_dir: True для директории, False для файла
+        :param info: Служебная информация о члене архива (например, ZipInfo)
+        """
+        self.name = name
+        self.parent = parent
+        self._children = {} if is_dir else None
+        self.info = info
+        self.explicit = False  # Есть ли для узла собственная запись в архиве
+        self._loader = None  # (источник, ключ): откуда загрузить дочерние узлы при первом обращении
+        self.files = 0 if is_dir else 1
+        self.dirs = 0
+        self.size = 0
+        self.compressed = 0
+
+    @property
+    def children(self):
+        if self._loader is not None:
+            with _load_lock:
+                # _loader снимается только после загрузки: другой поток не увидит детей наполовину
+                if self._loader is not None:
+                    source, key = self._loader
+                    source.load_children(self, key)
+                    self._loader = None
+        return self._children
+
+    @children.setter
+    def children(self, value):
+        self._children = value
+
+    @property
+    def is_dir(self):
+        return self._children is not None
+
+    def path(self):
+        """Путь узла в архиве: 'zxc/root/' для директорий, 'zxc/a.txt' для файлов, '' для корня."""
+        parts = []
+        node = self
+        while node.parent is not None:
+            parts.append(node.name)
+            node = node.parent
+        path = '/'.join(reversed(parts))
+        if self.is_dir and path:
+            path += '/'
+        return path
+
+
+class FileTree:
+    """
+    Иерархический индекс членов архива.
+
+    Строится один раз при загрузке архива. Родительские директории, для которых в архиве
+    нет собственной записи, создаются неявно. Поиск узла стоит O(глубина пути),
+    перечисление директории — O(число её детей).
+    """
+
+    def __init__(self):
+        self.root = Node('')
+        self.index = None  # Отображённый в память индекс, из которого лениво загружаются узлы
+
+    def add(self, name, info=None):
+        """
+        Добавляет член архива в дерево.
+
+        :param name: Имя члена архива ('zxc/root/' для директории, 'zxc/a.txt' для файла)
+        :param info: Служебная информация о члене архива
+        :return: Созданный (или уже существующий) узел
+        """
+        is_dir = name.endswith('/')
+        parts = [part for part in name.split('/') if part]
+        if not parts:
+            return self.root
+
+        node = self.root
+        for part in parts[:-1]:
+            child = node.children.get(part)
+            if child is None:
+                child = node.children[part] = Node(part, node)
+                self._update(node, dirs=1)
+            elif not child.is_dir:
+                # Файл с таким именем уже есть — превращаем его в директорию
+                self._make_dir(child)
+            node = child
+
+        leaf = node.children.get(parts[-1])
+        if leaf is None:
+            leaf = node.children[parts[-1]] = Node(parts[-1], node, is_dir=is_dir)
+            self._update(node, files=0 if is_dir else 1, dirs=1 if is_dir else 0)
+        elif is_dir and not leaf.is_dir:
+            self._make_dir(leaf)
+
+        # Учитываем размеры члена архива (при повторном добавлении — только разницу)
+        size, compressed = _sizes(info)
+        old_size, old_compressed = _sizes(leaf.info)
+        leaf.size += size - old_size
+        leaf.compressed += compressed - old_compressed
+        self._update(node, size=size - old_size, compressed=compressed - old_compressed)
+        leaf.info = info
+        leaf.explicit = True
+        return leaf
+
+    @staticmethod
+    def _update(node, files=0, dirs=0, size=0, compressed=0):
+        """Прибавляет изменения итогов к узлу и всем его предкам (O(глубина))."""
+        while node is not None:
+            node.files += files
+            node.dirs += dirs
+            node.size += size
+            node.compressed += compressed
+            node = node.parent
+
+    def _make_dir(self, node):
+        """Превращает файловый узел в пустую директорию."""
+        node.children = {}
+        node.files = 0
+        self._update(node.parent, files=-1, dirs=1)
+
+    def resolve(self, path, cwd=''):
+        """
+        Находит узел по пути относительно текущей директории.
+
+        Поддерживаются абсолютные пути (начинающиеся с '/'), а также компоненты '.' и '..'.
+
+        :param path: Путь к файлу или директории
+        :param cwd: Текущая директория в формате 'zxc/root/' (или '/' для корня)
+        :return: Найденный узел или None
+        """
+        if path.startswith('/'):
+            parts = path.split('/')
+        else:
+            parts = cwd.split('/') + path.split('/')
+
+        # '..' разбирается по строке пути, а не по ссылкам на родителя: узлы могут быть общими
+        # для нескольких деревьев (см. OverlayTree), и у общего узла родитель — из исходного дерева
+        names = []
+        for part in parts:
+            if not part or part == '.':
+                continue
+            if part == '..':
+                if names:
+                    names.pop()
+                continue
+            names.append(part)
+
+        node = self.root
+        for name in names:
+            if not node.is_dir:
+                return None
+            node = node.children.get(name)
+            if node is None:
+                return None
+        return node
+
+    def walk(self, node=None):
+        """
+        Обходит поддерево в глубину (без рекурсии), начиная с самого узла.
+
+        :param node: Корень обходимого поддерева (по умолчанию — корень дерева)
+        """
+        stack = [node or self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            if node.children:
+                stack.extend(reversed(list(node.children.values())))
+
+    def remove(self, node):
+        """Отсоединяет узел (вместе с поддеревом) от родительской директории и пересчитывает итоги предков."""
+        if node.parent is not None:
+            del node.parent.children[node.name]
+            if node.is_dir:
+                self._update(node.parent, -node.files, -node.dirs - 1, -node.size, -node.compressed)
+            else:
+                self._update(node.parent, -1, 0, -node.size, -node.compressed)
+            node.parent = None
+
+    def find(self, node, name=None, kind=None):
+        """
+        Ищет узлы поддерева по шаблону имени (как в fnmatch) и типу.
+        Поддеревья, в которых по итогам нет узлов нужного типа, не обходятся.
+
+        :param node: Директория, с которой начинается поиск
+        :param name: Шаблон имени ('*.txt') или None
+        :param kind: 'f' — только файлы, 'd' — только директории, None — все
+        """
+        matcher = re.compile(fnmatch.translate(name)).match if name is not None else None
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if (kind is None or (kind == 'd') == node.is_dir) and (matcher is None or matcher(node.name)):
+                yield node
+            if not node.is_dir:
+                continue
+            if (kind == 'f' and not node.files) or (kind == 'd' and not node.dirs):
+                continue
+            stack.extend(reversed(list(node.children.values())))
+
+
+class OverlayTree(FileTree):
+    """
+    Дерево-надстройка над общим деревом с копированием при записи.
+
+    Все узлы общего дерева разделяются, пока их не нужно изменить. При изменении копируется
+    только путь от корня до изменяемой директории (O(глубина + число детей на пути)),
+    поэтому общее дерево остаётся неизменным и может обслуживать много сеансов сразу.
+    """
+
+    def __init__(self, base):
+        """
+        :param base: Общее дерево (не изменяется)
+        """
+        super().__init__()
+        self.root = self._copy(base.root, None)
+        self.index = base.index
+        # Узлы, скопированные для этого дерева. Хранятся сами узлы, а не id(): id удалённой копии
+        # может достаться узлу общего дерева, загруженному позже, и тот был бы изменён как свой
+        self._owned = {self.root}
+
+    @staticmethod
+    def _copy(node, parent):
+        copy = Node(node.name, parent, is_dir=node.is_dir, info=node.info)
+        if node.is_dir:
+            copy.children = dict(node.children)
+        copy.explicit = node.explicit
+        copy.files, copy.dirs, copy.size, copy.compressed = node.files, node.dirs, node.size, node.compressed
+        return copy
+
+    def _own(self, names):
+        """
+        Копирует ещё не скопированные узлы на пути names от корня.
+
+        :return: Последний узел пути или None, если путь существует не полностью
+        """
+        node = self.root
+        for name in names:
+            child = node.children.get(name) if node.is_dir else None
+            if child is None:
+                return None
+            if child not in self._owned:
+                child = node.children[name] = self._copy(child, node)
+                self._owned.add(child)
+            node = child
+        return node
+
+    def add(self, name, info=None):
+        self._own([part for part in name.split('/') if part])
+        return super().add(name, info)
+
+    def remove(self, node):
+        """Удаляет узел только из этого дерева; общее дерево не меняется."""
+        names = [part for part in node.path().split('/') if part]
+        owned = self._own(names) if names else None
+        if owned is not None:
+            super().remove(owned)
+
+
+def usage(node):
+    """Строка для команды du: итоги по поддереву узла, без его обхода."""
+    return (f"{node.size} bytes ({node.compressed} compressed) in {node.files} files, "
+            f"{node.dirs} directories\t/{node.path()}")
+
+
+def render_tree(node, batch=1000):
+    """
+    Строки для команды tree: поддерево узла с отступами. Возвращает текст частями по batch строк,
+    в конце — число директорий и файлов из итогов узла.
+
+    :param node: Корень выводимого поддерева
+    :param batch: Число строк в одной части вывода
+    """
+    lines = [f"/{node.path()}"]
+    # Стек: (дети директории, номер следующего выводимого ребёнка, отступ)
+    stack = [[list(node.children.values()), 0, '']] if node.is_dir else []
+    while stack:
+        entry = stack[-1]
+        children, position, prefix = entry
+        if position == len(children):
+            stack.pop()
+            continue
+        entry[1] += 1
+        child = children[position]
+        last = position == len(children) - 1
+        lines.append(f"{prefix}{'└── ' if last else '├── '}{child.name}")
+        if child.is_dir and child.children:
+            stack.append([list(child.children.values()), 0, prefix + ('    ' if last else '│   ')])
+        if len(lines) >= batch:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    lines.append(f"\n{node.dirs} directories, {node.files} files")
+    yield '\n'.join(lines)
+
+
+def render_paths(nodes, batch=1000):
+    """Строки для команды find: абсолютные пути узлов, частями по batch строк."""
+    lines = []
+    for node in nodes:
+        lines.append(f"/{node.path()}")
+        if len(lines) >= batch:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines)
+
+
+class IndexedZipFile(zipfile.ZipFile):
+    """
+    ZipFile, не читающий центральный каталог при открытии.
+    Члены архива передаются в open() и read() готовыми ZipInfo (например, из индекса),
+    поэтому открытие архива не зависит от числа членов в нём. Каталог читается при первом
+    обращении к списку членов (infolist, namelist, getinfo).
+
+    Класс подменяет внутренний метод ZipFile._RealGetContents, поэтому создаётся через
+    open_indexed: если устройство ZipFile другое, она возвращает обычный ZipFile.
+    """
+
+    def _RealGetContents(self):
+        self._contents_loaded = False
+
+    def _load_contents(self):
+        if not self._contents_loaded:
+            self._contents_loaded = True
+            super()._RealGetContents()
+
+    def infolist(self):
+        self._load_contents()
+        return super().infolist()
+
+    def namelist(self):
+        self._load_contents()
+        return super().namelist()
+
+    def getinfo(self, name):
+        self._load_contents()
+        return super().getinfo(name)
+
+
+def _indexed_supported():
+    """Читает ли ZipFile каталог методом _RealGetContents(self) в filelist и NameToInfo."""
+    method = getattr(zipfile.ZipFile, '_RealGetContents', None)
+    try:
+        parameters = list(inspect.signature(method).parameters)
+    except (TypeError, ValueError):
+        return False
+    return parameters == ['self']
+
+
+def open_indexed(zip_path):
+    """Открывает архив для чтения без центрального каталога, а если это невозможно — обычным ZipFile."""
+    if _indexed_supported():
+        zip_file = IndexedZipFile(zip_path, 'r')
+        if hasattr(zip_file, 'filelist') and hasattr(zip_file, 'NameToInfo'):
+            return zip_file
+        zip_file.close()
+    return zipfile.ZipFile(zip_path, 'r')
+
+
+class ZipContent:
+    """
+    Чтение содержимого членов архива по требованию.
+
+    Архив остаётся открытым всё время работы эмулятора, распаковываются только запрошенные файлы.
+    Недавно прочитанные файлы хранятся в LRU-кэше, ограниченном суммарным размером в байтах.
+    """
+
+    def __init__(self, zip_path, cache_size=64 * 1024 * 1024, max_file_size=None, zip_file=None):
+        """
+        :param zip_path: Путь к архиву
+        :param cache_size: Максимальный суммарный размер кэша в байтах (0 — кэш отключён)
+        :param max_file_size: Файлы больше этого размера не кэшируются (по умолчанию — четверть кэша)
+        :param zip_file: Уже открытый ZipFile этого архива (по умолчанию архив открывается без чтения каталога)
+        """
+        self.zip_path = zip_path
+        self.zip_file = zip_file if zip_file is not None else open_indexed(zip_path)
+        self.cache_size = cache_size
+        self.max_file_size = cache_size // 4 if max_file_size is None else max_file_size
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()  # Имя члена архива -> содержимое
+        self._lock = threading.Lock()
+
+    def read(self, info):
+        """
+        Возвращает содержимое члена архива в виде bytes.
+
+        :param info: ZipInfo читаемого члена архива
+        """
+        with self._lock:
+            data = self._cache.get(info.filename)
+            if data is not None:
+                self._cache.move_to_end(info.filename)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        data = self.zip_file.read(info)
+
+        if len(data) <= min(self.max_file_size, self.cache_size):
+            with self._lock:
+                if info.filename not in self._cache:
+                    self._cache[info.filename] = data
+                    self.cached_bytes += len(data)
+                # Вытесняем давно не использованные файлы, пока кэш не уложится в лимит
+                while self.cached_bytes > self.cache_size:
+                    _, evicted = self._cache.popitem(last=False)
+                    self.cached_bytes -= len(evicted)
+        return data
+
+    def iter_chunks(self, info, chunk_size=64 * 1024):
+        """
+        Возвращает содержимое члена архива частями по chunk_size байт.
+        Небольшие файлы читаются целиком через кэш, большие распаковываются потоком,
+        так что в памяти одновременно находится не больше одной части.
+
+        :param info: ZipInfo читаемого члена архива
+        :param chunk_size: Размер части в байтах
+        """
+        if info.file_size <= min(self.max_file_size, self.cache_size):
+            data = self.read(info)
+            for start in range(0, len(data), chunk_size):
+                yield data[start:start + chunk_size]
+            return
+
+        with self.zip_file.open(info) as member:
+            while True:
+                chunk = member.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    @staticmethod
+    def is_seekable(info):
+        """Можно ли читать член архива с произвольного места (хранится без сжатия и шифрования)."""
+        return info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1
+
+    def iter_chunks_reversed(self, info, chunk_size=64 * 1024):
+        """
+        Возвращает содержимое несжатого члена архива частями, начиная с конца файла.
+        Начало файла при этом не читается.
+
+        :param info: ZipInfo члена архива, для которого is_seekable(info) истинно
+        :param chunk_size: Размер части в байтах
+        """
+        with open(self.zip_path, 'rb') as fp:
+            start = data_offset(fp, info)
+            end = info.file_size
+            while end > 0:
+                begin = max(0, end - chunk_size)
+                fp.seek(start + begin)
+                yield fp.read(end - begin)
+                end = begin
+
+    def stats(self):
+        """Счётчики кэша: попадания, промахи, число файлов и занятые байты."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'files': len(self._cache), 'bytes': self.cached_bytes}
+
+    def close(self):
+        """Закрывает архив и очищает кэш."""
+        with self._lock:
+            self._cache.clear()
+            self.cached_bytes = 0
+        self.zip_file.close()
@@ -0,0 +1,109 @@
+import gc
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_parser  # noqa: E402
+from config_eval import evaluate  # noqa: E402
+from config_parser import Array, ConfigSyntaxError, Expression, Set, StreamParser, parse, to_python  # noqa: E402
+from config_vector import plain  # noqa: E402
+
+TEXT = '''# заголовок
+set a = 1.5
+  set b = ![a
+    2 * sqrt]
+nested = { 1. { 2.
+  3. } }
+title = generated text # не комментарий
+'''
+
+
+def test_parse_values_and_positions():
+    a, b, nested, title = parse(TEXT).statements
+    assert a == Set('a', 1.5) and (a.line, a.column) == (2, 1)
+    assert isinstance(b.value, Expression) and b.value.tokens == ['a', 2.0, '*', 'sqrt']
+    assert (b.line, b.column) == (3, 3)
+    assert [(item.line, item.column) for item in b.value.items] == [(3, 13), (4, 5), (4, 7), (4, 9)]
+    assert isinstance(nested.value, Array) and not nested.value.flat
+    assert to_python(nested.value) == [1.0, [2.0, 3.0]]
+    assert title.value == 'generated text # не комментарий'
+
+
+def test_all_errors_are_reported():
+    text = 'set a = @\nk = { 1. 2 3 }\nset b = 2\nset c = ![a\n'
+    with pytest.raises(ConfigSyntaxError) as error:
+        parse(text)
+    assert error.value.errors == [
+        (1, 9, "Некорректное значение константы: '@'"),
+        (2, 12, "Ожидалась '.' или '}', найдено '3'"),
+        (4, 9, 'Выражение не закрыто'),
+    ]
+
+
+# Вход и результат прежнего построчного Config.parse_constants
+LEGACY = [
+    ('graph = {1.2.3.}', {'graph': [1.0, 2.0, 3.0]}),
+    ('numbers = {1.5. 2.}', {'numbers': [1.0, 5.0, 2.0]}),
+    ('set a = -1.5e2\nsizes = { 10. 20 .30. }', {'a': -150.0, 'sizes': [10.0, 20.0, 30.0]}),
+    ('set x = .5', {'x': 0.5}),
+    ('set y = 5.\nset z = ![y .5 * 2. +]', {'y': 5.0, 'z': 4.5}),
+    ('my key = 3', {'my key': '3'}),
+    ('title = a = b # c', {'title': 'a = b # c'}),
+    ('  # c\nset s = ![4 sqrt]', {'s': 2.0}),
+]
+
+
+@pytest.mark.parametrize('text, expected', LEGACY)
+def test_matches_legacy_parse_constants(text, expected):
+    constants = evaluate(parse(text).statements)
+    assert {name: plain(value) for name, value in constants.items()} == expected
+
+
+@pytest.mark.parametrize('text, error', [
+    ('k = {1..2}', (1, 8, "Некорректный элемент массива: '.'")),
+    ('k = {1.e5}', (1, 8, "Некорректный элемент массива: 'e5'")),
+    ('k = {1 2}', (1, 8, "Ожидалась '.' или '}', найдено '2'")),
+    ('my key\n', (1, 7, "Ожидалось '=', найдено конец строки")),
+])
+def test_array_and_key_errors(text, error):
+    with pytest.raises(ConfigSyntaxError) as raised:
+        parse(text)
+    assert raised.value.errors == [error]
+
+
+def test_stream_matches_whole_text():
+    lines = TEXT.splitlines(True) * 3
+    assert list(StreamParser(lines, block_lines=2)) == parse(''.join(lines)).statements
+
+
+def test_windows_match_whole_text(monkeypatch):
+    """Объявление, не законченное к концу участка токенов, разбирается заново со следующим."""
+    text = TEXT * 3 + 'set c = ![a\n'
+    with pytest.raises(ConfigSyntaxError) as whole:
+        parse(text)
+    monkeypatch.setattr(config_parser, 'WINDOW', 5)
+    with pytest.raises(ConfigSyntaxError) as windows:
+        parse(text)
+    assert windows.value.errors == whole.value.errors == [(22, 9, 'Выражение не закрыто')]
+    assert parse(TEXT * 3).statements == parse(TEXT).statements * 3
+
+
+def test_unicode_space_is_whitespace():
+    a, b = parse('set a = 1\u00a0\nset\u00a0b = 2\n').statements
+    assert (a, b) == (Set('a', 1.0), Set('b', 2.0))
+
+
+@pytest.mark.parametrize('enabled', [True, False])
+def test_gc_state_is_restored(enabled):
+    saved = gc.isenabled()
+    (gc.enable if enabled else gc.disable)()
+    try:
+        parse(TEXT)
+        with pytest.raises(ConfigSyntaxError):
+            parse('set a = @')
+        assert gc.isenabled() == enabled
+    finally:
+        (gc.enable if saved else gc.disable)()
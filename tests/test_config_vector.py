@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_vector  # noqa: E402
+from config_eval import evaluate  # noqa: E402
+from config_parser import parse  # noqa: E402
+
+numpy = pytest.importorskip('numpy')
+
+
+def run(text, use_numpy):
+    """Вычисляет программу с NumPy или только на Python (config_vector.numpy = None)."""
+    saved = config_vector.numpy
+    config_vector.numpy = saved if use_numpy else None
+    try:
+        return evaluate(parse(text).statements)
+    finally:
+        config_vector.numpy = saved
+
+
+def large(name, count=300):
+    # Литерал создаётся при вычислении, так что с NumPy он — ndarray (count >= NUMPY_MIN)
+    assert count >= config_vector.NUMPY_MIN
+    return f'set {name} = {{ ' + ' '.join(f'{number % 97 + 1}.' for number in range(count)) + ' }'
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+@pytest.mark.parametrize('expression', ['a b +', 'b a +', 'a b *', 'b a -', 'a b max', 'b a pow'])
+def test_length_mismatch_is_an_error_with_and_without_numpy(use_numpy, expression):
+    """Массив из 300 элементов и { 5. }: NumPy не растягивает массив из одного элемента."""
+    text = '\n'.join([large('a'), 'set b = { 5. }', f'set c = ![{expression}]'])
+    with pytest.raises(ValueError, match='длины массивов различаются'):
+        run(text, use_numpy)
+
+
+def test_large_arrays_same_result_with_and_without_numpy():
+    text = '\n'.join([large('a'), large('b'), 'set c = ![a b + 0.1 * sqrt]', 'set d = ![c sum]',
+                      'set e = ![c maxof a len /]'])
+    with_numpy = run(text, True)
+    without_numpy = run(text, False)
+    assert with_numpy == without_numpy
+    assert type(with_numpy['c']) is list
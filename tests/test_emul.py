@@ -0,0 +1,31 @@
+import os
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emul import Emulator  # noqa: E402
+from emul_commands import iter_output  # noqa: E402
+
+
+@pytest.mark.parametrize('chunk_size', [1000, 64 * 1024])
+def test_tail_multibyte_text_larger_than_chunk(tmp_path, chunk_size):
+    """tail несжатого текста на кириллице: часть с конца файла начинается внутри символа."""
+    zip_path = str(tmp_path / 'fs.zip')
+    lines = [f'строка {number} ' + 'ф' * (number % 7) for number in range(20000)]
+    # Граница последней части (chunk_size байт от конца) должна разрезать двухбайтовый символ
+    while (('\n'.join(lines) + '\n').encode('utf-8')[-chunk_size] & 0xC0) != 0x80:
+        lines[-1] += 'x'
+    text = '\n'.join(lines) + '\n'
+    assert len(text.encode('utf-8')) > 2 * chunk_size
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_STORED) as zip_file:
+        zip_file.writestr('text.txt', text)
+    emulator = Emulator('user1', 'my_pc', zip_path, str(tmp_path / 'emulator.log'), chunk_size=chunk_size)
+    try:
+        for count in (1, 10, 100):
+            output = ''.join(iter_output(emulator.tail('text.txt', count)))
+            assert output == ''.join(line + '\n' for line in lines[-count:])
+    finally:
+        emulator.close()
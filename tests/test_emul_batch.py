@@ -0,0 +1,56 @@
+import csv
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emul import Emulator  # noqa: E402
+from emul_batch import PROMPT_RE, read_log, run_batch  # noqa: E402
+from emul_log import FIELDS  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_emulator(tmp_path):
+    zip_path = str(tmp_path / 'fs.zip')
+    with zipfile.ZipFile(zip_path, 'w') as zip_file:
+        zip_file.writestr('docs/a.txt', 'text\n')
+    return Emulator('user1', 'my_pc', zip_path, str(tmp_path / 'emulator.log'))
+
+
+def test_read_log_detects_format_per_record(tmp_path):
+    """Старый текстовый лог, к которому дописаны строки CSV (с заголовком и без)."""
+    path = str(tmp_path / 'mixed.log')
+    rows = [['2024-10-17 15:53:01.120', 'user1', 'my_pc', '/', 'cat a.txt', 'line "one"\nuser1@my_pc:/$ fake\n'],
+            ['2024-10-17 15:53:04.518', 'user1', 'my_pc', '/', 'exit', '']]
+    with open(path, 'w', encoding='utf-8', newline='') as log_file:
+        log_file.write('user1@my_pc:/$ ls\ndocs\nuser1@my_pc:/$ exit\n')
+        writer = csv.writer(log_file)
+        writer.writerows(rows)
+        writer.writerow(FIELDS)
+        writer.writerows(rows)
+    with open(path, encoding='utf-8', newline='') as log_file:
+        commands = list(read_log(log_file))
+    assert commands == ['ls', 'exit', 'cat a.txt', 'exit', 'cat a.txt', 'exit']
+
+
+def test_read_tracked_multi_session_log():
+    with open(os.path.join(ROOT, 'emulator.log'), encoding='utf-8', errors='replace', newline='') as log_file:
+        lines = log_file.readlines()
+    commands = list(read_log(lines))
+    assert len(commands) == sum(1 for line in lines if PROMPT_RE.search(line.rstrip('\r\n')))
+    assert commands.count('exit') > 1
+
+
+def test_run_batch_skips_exit_between_sessions(tmp_path):
+    commands = ['ls', 'exit', 'cd docs', 'ls', 'exit']
+    emulator = make_emulator(tmp_path)
+    try:
+        latencies = run_batch(emulator, iter(commands))
+        assert {name: len(values) for name, values in latencies.items()} == {'ls': 2, 'cd': 1}
+        latencies = run_batch(emulator, iter(commands), stop_at_exit=True)
+        assert {name: len(values) for name, values in latencies.items()} == {'ls': 1}
+    finally:
+        emulator.close()
+        emulator.logger.close()
@@ -0,0 +1,61 @@
+import os
+import re
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emul import Emulator  # noqa: E402
+from emul_commands import iter_output  # noqa: E402
+from emul_grep import required_literals  # noqa: E402
+
+FILES = {
+    'docs/a.txt': 'HAH\nno match here\n',
+    'docs/b.txt': 'Привет, АБВГД\n',
+    'docs/deep/c.txt': 'tab\there\nHAHA again\n',
+    'd.txt': 'abcd\nabc abc\n',
+}
+
+PATTERNS = [
+    r'\x48AH', r'АБВ', r'\U00000048AH', r'\N{LATIN CAPITAL LETTER H}AH', r'\110AH', r'\0110',
+    r'tab\there', r'(abc) \1', r'HAH', r'abc\.?d',
+]
+
+
+@pytest.mark.parametrize('pattern, literals', [
+    (r'\x48AH', ['AH']),
+    (r'A\u0410BCD', ['A', 'BCD']),
+    (r'\N{LATIN SMALL LETTER A}bcd', ['bcd']),
+    (r'\0101xyz', ['1xyz']),
+    (r'(a)\1abc', ['abc']),
+    (r'foo\.bar', ['foo.bar']),
+])
+def test_required_literals_skip_escape_bodies(pattern, literals):
+    assert required_literals(pattern) == literals
+
+
+@pytest.fixture
+def emulator(tmp_path):
+    zip_path = str(tmp_path / 'fs.zip')
+    with zipfile.ZipFile(zip_path, 'w') as zip_file:
+        for name, text in FILES.items():
+            zip_file.writestr(name, text)
+    emulator = Emulator('user1', 'my_pc', zip_path, str(tmp_path / 'emulator.log'))
+    yield emulator
+    emulator.close()
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_grep_with_index_matches_full_scan(emulator, pattern):
+    """Отбор файлов по триграммам не должен терять совпадения, которые нашёл бы просмотр всех файлов."""
+    regex = re.compile(pattern)
+    expected = sorted(f'/{name}:{line}' for name, text in FILES.items()
+                      for line in text.splitlines() if regex.search(line))
+    output = ''.join(iter_output(emulator.grep(pattern, '/', recursive=True)))
+    assert sorted(output.splitlines()) == expected
+    # Файл, заданный явно, просматривается без индекса
+    for name, text in FILES.items():
+        direct = ''.join(iter_output(emulator.grep(pattern, '/' + name)))
+        assert direct.splitlines() == [line for line in text.splitlines() if regex.search(line)]
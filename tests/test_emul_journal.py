@@ -0,0 +1,66 @@
+import io
+import os
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emul_journal import MutationJournal  # noqa: E402
+
+FILES = {
+    'docs/a.txt': b'first file\n' * 100,
+    'docs/b.bin': bytes(range(256)) * 40,
+    'keep/c.txt': b'stored\n',
+    'old/d.txt': b'removed\n',
+}
+
+
+class Unseekable(io.RawIOBase):
+    """Файл без seek: ZipFile пишет CRC и размеры в дескрипторы данных за членами архива."""
+
+    def __init__(self, target):
+        self.target = target
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.target.write(data)
+
+
+def write_zip64(path):
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for name, data in FILES.items():
+            with zip_file.open(name, 'w', force_zip64=True) as member:
+                member.write(data)
+
+
+def write_with_descriptors(path):
+    with open(path, 'wb') as target:
+        with zipfile.ZipFile(Unseekable(target), 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+            for name, data in FILES.items():
+                zip_file.writestr(name, data)
+
+
+@pytest.mark.parametrize('raw', [True, False])
+@pytest.mark.parametrize('write_zip', [write_zip64, write_with_descriptors])
+def test_compact_keeps_archive_valid(tmp_path, monkeypatch, write_zip, raw):
+    path = str(tmp_path / 'fs.zip')
+    write_zip(path)
+    with zipfile.ZipFile(path) as zip_file:
+        flags = [item.flag_bits & 0x08 for item in zip_file.infolist()]
+        assert any(flags) == (write_zip is write_with_descriptors)
+    if not raw:
+        # ZipFile без внутреннего устройства, нужного для копирования без пересжатия
+        monkeypatch.setattr(MutationJournal, '_raw_copy_supported', staticmethod(lambda new_zip: False))
+    journal = MutationJournal(path)
+    journal.delete('old/')
+    journal.write('docs/new.txt', b'new\n')
+    assert journal.compact() == 2
+    expected = {name: data for name, data in FILES.items() if not name.startswith('old/')}
+    expected['docs/new.txt'] = b'new\n'
+    with zipfile.ZipFile(path) as zip_file:
+        assert zip_file.testzip() is None
+        assert {item.filename: zip_file.read(item) for item in zip_file.infolist()} == expected
@@ -0,0 +1,47 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emul_log import FIELDS, CsvLogger  # noqa: E402
+
+
+def write_session(path, commands=1, **options):
+    logger = CsvLogger(path, **options)
+    for _ in range(commands):
+        logger.log('user1', 'my_pc', '/', 'ls', 'output')
+    logger.close()
+
+
+def test_sessions_append_without_rotation(tmp_path):
+    """Новый сеанс дописывает в лог: история не уходит в резервные копии при каждом запуске."""
+    path = str(tmp_path / 'emulator.log')
+    for _ in range(5):
+        write_session(path)
+    assert not os.path.exists(path + '.1')
+    with open(path, encoding='utf-8') as f:
+        rows = f.read().splitlines()
+    assert len(rows) == 6  # Заголовок и строка от каждого сеанса
+
+
+def test_rotation_by_size_at_startup(tmp_path):
+    path = str(tmp_path / 'emulator.log')
+    write_session(path, commands=3)
+    # Лог уже достиг max_bytes и уходит в path.1; новый (заголовок и строка) меньше порога
+    write_session(path, max_bytes=os.path.getsize(path))
+    assert os.path.exists(path + '.1')
+    with open(path, encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 2
+
+
+def test_legacy_log_is_rotated_before_csv(tmp_path):
+    """Лог в старом текстовом формате уходит в path.1: CSV-файл всегда начинается с заголовка."""
+    path = str(tmp_path / 'emulator.log')
+    legacy = 'user1@my_pc:/$ ls\ndocs\n'
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(legacy)
+    write_session(path)
+    with open(path + '.1', encoding='utf-8') as f:
+        assert f.read() == legacy
+    with open(path, encoding='utf-8') as f:
+        assert f.readline().rstrip('\n') == ','.join(FIELDS)
@@ -0,0 +1,89 @@
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import emul_vfs  # noqa: E402
+from emul_index import ArchiveImage, load_tree  # noqa: E402
+from emul_server import Session  # noqa: E402
+from emul_vfs import IndexedZipFile, open_indexed  # noqa: E402
+
+FIELDS = ('filename', 'date_time', 'header_offset', 'compress_size', 'file_size', 'CRC', 'compress_type', 'flag_bits')
+
+
+def make_archive(path, count=50):
+    """Архив с пустыми директориями a/e0..a/e{count-1} и b/s0..b/s{count-1}."""
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        for number in range(count):
+            zip_file.writestr(f'a/e{number}/', '')
+        for number in range(count):
+            zip_file.writestr(f'b/s{number}/', '')
+
+
+def test_overlay_changes_stay_in_session_after_lazy_load(tmp_path):
+    """
+    rmdir освобождает копии узлов, а ls затем лениво загружает узлы общего дерева. Изменения
+    сеанса не должны попасть в общее дерево, даже если новый узел получит id удалённой копии.
+    """
+    zip_path = str(tmp_path / 'fs.zip')
+    log_path = str(tmp_path / 'server.log')
+    make_archive(zip_path)
+    # Совпадение id не гарантировано, поэтому сценарий повторяется на нескольких образах
+    for _ in range(5):
+        image = ArchiveImage(zip_path)
+        try:
+            first = Session('user1', 'my_pc', zip_path, log_path, image=image)
+            second = Session('user1', 'my_pc', zip_path, log_path, image=image)
+            for number in range(50):
+                first.rmdir(f'a/e{number}')
+            first.ls('b')
+            for number in range(5):
+                assert first.rmdir(f'b/s{number}') == f"Directory 'b/s{number}' has been removed."
+            third = Session('user1', 'my_pc', zip_path, log_path, image=image)
+            for session in (second, third):
+                listing = session.ls('b').split()
+                assert len(listing) == 50
+                assert 's0' in listing
+                assert len(session.ls('a').split()) == 50
+            assert 's0' not in first.ls('b').split()
+        finally:
+            image.close()
+
+
+def describe(infos):
+    return sorted(tuple(getattr(info, name) for name in FIELDS) for info in infos)
+
+
+def tree_infos(node):
+    for child in node.children.values():
+        if child.explicit:
+            yield child.info
+        if child.is_dir:
+            yield from tree_infos(child)
+
+
+def test_indexed_open_matches_plain_infolist(tmp_path, monkeypatch):
+    zip_path = str(tmp_path / 'fs.zip')
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr('a/', '')
+        zip_file.writestr('a/b.txt', 'text\n' * 50)
+        zip_file.writestr('c/d/e.bin', bytes(300), compress_type=zipfile.ZIP_STORED)
+    with zipfile.ZipFile(zip_path) as zip_file:
+        plain = describe(zip_file.infolist())
+    load_tree(zip_path)[1].close()  # Первое открытие читает каталог и сохраняет индекс рядом с архивом
+    tree, zip_file = load_tree(zip_path)
+    assert zip_file is None
+    try:
+        assert describe(tree_infos(tree.root)) == plain
+    finally:
+        tree.index.close()
+    with open_indexed(zip_path) as zip_file:
+        assert isinstance(zip_file, IndexedZipFile)
+        assert describe(zip_file.infolist()) == plain
+        assert zip_file.read('a/b.txt') == b'text\n' * 50
+    # Если устройство ZipFile другое, архив открывается обычным ZipFile
+    monkeypatch.setattr(emul_vfs, '_indexed_supported', lambda: False)
+    with open_indexed(zip_path) as zip_file:
+        assert type(zip_file) is zipfile.ZipFile
+        assert describe(zip_file.infolist()) == plain